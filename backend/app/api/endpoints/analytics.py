@@ -0,0 +1,49 @@
+from fastapi import APIRouter, Depends
+from starlette.status import HTTP_200_OK
+from typing import Annotated
+from app.core.dependencies import (
+    get_top_queries_dep,
+    get_latency_percentiles_dep,
+    require_admin,
+)
+from app.schema.analytics import TopQueriesResponse, LatencyPercentilesResponse
+from app.schema.user import User
+
+
+router = APIRouter()
+
+
+# Most frequent queries (Admin only)
+@router.get(
+    "/top-queries",
+    status_code=HTTP_200_OK,
+    response_description="Most frequent RAG queries",
+    name="analytics:top_queries",
+    response_model=TopQueriesResponse,
+)
+def get_top_queries(
+    current_user: Annotated[User, Depends(require_admin)],
+    top_queries: TopQueriesResponse = Depends(get_top_queries_dep),
+):
+    """
+    Returns the most frequent queries of the last days, optionally for one collection or endpoint.
+    """
+    return top_queries
+
+
+# Latency percentiles per model (Admin only)
+@router.get(
+    "/latency",
+    status_code=HTTP_200_OK,
+    response_description="RAG latency percentiles per model",
+    name="analytics:latency",
+    response_model=LatencyPercentilesResponse,
+)
+def get_latency_percentiles(
+    current_user: Annotated[User, Depends(require_admin)],
+    latency: LatencyPercentilesResponse = Depends(get_latency_percentiles_dep),
+):
+    """
+    Returns the p50/p95/p99 total latency and time to first token of each model over the last days.
+    """
+    return latency
@@ -1,14 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Request
 from fastapi.responses import StreamingResponse
-import json
 from pydantic import BaseModel
 from typing import List, Optional
-import datetime
 import tempfile
 import os
 from pathlib import Path
 import httpx
-from app.core.dependencies import require_active_user
+from app.core.dependencies import require_active_user, require_admin
+from app.core.streaming import cancel_on_disconnect, content_line, final_line, error_line
 from app.schema.user import User
 
 __import__("pysqlite3")
@@ -60,16 +59,38 @@ class SummaryResponse(BaseModel):
     summary: str
 
 
-# Now import from the rag module
-from rag.query_data import query_rag_async, compare_standards_async
 class RagFileUploadResponse(BaseModel):
     message: str
     filename: str
     pages: Optional[int] = None
+    job_id: Optional[str] = None
+
+
+class IngestionJobResponse(BaseModel):
+    job_id: str
+    collection: str
+    filename: str
+    status: str  # queued, running, completed, failed, interrupted
+    total_pages: int
+    next_page: int
+    chunks: int
+    skipped: int
+    deleted: int
+    progress: float
+    error: Optional[str] = None
+    created_at: str
+    updated_at: str
 
 
 # Now import from the rag module
-from rag.query_data import query_rag_async, query_rag_with_file_async
+from rag.query_data import query_rag_async, query_rag_with_file_async, compare_standards_async, CHAT_MODEL
+from rag.utils.ollama_client import ollama_clients
+from rag.utils.ollama_router import ollama_router
+from rag.utils.scheduler import model_scheduler, OverloadedError, COMPARISON_LANE, SUMMARY_LANE
+from rag.utils.executor import run_blocking
+from rag.utils.pdf_pages import page_count
+from rag.vector_store import COLLECTION_NAME
+from rag.ingestion import ingestion_manager, IngestionConflictError
 
 
 # RAG query endpoint (non-streaming)
@@ -98,6 +119,8 @@ async def rag_query(
             response = "Sorry, I couldn't find an answer to your query."
         # Extract sources from the results if needed
         return RagQueryResponse(response=response, sources=[])
+    except OverloadedError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"RAG query failed: {str(e)}")
 
@@ -110,10 +133,13 @@ async def rag_query(
     name="rag:query_stream",
 )
 async def rag_query_stream(
+    request: Request,
     query_request: RagQueryRequest,
     current_user: User = Depends(require_active_user),
 ):
     """Submit a query to the RAG system and get a streaming response."""
+    # Reject right away rather than queueing behind a full model
+    model_scheduler.check_admission(query_request.model or CHAT_MODEL)
 
     async def generate_stream():
         try:
@@ -135,43 +161,18 @@ async def rag_query_stream(
                     sources_data = chunk["data"]
                     continue
                 elif chunk.get("type") == "content":
-                    # Create response in Ollama-like format
-                    response = {
-                        "model": query_request.model or "default_model",
-                        "created_at": datetime.datetime.now(
-                            datetime.timezone.utc
-                        ).isoformat()
-                        + "Z",
-                        "message": {"role": "assistant", "content": chunk["data"]},
-                        "done": False,
-                    }
-
-                    # Output as plain JSON with newline for NDJSON format
-                    yield json.dumps(response) + "\n"
+                    # Output the chunk in Ollama-like NDJSON format
+                    yield content_line(query_request.model or "default_model", chunk["data"])
 
             # Final message with done=true and sources
-            final_response = {
-                "model": query_request.model or "default_model",
-                "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat()
-                + "Z",
-                "message": {"role": "assistant", "content": ""},
-                "sources": sources_data,
-                "done": True,
-            }
-            yield json.dumps(final_response) + "\n"
+            yield final_line(query_request.model or "default_model", sources_data)
 
         except Exception as e:
-            error_response = {
-                "model": query_request.model or "default_model",
-                "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat()
-                + "Z",
-                "error": str(e),
-                "done": True,
-            }
-            yield json.dumps(error_response) + "\n"
+            yield error_line(query_request.model or "default_model", str(e))
 
+    # Stop generating as soon as the client goes away
     return StreamingResponse(
-        generate_stream(),
+        cancel_on_disconnect(request, generate_stream()),
         media_type="application/x-ndjson",
         headers={
             "Cache-Control": "no-cache",
@@ -238,6 +239,8 @@ async def compare_standards(
         return CompareResponse(response=response, sources=[])
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except OverloadedError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Comparison failed: {str(e)}")
 
@@ -250,10 +253,13 @@ async def compare_standards(
     name="rag:compare_stream",
 )
 async def compare_standards_stream(
+    request: Request,
     compare_request: CompareRequest,
     current_user: User = Depends(require_active_user),
 ):
     """Compare two electrical standards documents using RAG context with streaming response."""
+    # Reject right away rather than queueing behind a full model
+    model_scheduler.check_admission(compare_request.model or CHAT_MODEL, COMPARISON_LANE)
 
     async def generate_stream():
         try:
@@ -279,52 +285,20 @@ async def compare_standards_stream(
                     sources_data = chunk["data"]
                     continue
                 elif chunk.get("type") == "content":
-                    # Create response in Ollama-like format
-                    response = {
-                        "model": compare_request.model or "default_model",
-                        "created_at": datetime.datetime.now(
-                            datetime.timezone.utc
-                        ).isoformat()
-                        + "Z",
-                        "message": {"role": "assistant", "content": chunk["data"]},
-                        "done": False,
-                    }
-
-                    # Output as plain JSON with newline for NDJSON format
-                    yield json.dumps(response) + "\n"
+                    # Output the chunk in Ollama-like NDJSON format
+                    yield content_line(compare_request.model or "default_model", chunk["data"])
 
             # Final message with done=true and sources
-            final_response = {
-                "model": compare_request.model or "default_model",
-                "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat()
-                + "Z",
-                "message": {"role": "assistant", "content": ""},
-                "sources": sources_data,
-                "done": True,
-            }
-            yield json.dumps(final_response) + "\n"
+            yield final_line(compare_request.model or "default_model", sources_data)
 
         except ValueError as e:
-            error_response = {
-                "model": compare_request.model or "default_model",
-                "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat()
-                + "Z",
-                "error": f"Invalid request: {str(e)}",
-                "done": True,
-            }
-            yield json.dumps(error_response) + "\n"
+            yield error_line(compare_request.model or "default_model", f"Invalid request: {str(e)}")
         except Exception as e:
-            error_response = {
-                "model": compare_request.model or "default_model",
-                "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat()
-                + "Z",
-                "error": f"Comparison failed: {str(e)}",
-                "done": True,
-            }
-            yield json.dumps(error_response) + "\n"
+            yield error_line(compare_request.model or "default_model", f"Comparison failed: {str(e)}")
 
+    # Stop generating as soon as the client goes away
     return StreamingResponse(
-        generate_stream(),
+        cancel_on_disconnect(request, generate_stream()),
         media_type="application/x-ndjson",
         headers={
             "Cache-Control": "no-cache",
@@ -372,6 +346,8 @@ async def rag_query_with_file(
             if os.path.exists(tmp_path):
                 os.remove(tmp_path)
                 
+    except OverloadedError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"RAG query with file failed: {str(e)}")
 
@@ -379,43 +355,93 @@ async def rag_query_with_file(
 @router.post(
     "/upload",
     response_model=RagFileUploadResponse,
-    status_code=200,
+    status_code=202,
     response_description="File upload response",
     name="rag:upload_file",
 )
 async def upload_file(
     file: UploadFile = File(...),
-    current_user: User = Depends(require_active_user),
+    collection_name: Optional[str] = Form(None),
+    force: bool = Form(False),
+    current_user: User = Depends(require_admin),
 ):
-    """Upload a PDF file for the RAG system to process."""
+    """
+    Upload a PDF file and ingest it into a collection in the background.
+
+    A new version of a document only re-embeds the chunks that changed, unless
+    `force` is set. The returned job id gives the progress of the ingestion.
+    """
     try:
         # Validate file type
         if not file.filename.lower().endswith('.pdf'):
             raise HTTPException(status_code=400, detail="Only PDF files are supported")
-        
-        # Save the uploaded file to a temporary location
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-            content = await file.read()
-            tmp.write(content)
-            tmp_path = tmp.name
 
+        collection = collection_name or COLLECTION_NAME
+        content = await file.read()
         try:
-            # Get basic file info
-            file_size = len(content)
-            
-            return RagFileUploadResponse(
-                message="File uploaded successfully",
-                filename=file.filename,
-                pages=None,  # Could extract page count if needed
-            )
-        finally:
-            # Clean up the temporary file
-            if os.path.exists(tmp_path):
-                os.remove(tmp_path)
-                
+            pages = await run_blocking(page_count, content)
+        except RuntimeError:
+            # PyMuPDF errors on unreadable files
+            raise HTTPException(status_code=400, detail="Invalid PDF file")
+
+        try:
+            job = await ingestion_manager.upload(content, file.filename, collection, force=force)
+        except IngestionConflictError:
+            # A new version must not replace the file of a running ingestion
+            raise HTTPException(status_code=409, detail=f"{file.filename} is already being ingested")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return RagFileUploadResponse(
+            message="File uploaded, ingestion started",
+            filename=file.filename,
+            pages=pages,
+            job_id=job.job_id,
+        )
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"File upload failed: {str(e)}")
 
+
+@router.get(
+    "/upload/{job_id}",
+    response_model=IngestionJobResponse,
+    status_code=200,
+    response_description="Ingestion job progress",
+    name="rag:upload_status",
+)
+async def upload_status(
+    job_id: str,
+    current_user: User = Depends(require_admin),
+):
+    """Progress of the ingestion of an uploaded file."""
+    job = ingestion_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Ingestion job not found")
+    return IngestionJobResponse(**job.to_dict())
+
+
+@router.post(
+    "/upload/{job_id}/resume",
+    response_model=IngestionJobResponse,
+    status_code=202,
+    response_description="Resumed ingestion job",
+    name="rag:upload_resume",
+)
+async def upload_resume(
+    job_id: str,
+    current_user: User = Depends(require_admin),
+):
+    """Resume a failed or interrupted ingestion from its first page not fully written."""
+    try:
+        job = ingestion_manager.resume(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Ingestion job not found")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return IngestionJobResponse(**job.to_dict())
+
 # Summary generation endpoint
 @router.post(
     "/summary",
@@ -430,10 +456,6 @@ async def generate_summary(
 ):
     """Generate a short summary/title for chat conversation."""
     try:
-        # Use environment variable for Ollama URL
-        ollama_url = os.getenv("VITE_OLLAMA_BASE_URL", "http://localhost:11434")
-        endpoint = f"{ollama_url}/api/chat"
-        
         payload = {
             "model": summary_request.model,
             "messages": [
@@ -449,15 +471,22 @@ async def generate_summary(
             "stream": False,
         }
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(endpoint, json=payload)
-            response.raise_for_status()
-            
-            data = response.json()
-            summary = data.get("message", {}).get("content", "Chat").strip()
-            
-            return SummaryResponse(summary=summary)
+        # Shared client, the connection to Ollama is kept alive between calls
+        client = ollama_clients.http_client()
+        async with model_scheduler.slot(summary_request.model, SUMMARY_LANE):
+            response = await ollama_router.run(
+                summary_request.model,
+                lambda url: client.post(f"{url}/api/chat", json=payload),
+            )
+        response.raise_for_status()
+
+        data = response.json()
+        summary = data.get("message", {}).get("content", "Chat").strip()
+
+        return SummaryResponse(summary=summary)
             
+    except OverloadedError:
+        raise
     except httpx.HTTPError as e:
         raise HTTPException(status_code=500, detail=f"Failed to connect to Ollama: {str(e)}")
     except Exception as e:
@@ -2,6 +2,7 @@ from fastapi import APIRouter
 from app.api.endpoints import user as user_router
 from app.api.endpoints import rag as rag_router
 from app.api.endpoints import authentication as auth_router
+from app.api.endpoints import analytics as analytics_router
 
 router = APIRouter()
 
@@ -13,4 +14,7 @@ router.include_router(auth_router.router, tags=['AUTHENTICATION V1'], prefix='/a
 router.include_router(user_router.router, tags=['USER V1'], prefix='/api/v1/users')
 
 # Include RAG-related routes under the /api/v1 prefix and tag them as 'RAG V1'
-router.include_router(rag_router.router, tags=['RAG V1'], prefix='/api/v1/rag')
\ No newline at end of file
+router.include_router(rag_router.router, tags=['RAG V1'], prefix='/api/v1/rag')
+
+# Include query analytics routes under the /api/v1 prefix and tag them as 'ANALYTICS V1'
+router.include_router(analytics_router.router, tags=['ANALYTICS V1'], prefix='/api/v1/analytics')
\ No newline at end of file
@@ -0,0 +1,75 @@
+"""
+Query analytics: the records of the RAG requests are buffered in memory and
+written to MongoDB with `insert_many` by a background thread, so the request
+path never waits on the database.
+"""
+
+from typing import Any, Dict, List, Optional
+from loguru import logger
+from pydantic import ValidationError
+from app.core.config import (
+    MONGO_COLLECTION_QUERIES,
+    QUERY_ANALYTICS_BUFFER_SIZE,
+    QUERY_ANALYTICS_BATCH_SIZE,
+    QUERY_ANALYTICS_FLUSH_INTERVAL,
+)
+from app.model.query import QueryRecordDB
+from app.repository.query import QueryRepository
+from rag.utils.batch_writer import BatchWriter
+from rag.utils.instrumentation import add_trace_listener
+from rag.utils.normalization import normalize_query
+
+
+def to_query_record(record: Dict[str, Any]) -> QueryRecordDB:
+    """Builds the database model of a request trace record."""
+    fields = {name: value for name, value in record.items() if name in QueryRecordDB.model_fields}
+    query = record.get("query")
+    return QueryRecordDB(**fields, normalized_query=normalize_query(query) if query else None)
+
+
+class QueryAnalyticsWriter(BatchWriter):
+    """
+    Buffers query records and flushes them to MongoDB in batches.
+
+    Records are accepted once a repository is attached with `start`, and
+    ignored after `close`.
+    """
+
+    name = "query-analytics-writer"
+
+    def __init__(
+        self,
+        collection: str = MONGO_COLLECTION_QUERIES,
+        buffer_size: int = QUERY_ANALYTICS_BUFFER_SIZE,
+        batch_size: int = QUERY_ANALYTICS_BATCH_SIZE,
+        flush_interval: float = QUERY_ANALYTICS_FLUSH_INTERVAL,
+    ):
+        super().__init__(buffer_size, batch_size, flush_interval)
+        self.collection = collection
+        self.repository: Optional[QueryRepository] = None
+
+    def start(self, repository: QueryRepository) -> None:
+        self.repository = repository
+
+    def log(self, record: Dict[str, Any]) -> bool:
+        if self.repository is None:
+            return False
+        return super().log(record)
+
+    def write_batch(self, records: List[Dict[str, Any]]) -> None:
+        documents = []
+        for record in records:
+            try:
+                documents.append(to_query_record(record))
+            except ValidationError as e:
+                logger.warning(f"Skipping an invalid query record: {e}")
+        self.repository.insert_many(self.collection, documents)
+
+    def close(self, timeout: float = 5.0) -> None:
+        super().close(timeout)
+        self.repository = None
+
+
+# Create a global query analytics writer instance
+query_analytics = QueryAnalyticsWriter()
+add_trace_listener(query_analytics.log)
@@ -24,6 +24,17 @@ MONGODB_MAX_CONNECTIONS_COUNT: int = config("MONGODB_MAX_CONNECTIONS_COUNT", cas
 MONGODB_MIN_CONNECTIONS_COUNT: int = config("MONGODB_MIN_CONNECTIONS_COUNT", cast=int, default=1)
 
 MONGO_COLLECTION_USERS: str = config("MONGO_COLLECTION_USERS", default="users")
+MONGO_COLLECTION_QUERIES: str = config("MONGO_COLLECTION_QUERIES", default="queries")
+
+
+# ======= QUERY ANALYTICS ==========
+
+QUERY_ANALYTICS_ENABLED: bool = config("QUERY_ANALYTICS_ENABLED", cast=bool, default=True)
+# Query records are deleted by a TTL index after this many days
+QUERY_ANALYTICS_TTL_DAYS: int = config("QUERY_ANALYTICS_TTL_DAYS", cast=int, default=30)
+QUERY_ANALYTICS_BUFFER_SIZE: int = config("QUERY_ANALYTICS_BUFFER_SIZE", cast=int, default=10000)
+QUERY_ANALYTICS_BATCH_SIZE: int = config("QUERY_ANALYTICS_BATCH_SIZE", cast=int, default=200)
+QUERY_ANALYTICS_FLUSH_INTERVAL: float = config("QUERY_ANALYTICS_FLUSH_INTERVAL", cast=float, default=2.0)
 
 
 # =========== PROJECT ==========
@@ -5,7 +5,16 @@ from loguru import logger
 from pymongo import MongoClient
 from app.core.config import (
     MONGODB_URL, MONGODB_MAX_CONNECTIONS_COUNT, MONGODB_MIN_CONNECTIONS_COUNT,
+    MONGO_COLLECTION_QUERIES, QUERY_ANALYTICS_ENABLED, QUERY_ANALYTICS_TTL_DAYS,
 )
+from app.core.analytics import query_analytics
+from app.repository.query import QueryRepository
+from rag.vector_store import vector_store_registry
+from rag.utils.executor import shutdown_executor
+from rag.utils.ollama_client import ollama_clients
+from rag.utils.query_log import query_log
+from rag.utils.cache_warmer import cache_warmer, CACHE_WARMUP_ENABLED
+from rag.ingestion import ingestion_manager
 
 
 class MongoDB:
@@ -51,10 +60,146 @@ def mongodb_shutdown(app: FastAPI) -> None:
     app.state.mongo_client.close()
     logger.info('MondoDB connection closed! ')
 
+def vector_store_startup(app: FastAPI) -> None:
+    """
+    Opens the preloaded Chroma collections on application startup.
+
+    Args:
+        app (FastAPI): The FastAPI application instance.
+
+    The shared registry is stored in the app state so that every request reuses
+    the same vector store instances instead of re-opening them.
+    """
+    logger.info('Warming up the vector stores...')
+    warmed = vector_store_registry.warm()
+    app.state.vector_stores = vector_store_registry
+    logger.info(f'Vector stores ready: {warmed}')
+
+def vector_store_shutdown(app: FastAPI) -> None:
+    """
+    Releases the shared vector stores on application shutdown.
+
+    Args:
+        app (FastAPI): The FastAPI application instance.
+    """
+    logger.info('Closing the vector stores...')
+    shutdown_executor()
+    vector_store_registry.close()
+    logger.info('Vector stores closed! ')
+
+def ollama_startup(app: FastAPI) -> None:
+    """
+    Creates the shared, pooled Ollama clients on application startup.
+
+    Args:
+        app (FastAPI): The FastAPI application instance.
+    """
+    logger.info('Creating the Ollama client pool...')
+    ollama_clients.startup()
+    app.state.ollama_clients = ollama_clients
+    logger.info('Ollama client pool ready! ')
+
+async def ollama_shutdown(app: FastAPI) -> None:
+    """
+    Closes the pooled Ollama connections on application shutdown.
+
+    Args:
+        app (FastAPI): The FastAPI application instance.
+    """
+    logger.info('Closing the Ollama client pool...')
+    await ollama_clients.aclose()
+    logger.info('Ollama client pool closed! ')
+
+def query_analytics_startup(app: FastAPI) -> None:
+    """
+    Starts buffering the query records for MongoDB on application startup.
+
+    Args:
+        app (FastAPI): The FastAPI application instance.
+
+    Index creation failures are logged and do not prevent the application from starting.
+    """
+    if not QUERY_ANALYTICS_ENABLED:
+        return
+    logger.info('Starting the query analytics writer...')
+    repository = QueryRepository(mongo_db.client)
+    try:
+        repository.ensure_indexes(MONGO_COLLECTION_QUERIES, QUERY_ANALYTICS_TTL_DAYS * 24 * 3600)
+    except Exception as e:
+        logger.warning(f'Could not create the query analytics indexes: {e}')
+    query_analytics.start(repository)
+    logger.info('Query analytics writer ready! ')
+
+def query_analytics_shutdown(app: FastAPI) -> None:
+    """
+    Flushes the buffered query records to MongoDB on application shutdown.
+
+    Args:
+        app (FastAPI): The FastAPI application instance.
+    """
+    logger.info('Flushing the query analytics...')
+    query_analytics.close()
+    logger.info(f'Query analytics closed: {query_analytics.stats()}')
+
+def cache_warmup_startup(app: FastAPI) -> None:
+    """
+    Schedules the cache warm-up from the query log on application startup.
+
+    Args:
+        app (FastAPI): The FastAPI application instance.
+    """
+    if not CACHE_WARMUP_ENABLED:
+        return
+    logger.info('Scheduling the cache warm-up...')
+    cache_warmer.start()
+
+async def cache_warmup_shutdown(app: FastAPI) -> None:
+    """
+    Cancels the cache warm-up on application shutdown.
+
+    Args:
+        app (FastAPI): The FastAPI application instance.
+    """
+    await cache_warmer.stop()
+    logger.info(f'Cache warm-up stopped: {cache_warmer.stats()}')
+
+def ingestion_startup(app: FastAPI) -> None:
+    """
+    Loads the ingestion jobs and resumes the unfinished ones on application startup.
+
+    Args:
+        app (FastAPI): The FastAPI application instance.
+    """
+    resumed = ingestion_manager.start()
+    if resumed:
+        logger.info(f'Resuming {len(resumed)} ingestion job(s)...')
+
+async def ingestion_shutdown(app: FastAPI) -> None:
+    """
+    Interrupts the running ingestion jobs on application shutdown; they resume on the next startup.
+
+    Args:
+        app (FastAPI): The FastAPI application instance.
+    """
+    await ingestion_manager.stop()
+    logger.info('Ingestion jobs stopped')
+
+def query_log_shutdown(app: FastAPI) -> None:
+    """
+    Writes the pending query records on application shutdown.
+
+    Args:
+        app (FastAPI): The FastAPI application instance.
+    """
+    logger.info('Flushing the query log...')
+    query_log.close()
+    logger.info(f'Query log closed: {query_log.stats()}')
+
 
 def create_start_app_handler(app: FastAPI) -> Callable:
     """
-    Creates an application startup handler that connects to MongoDB.
+    Creates an application startup handler that connects to MongoDB, warms the vector stores,
+    starts the query analytics writer, schedules the cache warm-up and resumes the ingestion jobs.
 
     Args:
         app (FastAPI): The FastAPI application instance.
@@ -64,11 +209,17 @@ def create_start_app_handler(app: FastAPI) -> Callable:
     """
     def start_app() -> None:
         mongodb_startup(app)
+        vector_store_startup(app)
+        ollama_startup(app)
+        query_analytics_startup(app)
+        cache_warmup_startup(app)
+        ingestion_startup(app)
     return start_app
 
 def create_stop_app_handler(app: FastAPI) -> Callable:
     """
-    Creates an application shutdown handler that disconnects from MongoDB.
+    Creates an application shutdown handler that cancels the cache warm-up and the ingestion jobs, disconnects from MongoDB,
+    closes the vector stores and the Ollama connections, and flushes the logs.
 
     Args:
         app (FastAPI): The FastAPI application instance.
@@ -77,8 +228,17 @@ def create_stop_app_handler(app: FastAPI) -> Callable:
         Callable: A function that stops the MongoDB connection on application shutdown.
     """
     @logger.catch
-    def stop_app() -> None:
+    async def stop_app() -> None:
+        # The warm-up and the ingestion jobs are cancelled before the clients they use are closed
+        await cache_warmup_shutdown(app)
+        await ingestion_shutdown(app)
+        await ollama_shutdown(app)
+        # Pending records are written before the MongoDB client is closed
+        query_analytics_shutdown(app)
         mongodb_shutdown(app)
+        vector_store_shutdown(app)
+        query_log_shutdown(app)
+        await logger.complete()
     return stop_app
 
 @contextmanager
@@ -1,6 +1,6 @@
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from typing import AsyncGenerator, Callable, Type, Optional, Literal, Annotated
-from fastapi import Depends, Body, HTTPException, status
+from fastapi import Depends, Body, HTTPException, Query, status
 from pymongo import MongoClient
 import pymongo
 from starlette.requests import Request
@@ -9,6 +9,7 @@ import jwt
 from jwt.exceptions import InvalidTokenError
 from app.repository.base import BaseRepository
 from app.repository.user import UserRepository
+from app.repository.query import QueryRepository
 from app.model.user import UserDB
 from app.schema.user import (
     ListUsersResponse,
@@ -20,7 +21,19 @@ from app.schema.user import (
     User,
     Roles,
 )
-from app.core.config import MONGO_COLLECTION_USERS, SECRET_KEY, ALGORITHM, MONGODB_URL
+from app.schema.analytics import (
+    TopQuery,
+    TopQueriesResponse,
+    ModelLatency,
+    LatencyPercentilesResponse,
+)
+from app.core.config import (
+    MONGO_COLLECTION_USERS,
+    MONGO_COLLECTION_QUERIES,
+    SECRET_KEY,
+    ALGORITHM,
+    MONGODB_URL,
+)
 from app.core.security import oauth2_scheme, verify_password, get_password_hash
 
 
@@ -324,3 +337,69 @@ def onboard_user_action_dep(
         role=user_in_db.role,
         created_at=user_in_db.created_at,
     )
+
+
+# Get the most frequent queries of the last days
+def get_top_queries_dep(
+    days: int = Query(7, ge=1, le=365),
+    limit: int = Query(20, ge=1, le=100),
+    collection_name: Optional[str] = None,
+    endpoint: Optional[str] = None,
+    query_repo: QueryRepository = Depends(get_mongodb_repo(QueryRepository)),
+) -> TopQueriesResponse:
+
+    top_queries = query_repo.top_queries(
+        collection=MONGO_COLLECTION_QUERIES,
+        since=datetime.now(timezone.utc) - timedelta(days=days),
+        limit=limit,
+        collection_name=collection_name,
+        endpoints=[endpoint] if endpoint else None,
+    )
+
+    return TopQueriesResponse(
+        queries=[
+            TopQuery(
+                query=entry["query"],
+                count=entry["count"],
+                collections=entry["collections"],
+                average_latency=entry.get("average_latency"),
+                last_seen=entry["last_seen"],
+            )
+            for entry in top_queries
+        ],
+        meta={"days": days, "limit": limit, "collection_name": collection_name, "endpoint": endpoint},
+    )
+
+
+# Get the latency percentiles per model over the last days
+def get_latency_percentiles_dep(
+    days: int = Query(7, ge=1, le=365),
+    endpoint: Optional[str] = None,
+    query_repo: QueryRepository = Depends(get_mongodb_repo(QueryRepository)),
+) -> LatencyPercentilesResponse:
+
+    per_model = query_repo.latency_percentiles(
+        collection=MONGO_COLLECTION_QUERIES,
+        since=datetime.now(timezone.utc) - timedelta(days=days),
+        percentiles=(0.5, 0.95, 0.99),
+        endpoints=[endpoint] if endpoint else None,
+    )
+
+    models = []
+    for entry in per_model:
+        total = entry.get("total") or [None] * 3
+        ttft = entry.get("ttft") or [None] * 3
+        models.append(
+            ModelLatency(
+                model=entry["_id"],
+                count=entry["count"],
+                p50=total[0],
+                p95=total[1],
+                p99=total[2],
+                ttft_p50=ttft[0],
+                ttft_p95=ttft[1],
+                ttft_p99=ttft[2],
+            )
+        )
+
+    return LatencyPercentilesResponse(models=models, meta={"days": days, "endpoint": endpoint})
@@ -8,6 +8,7 @@ from starlette.requests import Request
 from starlette.responses import JSONResponse
 from starlette.status import HTTP_422_UNPROCESSABLE_ENTITY
 from loguru import logger  # Add this import
+from rag.utils.scheduler import OverloadedError
 
 
 def http_error_handler(_: Request, exc: HTTPException) -> JSONResponse:
@@ -27,6 +28,15 @@ def http_error_handler(_: Request, exc: HTTPException) -> JSONResponse:
     )
 
 
+def overloaded_error_handler(_: Request, exc: OverloadedError) -> JSONResponse:
+    logger.warning(f"OverloadedError: Status: {exc.status_code}, Detail: {exc}")
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
 def http422_error_handler(
     _: Request, exc: Union[RequestValidationError, ValidationError]
 ) -> JSONResponse:
@@ -0,0 +1,101 @@
+import json
+import asyncio
+import datetime
+from typing import AsyncIterator
+
+import anyio
+from loguru import logger
+from starlette.requests import Request
+
+# Interval between two checks of the client connection during a stream
+DISCONNECT_POLL_INTERVAL = 0.25
+
+
+def _created_at() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).isoformat() + "Z"
+
+
+def content_line(model: str, content: str) -> str:
+    """
+    Builds the NDJSON line of a streamed chunk, in the Ollama chat format.
+
+    Args:
+        model (str): Name of the model reported to the client.
+        content (str): Text of the chunk.
+
+    Returns:
+        str: The JSON envelope followed by a newline.
+    """
+    return json.dumps({
+        "model": model,
+        "created_at": _created_at(),
+        "message": {"role": "assistant", "content": content},
+        "done": False,
+    }) + "\n"
+
+
+def final_line(model: str, sources: str) -> str:
+    """Builds the last NDJSON line of a stream, carrying the sources."""
+    return json.dumps({
+        "model": model,
+        "created_at": _created_at(),
+        "message": {"role": "assistant", "content": ""},
+        "sources": sources,
+        "done": True,
+    }) + "\n"
+
+
+def error_line(model: str, error: str) -> str:
+    """Builds the NDJSON line ending a stream that failed."""
+    return json.dumps({
+        "model": model,
+        "created_at": _created_at(),
+        "error": error,
+        "done": True,
+    }) + "\n"
+
+
+async def _wait_for_disconnect(request: Request) -> None:
+    while not await request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL_INTERVAL)
+
+
+async def cancel_on_disconnect(request: Request, stream: AsyncIterator[str]) -> AsyncIterator[str]:
+    """
+    Relays a streaming response body and stops it as soon as the client disconnects.
+
+    The client connection is watched while the next chunk is being produced, so a
+    disconnect interrupts the stream even in the middle of a slow step (retrieval,
+    first token). The wrapped stream is then closed, which cancels the upstream
+    generation.
+
+    Args:
+        request (Request): The incoming request whose connection is watched.
+        stream (AsyncIterator[str]): The response body generator.
+
+    Yields:
+        str: The chunks of the wrapped stream.
+    """
+    watcher = asyncio.ensure_future(_wait_for_disconnect(request))
+    next_chunk = None
+    try:
+        while True:
+            next_chunk = asyncio.ensure_future(stream.__anext__())
+            await asyncio.wait({next_chunk, watcher}, return_when=asyncio.FIRST_COMPLETED)
+            if not next_chunk.done():
+                logger.info(f'Client disconnected from {request.url.path}, cancelling the stream')
+                return
+            try:
+                chunk = next_chunk.result()
+            except StopAsyncIteration:
+                return
+            yield chunk
+    finally:
+        watcher.cancel()
+        if next_chunk is not None and not next_chunk.done():
+            # Cancelling the pending step closes the model stream inside it
+            next_chunk.cancel()
+        with anyio.CancelScope(shield=True):
+            if next_chunk is not None:
+                await asyncio.gather(next_chunk, return_exceptions=True)
+            await stream.aclose()
@@ -1,9 +1,13 @@
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException
 from starlette.middleware.cors import CORSMiddleware
 from app.core.exceptions import http_error_handler
 from app.core.exceptions import http422_error_handler
+from app.core.exceptions import overloaded_error_handler
+from rag.utils.scheduler import OverloadedError
+from rag.utils.metrics import metrics_registry, CONTENT_TYPE_LATEST
 from app.api.routes import router as api_router
 from app.core.config import ALLOWED_HOSTS, DEBUG, PROJECT_NAME, VERSION, LOG_LEVEL, DEPLOYMENT_ENV
 from app.core.database import create_start_app_handler, create_stop_app_handler
@@ -38,6 +42,7 @@ def setup_logging():
     # This will capture logs from libraries like Uvicorn
     logging.basicConfig(handlers=[InterceptHandler()], level=0, force=True)
 
+    # enqueue=True: sinks are written by a background thread, so logging never blocks the event loop
     if DEPLOYMENT_ENV == "local" or DEPLOYMENT_ENV == "development":
         # Human-readable format for development, with colors
         log_format = (
@@ -45,10 +50,10 @@ def setup_logging():
             "<level>{level: <8}</level> | "
             "<cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>"
         )
-        logger.add(sys.stderr, format=log_format, level=LOG_LEVEL, colorize=True)
+        logger.add(sys.stderr, format=log_format, level=LOG_LEVEL, colorize=True, enqueue=True)
     else:
         # JSON format for production
-        logger.add(sys.stderr, level=LOG_LEVEL, serialize=True)
+        logger.add(sys.stderr, level=LOG_LEVEL, serialize=True, enqueue=True)
 
     logger.info(f"Logging configured for '{DEPLOYMENT_ENV}' environment with level: {LOG_LEVEL}")
     logger.info(f"FastAPI Project: {PROJECT_NAME}, Version: {VERSION}, Debug: {DEBUG}")
@@ -66,9 +71,18 @@ def get_application() -> FastAPI:
     # Register custom exception handlers
     application.add_exception_handler(HTTPException, http_error_handler)
     application.add_exception_handler(RequestValidationError, http422_error_handler)
+    application.add_exception_handler(OverloadedError, overloaded_error_handler)
     
     # Include the API router
     application.include_router(api_router)
+
+    # Prometheus scrape endpoint
+    @application.get("/metrics", include_in_schema=False)
+    async def metrics() -> PlainTextResponse:
+        return PlainTextResponse(
+            metrics_registry.render(),
+            media_type=CONTENT_TYPE_LATEST,
+        )
     
     # Set up CORS middleware
     application.add_middleware(
@@ -0,0 +1,45 @@
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+from datetime import datetime, timezone
+from bson import ObjectId
+from app.model.user import PyObjectId
+
+
+class QueryRecordDB(BaseModel):
+    """
+    A Pydantic model representing a RAG query record in the database.
+
+    Latencies are in seconds. `normalized_query` groups the queries that only
+    differ by case or spacing.
+    """
+    id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
+    timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    endpoint: str
+    model: str
+    collection: str
+    query: Optional[str] = None
+    normalized_query: Optional[str] = None
+    outcome: str
+    status: Optional[str] = None
+    mode: Optional[str] = None
+    scores: List[float] = Field(default_factory=list)
+    chunk_ids: List[Optional[str]] = Field(default_factory=list)
+    latencies: Dict[str, float] = Field(default_factory=dict)
+    ttft: Optional[float] = None
+    total: float
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+    class Config:
+        """
+        Configuration for the Pydantic model.
+
+        Settings:
+            validate_by_name: Allows the model to populate fields using the field's alias.
+            arbitrary_types_allowed: Allows the use of arbitrary Python types like ObjectId.
+            json_encoders: Custom JSON encoder for ObjectId to convert it to a string.
+        """
+        validate_by_name = True
+        arbitrary_types_allowed = True
+        json_encoders = {ObjectId: str}
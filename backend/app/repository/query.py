@@ -0,0 +1,133 @@
+from datetime import datetime
+from typing import List, Optional, Sequence
+from pymongo import MongoClient, ASCENDING, DESCENDING
+from app.core.config import MONGO_COLLECTION_QUERIES
+from app.repository.base import BaseRepository
+from app.model.query import QueryRecordDB
+
+
+class QueryRepository(BaseRepository):
+    """
+    Repository class for the RAG query records stored in MongoDB.
+
+    Records are written in batches and expire through a TTL index on their timestamp.
+    The analytics aggregations run on the server side.
+    """
+
+    def __init__(self, mongo: MongoClient):
+        """
+        Initializes the QueryRepository with the MongoDB client.
+
+        Args:
+            mongo (MongoClient): The MongoDB client instance.
+        """
+        self._mongo = mongo
+        super().__init__(mongo)
+
+    def ensure_indexes(self, collection: MONGO_COLLECTION_QUERIES, ttl_seconds: int) -> None:
+        """
+        Creates the TTL index expiring old records and the index used by the per-model aggregations.
+
+        Args:
+            collection: Name of the query records collection
+            ttl_seconds: Age in seconds after which records are deleted
+        """
+        self.database[collection].create_index(
+            [("timestamp", ASCENDING)], expireAfterSeconds=ttl_seconds, name="timestamp_ttl"
+        )
+        self.database[collection].create_index(
+            [("model", ASCENDING), ("timestamp", DESCENDING)], name="model_timestamp"
+        )
+
+    def insert_many(self, collection: MONGO_COLLECTION_QUERIES, records: Sequence[QueryRecordDB]) -> int:
+        """
+        Inserts a batch of records in a single round trip.
+
+        Returns:
+            int: Number of records inserted
+        """
+        if not records:
+            return 0
+        result = self.database[collection].insert_many(
+            [record.model_dump(by_alias=True) for record in records], ordered=False
+        )
+        return len(result.inserted_ids)
+
+    def top_queries(
+        self,
+        collection: MONGO_COLLECTION_QUERIES,
+        since: datetime,
+        limit: int = 20,
+        collection_name: Optional[str] = None,
+        endpoints: Optional[List[str]] = None,
+    ) -> List[dict]:
+        """
+        Most frequent queries since a date, grouped by normalized text.
+
+        Args:
+            collection: Name of the query records collection
+            since: Only records after this date are counted
+            limit: Number of queries returned
+            collection_name: Only count the queries on this vector store collection
+            endpoints: Only count the queries sent to these endpoints
+        """
+        match = {"timestamp": {"$gte": since}, "normalized_query": {"$ne": None}}
+        if collection_name:
+            match["collection"] = collection_name
+        if endpoints:
+            match["endpoint"] = {"$in": endpoints}
+
+        pipeline = [
+            {"$match": match},
+            {"$sort": {"timestamp": DESCENDING}},
+            {
+                "$group": {
+                    "_id": "$normalized_query",
+                    "query": {"$first": "$query"},
+                    "count": {"$sum": 1},
+                    "collections": {"$addToSet": "$collection"},
+                    "average_latency": {"$avg": "$total"},
+                    "last_seen": {"$first": "$timestamp"},
+                }
+            },
+            {"$sort": {"count": DESCENDING, "last_seen": DESCENDING}},
+            {"$limit": limit},
+        ]
+        return list(self.database[collection].aggregate(pipeline))
+
+    def latency_percentiles(
+        self,
+        collection: MONGO_COLLECTION_QUERIES,
+        since: datetime,
+        percentiles: Sequence[float] = (0.5, 0.95, 0.99),
+        endpoints: Optional[List[str]] = None,
+    ) -> List[dict]:
+        """
+        Percentiles of the total latency and time to first token, per model.
+
+        Uses the approximate `$percentile` accumulator (MongoDB 7.0+).
+
+        Returns:
+            List[dict]: One document per model with `count`, `total` and `ttft` percentile lists
+        """
+        match = {"timestamp": {"$gte": since}}
+        if endpoints:
+            match["endpoint"] = {"$in": endpoints}
+
+        pipeline = [
+            {"$match": match},
+            {
+                "$group": {
+                    "_id": "$model",
+                    "count": {"$sum": 1},
+                    "total": {
+                        "$percentile": {"input": "$total", "p": list(percentiles), "method": "approximate"}
+                    },
+                    "ttft": {
+                        "$percentile": {"input": "$ttft", "p": list(percentiles), "method": "approximate"}
+                    },
+                }
+            },
+            {"$sort": {"count": DESCENDING}},
+        ]
+        return list(self.database[collection].aggregate(pipeline))
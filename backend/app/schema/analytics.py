@@ -0,0 +1,57 @@
+from pydantic import BaseModel
+from typing import List, Optional, Dict, Union
+from datetime import datetime
+
+
+class TopQuery(BaseModel):
+    """
+    Schema for a frequently asked query.
+
+    Attributes:
+        query (str): Most recent wording of the query.
+        count (int): Number of times the query was asked.
+        collections (List[str]): Vector store collections the query was asked on.
+        average_latency (Optional[float]): Average total latency in seconds.
+        last_seen (datetime): When the query was last asked.
+    """
+
+    query: str
+    count: int
+    collections: List[str]
+    average_latency: Optional[float] = None
+    last_seen: datetime
+
+
+class TopQueriesResponse(BaseModel):
+    """
+    Response schema for the most frequent queries.
+    """
+
+    queries: List[TopQuery]
+    meta: Optional[Dict[str, Union[str, int, None]]]
+
+
+class ModelLatency(BaseModel):
+    """
+    Schema for the latency percentiles of a model, in seconds.
+
+    `ttft_*` fields are only set for streamed requests.
+    """
+
+    model: str
+    count: int
+    p50: Optional[float] = None
+    p95: Optional[float] = None
+    p99: Optional[float] = None
+    ttft_p50: Optional[float] = None
+    ttft_p95: Optional[float] = None
+    ttft_p99: Optional[float] = None
+
+
+class LatencyPercentilesResponse(BaseModel):
+    """
+    Response schema for the latency percentiles per model.
+    """
+
+    models: List[ModelLatency]
+    meta: Optional[Dict[str, Union[str, int, None]]]
@@ -1,10 +1,65 @@
 import os
-from typing import Optional
+import hashlib
+from typing import Dict, Optional, Tuple
 from dotenv import load_dotenv
 from langchain_core.embeddings import Embeddings
 from langchain_ollama import OllamaEmbeddings
 
+from rag.utils.cache import TTLCache
+from rag.utils.embedding_batcher import BatchedEmbeddings, EmbeddingBatcher
+from rag.utils.embedding_cache import CachedEmbeddings, DiskEmbeddingStore
+from rag.utils.ollama_client import client_kwargs as ollama_client_kwargs
+from rag.utils.ollama_router import ollama_router
+from rag.utils.routed_embeddings import RoutedEmbeddings
+
 load_dotenv()
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+# Directory of the persistent embedding cache, the disk tier is disabled when unset
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR")
+# Concurrent query embeddings are grouped into one Ollama call
+EMBEDDING_BATCH_ENABLED = os.getenv("EMBEDDING_BATCH_ENABLED", "true").lower() == "true"
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "32"))
+EMBEDDING_BATCH_MAX_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "5"))
+
+# Batchers and cache tiers are shared by every embeddings object of the same provider,
+# model and endpoint (a base URL, or "routed" for the router's backends). A model tag
+# may name different weights on two servers, so their vectors are never mixed.
+_memory_caches: Dict[Tuple[str, str, str], TTLCache] = {}
+_disk_stores: Dict[Tuple[str, str, str], DiskEmbeddingStore] = {}
+_batchers: Dict[Tuple[str, str, str], EmbeddingBatcher] = {}
+
+
+def _batched(base_embeddings: Embeddings, provider: str, model: str, endpoint: str) -> BatchedEmbeddings:
+    batcher_key = (provider, model, endpoint)
+    if batcher_key not in _batchers:
+        _batchers[batcher_key] = EmbeddingBatcher(
+            base_embeddings,
+            max_batch_size=EMBEDDING_BATCH_MAX_SIZE,
+            max_wait_ms=EMBEDDING_BATCH_MAX_WAIT_MS,
+        )
+    return BatchedEmbeddings(base_embeddings, _batchers[batcher_key])
+
+
+def _cached(base_embeddings: Embeddings, provider: str, model: str, endpoint: str) -> CachedEmbeddings:
+    cache_key = (provider, model, endpoint)
+    if cache_key not in _memory_caches:
+        _memory_caches[cache_key] = TTLCache(max_size=EMBEDDING_CACHE_SIZE)
+
+    if EMBEDDING_CACHE_DIR and cache_key not in _disk_stores:
+        model_digest = hashlib.sha256(f"{model}@{endpoint}".encode("utf-8")).hexdigest()[:16]
+        _disk_stores[cache_key] = DiskEmbeddingStore(
+            os.path.join(EMBEDDING_CACHE_DIR, f"{provider}-{model_digest}")
+        )
+
+    return CachedEmbeddings(
+        base_embeddings,
+        provider=provider,
+        model=model,
+        memory_cache=_memory_caches[cache_key],
+        disk_store=_disk_stores.get(cache_key),
+    )
+
 
 def embedding(provider: Optional[str] = None, model: Optional[str] = None, base_url: Optional[str] = None):
     """
@@ -16,7 +71,7 @@ def embedding(provider: Optional[str] = None, model: Optional[str] = None, base_
         base_url: Optional base URL for API (overrides env var VITE_OLLAMA_BASE_URL)
     
     Returns:
-        Embeddings: A LangChain embeddings object
+        Embeddings: A LangChain embeddings object, wrapped in a cache unless EMBEDDING_CACHE_ENABLED is false
     """
     selected_provider = provider or os.getenv("EMBEDDING_PROVIDER", "ollama").lower()
     print(f"Selected embedding provider: {selected_provider}")
@@ -28,11 +83,26 @@ def embedding(provider: Optional[str] = None, model: Optional[str] = None, base_
         ollama_model = model or os.getenv("OLLAMA_EMBED_MODEL")
         print(f"Using Ollama model: {ollama_model} at {ollama_base_url}")
         
-        base_embeddings = OllamaEmbeddings(
-            base_url=ollama_base_url,
-            model=ollama_model,
-        )
+        if base_url is None and len(ollama_router.backends) > 1:
+            # Spread over the configured backends, with hedged query embeddings
+            base_embeddings = RoutedEmbeddings(
+                ollama_model, ollama_router, max_hedged_batch=EMBEDDING_BATCH_MAX_SIZE
+            )
+            endpoint = "routed"
+        else:
+            base_embeddings = OllamaEmbeddings(
+                base_url=ollama_base_url,
+                model=ollama_model,
+                client_kwargs=ollama_client_kwargs(),
+            )
+            endpoint = ollama_base_url or ""
     else:
         raise ValueError(f"Unsupported embedding provider: '{selected_provider}'.")
 
-    return base_embeddings
\ No newline at end of file
+    if EMBEDDING_BATCH_ENABLED:
+        base_embeddings = _batched(base_embeddings, selected_provider, ollama_model or "", endpoint)
+
+    if EMBEDDING_CACHE_ENABLED:
+        return _cached(base_embeddings, selected_provider, ollama_model or "", endpoint)
+
+    return base_embeddings
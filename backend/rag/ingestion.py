@@ -0,0 +1,548 @@
+"""
+Ingestion of PDF documents into the Chroma collections.
+
+A job streams a document through the pipeline: page ranges are extracted,
+cleaned and chunked in worker processes a few ranges ahead, the chunks are
+embedded in batches with the collection's embedding function, and upserted
+in batches while the next batch is being embedded.
+
+Progress is saved after every upsert. An interrupted or failed job resumes
+from the first page whose chunks were not all written; upserts are keyed by
+the chunk ids ("path:page:idx"), so pages written twice are not duplicated.
+
+Each document has a manifest of the content hashes of its chunks. When a
+revised document is ingested again, only the chunks whose hash changed are
+embedded and upserted, and the chunks that disappeared are deleted.
+"""
+
+import os
+import re
+import json
+import hashlib
+import uuid
+import asyncio
+import logging
+from collections import deque
+from dataclasses import dataclass, field, asdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+from dotenv import load_dotenv
+
+from rag.vector_store import vector_store_registry, VectorStoreRegistry
+from rag.utils.executor import run_blocking, run_in_process, RAG_PROCESS_WORKERS
+from rag.utils.pdf_pages import Chunk, extract_page_chunks, page_count
+
+load_dotenv()
+# Uploaded documents are kept under <INGESTION_DATA_PATH>/<collection>/ so jobs can resume
+INGESTION_DATA_PATH = os.getenv("INGESTION_DATA_PATH") or str(Path(__file__).parent / "data")
+# One JSON file per job with its progress
+INGESTION_JOBS_PATH = os.getenv("INGESTION_JOBS_PATH") or str(
+    Path(__file__).parent / "output" / "ingestion"
+)
+# Pages extracted per worker task, and chunks per embedding call
+INGESTION_PAGE_BATCH = int(os.getenv("INGESTION_PAGE_BATCH", "16"))
+INGESTION_EMBED_BATCH = int(os.getenv("INGESTION_EMBED_BATCH", "64"))
+INGESTION_CHUNK_SIZE = int(os.getenv("INGESTION_CHUNK_SIZE", "1000"))
+INGESTION_CHUNK_OVERLAP = int(os.getenv("INGESTION_CHUNK_OVERLAP", "200"))
+# Jobs running at once, the others wait in order
+INGESTION_MAX_JOBS = int(os.getenv("INGESTION_MAX_JOBS", "1"))
+INGESTION_RESUME_ON_STARTUP = os.getenv("INGESTION_RESUME_ON_STARTUP", "true").lower() == "true"
+# Content hashes of the ingested documents (defaults to <INGESTION_JOBS_PATH>/manifests)
+INGESTION_MANIFESTS_PATH = os.getenv("INGESTION_MANIFESTS_PATH")
+
+# Manifests recorded with another embedding model are not used to skip chunks
+_embedding_model = f'{os.getenv("EMBEDDING_PROVIDER", "ollama").lower()}/{os.getenv("OLLAMA_EMBED_MODEL") or ""}'
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+INTERRUPTED = "interrupted"
+
+# Collection names accepted by Chroma, also used as directory names
+_collection_pattern = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{1,61}[A-Za-z0-9]$")
+
+
+class IngestionConflictError(ValueError):
+    """Raised when a document is already being ingested into the collection."""
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _write_json(path: str, data: Dict[str, Any]) -> None:
+    # Written then renamed, so a crash never leaves a truncated file
+    temporary = path + ".tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(temporary, path)
+
+
+def _page_of(identifier: str) -> int:
+    return int(identifier.rsplit(":", 2)[1])
+
+
+@dataclass
+class IngestionJob:
+    """
+    Progress of the ingestion of a document.
+
+    Attributes:
+        path (str): Location of the PDF file on disk.
+        source (str): Document path stored in the chunk ids, "data/<collection>/<filename>".
+        next_page (int): First page whose chunks are not all written yet.
+        chunks (int): Chunks embedded and upserted.
+        skipped (int): Unchanged chunks of a previous ingestion, not embedded again.
+        deleted (int): Chunks of a previous ingestion that are gone from the document.
+        force (bool): Embed every chunk, even the unchanged ones.
+    """
+
+    job_id: str
+    collection: str
+    filename: str
+    path: str
+    source: str
+    status: str = QUEUED
+    total_pages: int = 0
+    next_page: int = 0
+    chunks: int = 0
+    skipped: int = 0
+    deleted: int = 0
+    force: bool = False
+    error: Optional[str] = None
+    created_at: str = field(default_factory=_now)
+    updated_at: str = field(default_factory=_now)
+
+    @property
+    def progress(self) -> float:
+        if self.status == COMPLETED:
+            return 1.0
+        return self.next_page / self.total_pages if self.total_pages else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), "progress": round(self.progress, 4)}
+
+
+async def _extract_in_process(*args) -> List[Chunk]:
+    return await run_in_process(extract_page_chunks, *args)
+
+
+class IngestionManager:
+    """
+    Runs, tracks and resumes the ingestion jobs.
+
+    Attributes:
+        jobs (Dict[str, IngestionJob]): Every known job, including the finished ones.
+    """
+
+    def __init__(
+        self,
+        jobs_path: str = INGESTION_JOBS_PATH,
+        data_path: str = INGESTION_DATA_PATH,
+        registry: VectorStoreRegistry = vector_store_registry,
+        page_batch: int = INGESTION_PAGE_BATCH,
+        embed_batch: int = INGESTION_EMBED_BATCH,
+        chunk_size: int = INGESTION_CHUNK_SIZE,
+        chunk_overlap: int = INGESTION_CHUNK_OVERLAP,
+        max_jobs: int = INGESTION_MAX_JOBS,
+        extract: Callable[..., Awaitable[List[Chunk]]] = _extract_in_process,
+        extract_ahead: int = 2 * RAG_PROCESS_WORKERS,
+        manifests_path: Optional[str] = INGESTION_MANIFESTS_PATH,
+        embedding_model: str = _embedding_model,
+    ):
+        self.jobs_path = jobs_path
+        self.manifests_path = manifests_path or os.path.join(jobs_path, "manifests")
+        self.embedding_model = embedding_model
+        self.data_path = data_path
+        self.registry = registry
+        self.page_batch = max(1, page_batch)
+        self.embed_batch = max(1, embed_batch)
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.max_jobs = max(1, max_jobs)
+        self.extract = extract
+        self.extract_ahead = max(1, extract_ahead)
+        self.jobs: Dict[str, IngestionJob] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._uploads: Optional[asyncio.Lock] = None
+        # Documents whose uploaded file is being written
+        self._storing: Set[Tuple[str, str]] = set()
+
+    def _job_file(self, job_id: str) -> str:
+        return os.path.join(self.jobs_path, f"{job_id}.json")
+
+    def _save(self, job: IngestionJob) -> None:
+        job.updated_at = _now()
+        os.makedirs(self.jobs_path, exist_ok=True)
+        _write_json(self._job_file(job.job_id), asdict(job))
+
+    def _manifest_file(self, job: IngestionJob) -> str:
+        key = hashlib.sha256(f"{job.collection}/{job.source}".encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.manifests_path, f"{key}.json")
+
+    def _load_manifest(self, job: IngestionJob, store) -> Dict[str, Optional[str]]:
+        """
+        Content hashes of the chunks written by the previous ingestions of a document, by chunk id.
+
+        Every chunk of the document in the collection is listed, so that the ones that
+        disappeared are deleted. Chunks without a hash in the manifest (missing manifest,
+        another embedding model) are embedded again; chunks in the manifest but no longer
+        in the collection, e.g. after a reset, are not listed and are embedded again too.
+        """
+        hashes: Dict[str, str] = {}
+        try:
+            with open(self._manifest_file(job), encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("embedding") == self.embedding_model:
+                hashes = manifest.get("chunks", {})
+        except FileNotFoundError:
+            pass
+        except (OSError, json.JSONDecodeError) as e:
+            logging.warning(f"Ignoring unreadable manifest of {job.source}: {e}")
+
+        stored = store._collection.get(where={"source": job.source}, include=[])["ids"]
+        return {identifier: hashes.get(identifier) for identifier in stored}
+
+    def _save_manifest(self, job: IngestionJob, manifest: Dict[str, Optional[str]]) -> None:
+        os.makedirs(self.manifests_path, exist_ok=True)
+        _write_json(self._manifest_file(job), {
+            "collection": job.collection,
+            "source": job.source,
+            "embedding": self.embedding_model,
+            "chunks": manifest,
+        })
+
+    def load(self) -> List[IngestionJob]:
+        """Reads the saved jobs. Returns the unfinished ones."""
+        if os.path.isdir(self.jobs_path):
+            for name in sorted(os.listdir(self.jobs_path)):
+                if not name.endswith(".json"):
+                    continue
+                try:
+                    with open(os.path.join(self.jobs_path, name), encoding="utf-8") as f:
+                        job = IngestionJob(**json.load(f))
+                except (OSError, TypeError, json.JSONDecodeError) as e:
+                    logging.warning(f"Ignoring unreadable ingestion job {name}: {e}")
+                    continue
+                self.jobs.setdefault(job.job_id, job)
+        return [job for job in self.jobs.values() if job.status in (QUEUED, RUNNING, INTERRUPTED)]
+
+    def document_path(self, filename: str, collection: str) -> Tuple[str, str]:
+        """
+        Location of an uploaded document.
+
+        Returns:
+            Tuple[str, str]: The file path, and the source path used in the chunk ids
+
+        Raises:
+            ValueError: If the collection name is not a valid Chroma collection name
+        """
+        if not _collection_pattern.match(collection or ""):
+            raise ValueError(f"Invalid collection name: {collection!r}")
+        # Colons would break the "path:page:idx" chunk ids
+        filename = os.path.basename(filename).replace(":", "_")
+        return os.path.join(self.data_path, collection, filename), f"data/{collection}/{filename}"
+
+    async def upload(
+        self, content: bytes, filename: str, collection: str, force: bool = False
+    ) -> IngestionJob:
+        """
+        Keeps an uploaded document, replacing a previous version, and submits its ingestion.
+
+        The check, the write and the submission are done under one lock, so an
+        upload never replaces the file of a running job.
+
+        Raises:
+            ValueError: If the collection name is not a valid Chroma collection name
+            IngestionConflictError: If the document is being ingested
+        """
+        path, source = self.document_path(filename, collection)
+        if self._uploads is None:
+            self._uploads = asyncio.Lock()
+        async with self._uploads:
+            self._check_idle(collection, source)
+            self._storing.add((collection, source))
+            try:
+                await run_blocking(self._write_upload, path, content)
+            finally:
+                self._storing.discard((collection, source))
+            return self.submit(path, source, collection, filename, force)
+
+    @staticmethod
+    def _write_upload(path: str, content: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(content)
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        return self.jobs.get(job_id)
+
+    def active_job(self, collection: str, source: str) -> Optional[IngestionJob]:
+        """The scheduled job ingesting a document, if any."""
+        for job_id in self._tasks:
+            job = self.jobs[job_id]
+            if job.collection == collection and job.source == source:
+                return job
+        return None
+
+    def _check_idle(self, collection: str, source: str) -> None:
+        if (collection, source) in self._storing or self.active_job(collection, source) is not None:
+            raise IngestionConflictError(f"{source} is already being ingested into '{collection}'")
+
+    def submit(
+        self,
+        path: str,
+        source: str,
+        collection: str,
+        filename: Optional[str] = None,
+        force: bool = False,
+    ) -> IngestionJob:
+        """
+        Creates an ingestion job and schedules it.
+
+        Unfinished jobs of a previous version of the document are marked as failed,
+        they cannot be resumed.
+
+        Args:
+            path: Location of the PDF file
+            source: Document path stored in the chunk ids
+            collection: Target Chroma collection
+            filename: Name of the document shown to users (defaults to the file name)
+            force: Embed every chunk, even those unchanged since the previous ingestion
+
+        Raises:
+            IngestionConflictError: If the document is being ingested
+        """
+        self._check_idle(collection, source)
+        job = IngestionJob(
+            job_id=uuid.uuid4().hex,
+            collection=collection,
+            filename=filename or os.path.basename(path),
+            path=path,
+            source=source,
+            force=force,
+        )
+        for previous in self.jobs.values():
+            if (previous.collection, previous.source) == (collection, source) and previous.status != COMPLETED:
+                previous.status = FAILED
+                previous.error = f"Superseded by job {job.job_id}"
+                self._save(previous)
+        self.jobs[job.job_id] = job
+        self._save(job)
+        self._schedule(job)
+        return job
+
+    def resume(self, job_id: str) -> IngestionJob:
+        """
+        Schedules an unfinished job again, from its first page not fully written.
+
+        Raises:
+            KeyError: If the job is unknown
+            ValueError: If the job is running, completed or superseded, or its document is being ingested
+        """
+        job = self.jobs[job_id]
+        if job.status == COMPLETED or job_id in self._tasks:
+            raise ValueError(f"Ingestion job {job_id} is {job.status}")
+        if job.error and job.error.startswith("Superseded"):
+            raise ValueError(f"Ingestion job {job_id} was superseded by a newer upload")
+        self._check_idle(job.collection, job.source)
+        job.status = QUEUED
+        job.error = None
+        self._save(job)
+        self._schedule(job)
+        return job
+
+    def _schedule(self, job: IngestionJob) -> None:
+        task = asyncio.get_running_loop().create_task(self._run(job))
+        self._tasks[job.job_id] = task
+        task.add_done_callback(lambda _task: self._tasks.pop(job.job_id, None))
+
+    async def wait(self, job_id: str) -> IngestionJob:
+        """Waits for a scheduled job to stop and returns it."""
+        task = self._tasks.get(job_id)
+        if task is not None:
+            await asyncio.shield(task)
+        return self.jobs[job_id]
+
+    async def _run(self, job: IngestionJob) -> None:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_jobs)
+        async with self._slots:
+            job.status = RUNNING
+            self._save(job)
+            store = None
+            try:
+                if not job.total_pages:
+                    job.total_pages = await run_blocking(page_count, job.path)
+                store = await run_blocking(self.registry.get, job.collection)
+                logging.info(
+                    f"Ingesting {job.source} into '{job.collection}' from page {job.next_page}/{job.total_pages}"
+                )
+                await self._ingest(job, store)
+                job.status = COMPLETED
+                job.next_page = job.total_pages
+                logging.info(
+                    f"Ingested {job.source}: {job.chunks} chunks written, "
+                    f"{job.skipped} unchanged, {job.deleted} deleted"
+                )
+            except asyncio.CancelledError:
+                job.status = INTERRUPTED
+                raise
+            except Exception as e:
+                job.status = FAILED
+                job.error = str(e)
+                logging.error(f"Ingestion of {job.source} failed at page {job.next_page}: {e}")
+            finally:
+                self._save(job)
+                if store is not None:
+                    # Cached retrievals and answers of the collection are stale,
+                    # even after a failure: some batches may have been written
+                    self.registry.invalidate(job.collection)
+
+    async def _ingest(self, job: IngestionJob, store) -> None:
+        manifest = await run_blocking(self._load_manifest, job, store)
+        # Chunk ids of the previous ingestions by page, to find the chunks that disappeared
+        previous: Dict[int, List[str]] = {}
+        for identifier in manifest:
+            previous.setdefault(_page_of(identifier), []).append(identifier)
+
+        buffer: List[Chunk] = []
+        changed = False
+        # Counted on the job with the pages they belong to, so a resumed job does not count them twice
+        skipped = deleted = 0
+        async for first_page, end_page, chunks in self._extract_pages(job):
+            extracted = {identifier for identifier, _text, _metadata in chunks}
+            removed = [
+                identifier
+                for page in range(first_page, end_page)
+                for identifier in previous.pop(page, [])
+                if identifier not in extracted
+            ]
+            if removed:
+                await self._delete(store, manifest, removed)
+                deleted += len(removed)
+                changed = True
+            for chunk in chunks:
+                identifier, _text, metadata = chunk
+                if not job.force and manifest.get(identifier) == metadata["hash"]:
+                    skipped += 1
+                else:
+                    buffer.append(chunk)
+            if 0 < len(buffer) < self.embed_batch:
+                continue
+            if buffer:
+                await self._flush(job, store, manifest, buffer)
+                buffer = []
+                changed = True
+            # Pages are only passed once their chunks are written and recorded
+            job.next_page = end_page
+            job.skipped += skipped
+            job.deleted += deleted
+            skipped = deleted = 0
+            if changed:
+                await run_blocking(self._save_manifest, job, manifest)
+                changed = False
+            self._save(job)
+
+        # Pages past the end of a shorter revision
+        removed = [
+            identifier
+            for page, identifiers in previous.items()
+            if page >= job.total_pages
+            for identifier in identifiers
+        ]
+        if removed:
+            await self._delete(store, manifest, removed)
+            deleted += len(removed)
+            changed = True
+        if buffer:
+            await self._flush(job, store, manifest, buffer)
+            changed = True
+        if changed:
+            await run_blocking(self._save_manifest, job, manifest)
+        job.skipped += skipped
+        job.deleted += deleted
+
+    async def _flush(self, job: IngestionJob, store, manifest: Dict[str, Optional[str]], chunks: List[Chunk]) -> None:
+        await self._write(store, chunks)
+        manifest.update((identifier, metadata["hash"]) for identifier, _text, metadata in chunks)
+        job.chunks += len(chunks)
+
+    async def _delete(self, store, manifest: Dict[str, Optional[str]], ids: List[str]) -> None:
+        await run_blocking(store._collection.delete, ids=ids)
+        for identifier in ids:
+            manifest.pop(identifier, None)
+
+    async def _extract_pages(self, job: IngestionJob) -> AsyncIterator[Tuple[int, int, List[Chunk]]]:
+        """Yields each page range and its chunks in order, extracting a few ranges ahead."""
+        ranges = deque(
+            (first, min(first + self.page_batch, job.total_pages))
+            for first in range(job.next_page, job.total_pages, self.page_batch)
+        )
+        pending: Deque[Tuple[int, int, asyncio.Future]] = deque()
+        try:
+            while ranges or pending:
+                while ranges and len(pending) < self.extract_ahead:
+                    first, last = ranges.popleft()
+                    extraction = asyncio.ensure_future(self.extract(
+                        job.path, job.source, first, last, self.chunk_size, self.chunk_overlap
+                    ))
+                    pending.append((first, last, extraction))
+                first, last, extraction = pending.popleft()
+                yield first, last, await extraction
+        finally:
+            for _first, _last, extraction in pending:
+                extraction.cancel()
+
+    async def _write(self, store, chunks: List[Chunk]) -> None:
+        """Embeds the chunks in batches and upserts each batch while the next one is embedded."""
+        upsert = None
+        try:
+            for start in range(0, len(chunks), self.embed_batch):
+                batch = chunks[start:start + self.embed_batch]
+                vectors = await store.embeddings.aembed_documents([text for _id, text, _metadata in batch])
+                if upsert is not None:
+                    await upsert
+                upsert = asyncio.ensure_future(run_blocking(
+                    store._collection.upsert,
+                    ids=[chunk_id for chunk_id, _text, _metadata in batch],
+                    embeddings=vectors,
+                    documents=[text for _id, text, _metadata in batch],
+                    metadatas=[metadata for _id, _text, metadata in batch],
+                ))
+            if upsert is not None:
+                await upsert
+        except BaseException:
+            if upsert is not None and not upsert.done():
+                # The upsert thread finishes on its own, its result is not needed
+                upsert.add_done_callback(lambda task: task.cancelled() or task.exception())
+            raise
+
+    def start(self, resume: bool = INGESTION_RESUME_ON_STARTUP) -> List[str]:
+        """
+        Loads the saved jobs and resumes the unfinished ones.
+
+        Returns:
+            List[str]: Ids of the resumed jobs
+        """
+        unfinished = self.load()
+        if not resume:
+            return []
+        for job in unfinished:
+            job.status = QUEUED
+            self._schedule(job)
+        return [job.job_id for job in unfinished]
+
+    async def stop(self) -> None:
+        """Interrupts the running jobs; their progress is kept for the next start."""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# Create a global ingestion manager instance
+ingestion_manager = IngestionManager()
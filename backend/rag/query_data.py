@@ -1,30 +1,44 @@
-# import asyncio
-import html
+import asyncio
+import hashlib
+from contextlib import aclosing
 import os
 import logging
 from pathlib import Path
 import re
 from dotenv import load_dotenv
 from langchain.prompts import ChatPromptTemplate
-from langchain_ollama.llms import OllamaLLM
 import fitz  # PyMuPDF
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
 
-__import__("pysqlite3")
-import sys
-
-sys.modules["sqlite3"] = sys.modules.pop("pysqlite3")
-
-from langchain_chroma import Chroma
-
-from rag.embedding import embedding
-
-from rag.utils.query_formulator import formulate_query, QueryStatus
+from rag.vector_store import (
+    get_vector_store,
+    asearch_with_embedding,
+    vector_store_registry,
+)
+from rag.utils.answer_cache import answer_cache, replay_answer
+from rag.utils.semantic_cache import semantic_cache, SEMANTIC_CACHE_ENABLED
+from rag.utils.retrieval_cache import retrieval_cache
+from rag.utils.executor import run_blocking
+from rag.utils.generation import stream_generation, invoke_generation
+from rag.utils.ollama_client import ollama_clients
+from rag.utils.single_flight import single_flight
+from rag.utils.instrumentation import (
+    RequestTrace,
+    add_trace_listener,
+    annotate,
+    current_trace,
+    stage,
+    record_cache_lookup,
+    set_outcome,
+)
+from rag.utils.query_log import query_log, start_background_file_logging, QUERY_LOG_ENABLED
+from rag.utils.scheduler import CHAT_LANE, COMPARISON_LANE, FILE_CHAT_LANE, WARMUP_LANE, OverloadedError
+from rag.utils.query_formulator import aformulate_query, QueryStatus
 from rag.utils.prompt_system import PROMPT_TEMPLATES
+from rag.utils.text_cleaning import clean_text, _remove_vendor_block_programmatically
 
 load_dotenv()
-CHROMA_PERSIST_PATH = os.getenv("CHROMA_PERSIST_PATH")
 COLLECTION_NAME = os.getenv("COLLECTION_NAME")
 CHAT_MODEL = os.getenv("CHAT_MODEL")
 CHAT_MODEL_TEMPERATURE = os.getenv("CHAT_MODEL_TEMPERATURE")
@@ -32,6 +46,10 @@ OLLAMA_BASE_URL = os.getenv("VITE_OLLAMA_BASE_URL")
 RETRIEVING_THRESHOLD = float(os.getenv("RETRIEVING_THRESHOLD"))
 TOP_K = int(os.getenv("TOP_K"))
 COMPARISON_TOP_K = int(os.getenv("COMPARISON_TOP_K", TOP_K))
+# Start retrieval while the formulator is still validating the query
+SPECULATIVE_RETRIEVAL = os.getenv("SPECULATIVE_RETRIEVAL", "false").lower() == "true"
+# Identical concurrent requests share one formulator/retrieval/generation run
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
 
 
 PROMPT_TEMPLATE = PROMPT_TEMPLATES["simple_rag_template_fr"]
@@ -42,16 +60,23 @@ COMPARISON_TEMPLATES = PROMPT_TEMPLATES["comparison_templates_fr"]
 # Get project root directory (for reliable path references)
 PROJECT_ROOT = Path(__file__).parent.parent.absolute()
 
+# Cached answers are dropped when their collection changes
+vector_store_registry.add_invalidation_listener(answer_cache.invalidate_collection)
+vector_store_registry.add_invalidation_listener(semantic_cache.invalidate_collection)
+
+# Every finished request is written to the structured query log
+if QUERY_LOG_ENABLED:
+    add_trace_listener(query_log.log)
+
 log_dir = PROJECT_ROOT / "rag" / "output"
 log_dir.mkdir(parents=True, exist_ok=True)
 
 
 if not logging.root.handlers:
-    logging.basicConfig(
-        filename=str(log_dir / "rag_ask.log"),
-        filemode="a",
-        level=logging.INFO,
-        format="%(asctime)s - %(levelname)s - %(message)s",
+    # File writes happen on a background thread, never on the event loop
+    start_background_file_logging(
+        str(log_dir / "rag_ask.log"),
+        "%(asctime)s - %(levelname)s - %(message)s",
     )
 
 # def stop_model(model_id):
@@ -62,14 +87,117 @@ if not logging.root.handlers:
 #         print(f"Failed to stop model {model_id}.")
 
 
+async def _coalesced(key, run, stream: bool):
+    """Runs the request once for all identical concurrent callers."""
+    executed = False
+
+    def execute():
+        nonlocal executed
+        executed = True
+        return run()
+
+    if stream:
+        result = await single_flight.stream(key, execute)
+    else:
+        result = await single_flight.do(key, execute)
+    if not executed:
+        # The shared execution is recorded in the trace of the caller that started it
+        set_outcome("coalesced")
+    return result
+
+
 async def query_rag_async(
     query_text: str,
     vector_store=None,
     model_name=None,
     stream=False,
     collection_name: str = COLLECTION_NAME,
+    lane: str = CHAT_LANE,
 ):
-    status, processed_query = formulate_query(query_text)
+    if lane == WARMUP_LANE:
+        # Kept apart from live traffic in the metrics and the query logs
+        endpoint = "/warmup"
+    else:
+        endpoint = "/chat/stream" if stream else "/chat"
+    trace = RequestTrace(
+        endpoint,
+        model_name or CHAT_MODEL,
+        collection_name or COLLECTION_NAME,
+        query=query_text,
+    )
+
+    # Requests on a caller-provided vector store are never shared, and live
+    # requests never wait on a low priority warm-up generation
+    if vector_store is not None or lane == WARMUP_LANE or not SINGLE_FLIGHT_ENABLED:
+        return await trace.run(
+            lambda: _query_rag_async(
+                query_text, vector_store, model_name, stream, collection_name, lane
+            )
+        )
+
+    key = (
+        "query",
+        query_text,
+        model_name or CHAT_MODEL,
+        collection_name or COLLECTION_NAME,
+        lane,
+    )
+    return await trace.run(
+        lambda: _coalesced(
+            key,
+            lambda: _query_rag_async(query_text, None, model_name, stream, collection_name, lane),
+            stream,
+        )
+    )
+
+
+async def _query_rag_async(
+    query_text: str,
+    vector_store=None,
+    model_name=None,
+    stream=False,
+    collection_name: str = COLLECTION_NAME,
+    lane: str = CHAT_LANE,
+):
+    used_model = model_name if model_name else CHAT_MODEL
+    trace = current_trace()
+
+    # Answers are only cached for the shared collections
+    cache_key = None
+    if vector_store is None:
+        cache_key = answer_cache.key(
+            query_text, used_model, collection_name or COLLECTION_NAME, PROMPT_TEMPLATE
+        )
+        cached_answer = answer_cache.get(cache_key)
+        record_cache_lookup("answer", cached_answer is not None)
+        if cached_answer is not None:
+            set_outcome("answer_cache")
+            logging.info(f"Query: {query_text}")
+            logging.info("Answer served from cache")
+            response_text, sources_md = cached_answer
+            if stream:
+                return replay_answer(response_text, sources_md)
+            return f"{response_text}{sources_md}"
+
+    # In speculative mode the retrieval overlaps the formulator round trip
+    retrieval_task = None
+    if SPECULATIVE_RETRIEVAL:
+        retrieval_task = asyncio.create_task(
+            _retrieve(query_text, vector_store, collection_name, TOP_K)
+        )
+
+    try:
+        with stage("formulate"):
+            status, processed_query = await aformulate_query(query_text, lane)
+    except BaseException:
+        _discard_task(retrieval_task)
+        raise
+
+    annotate(status=status.value)
+    if status != QueryStatus.VALID:
+        # The speculative retrieval is thrown away for rejected queries
+        _discard_task(retrieval_task)
+        set_outcome("rejected")
 
     # Handle query based on its status
     if status == QueryStatus.VALID:
@@ -88,23 +216,18 @@ async def query_rag_async(
         logging.info(f"Non-relevant query or too short")
         return processed_query
 
-    # Prepare the DB if not provided
-    if vector_store is None:
-        embedding_function = embedding()
-        current_collection_name = (
-            collection_name if collection_name else COLLECTION_NAME
-        )
-        vector_store = Chroma(
-            persist_directory="./rag/" + CHROMA_PERSIST_PATH,
-            collection_name=current_collection_name,
-            embedding_function=embedding_function,
-        )
-
     # Search the DB.
-    results = vector_store.similarity_search_with_relevance_scores(query_text, k=TOP_K)
+    if retrieval_task is not None:
+        query_embedding, results = await retrieval_task
+    else:
+        query_embedding, results = await _retrieve(
+            query_text, vector_store, collection_name, TOP_K
+        )
+    _annotate_results(results)
     if len(results) == 0 or results[0][1] < RETRIEVING_THRESHOLD:
         # If no results or the best result is not relevant, return a standard message
         print("No relevant results found.")
+        set_outcome("no_context")
         # Logging exactly as in the original code
         logging.info(f"Query: {query_text}")
         if not results:
@@ -118,24 +241,47 @@ async def query_rag_async(
     logging.info(f"Query: {query_text}")
     logging.info(f"Scores: {[_score for doc, _score in results]}")
 
-    context_text = "\n\n---\n\n".join([doc.page_content for doc, _score in results])
+    sources = [doc.metadata.get("id", None) for doc, _score in results]
+    sources_md = format_sources_as_markdown(sources)
 
-    prompt_template = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
-    prompt = prompt_template.format(context=context_text, question=query_text)
+    # A paraphrase of a cached question that retrieved the same chunks reuses its answer
+    semantic_partition = None
+    chunk_ids = [doc.metadata.get("id") or doc.id for doc, _score in results]
+    if cache_key is not None and SEMANTIC_CACHE_ENABLED:
+        semantic_partition = (used_model, cache_key[2], cache_key[3])
+        cached_answer = semantic_cache.get(semantic_partition, query_embedding, chunk_ids)
+        record_cache_lookup("semantic", cached_answer is not None)
+        if cached_answer is not None:
+            set_outcome("semantic_cache")
+            logging.info("Answer served from semantic cache")
+            response_text, sources_md = cached_answer
+            answer_cache.set(cache_key, response_text, sources_md)
+            if stream:
+                return replay_answer(response_text, sources_md)
+            return f"{response_text}{sources_md}"
+
+    with stage("prompt_build"):
+        context_text = "\n\n---\n\n".join([doc.page_content for doc, _score in results])
+
+        prompt_template = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
+        prompt = prompt_template.format(context=context_text, question=query_text)
 
-    used_model = model_name if model_name else CHAT_MODEL
     logging.info(f"Using model: {used_model}")
 
-    model = OllamaLLM(
-        base_url=OLLAMA_BASE_URL,
-        model=used_model,
+    model = ollama_clients.llm(
+        used_model,
         temperature=CHAT_MODEL_TEMPERATURE,
         num_predict=8192,
         num_ctx=10500,
     )
 
-    sources = [doc.metadata.get("id", None) for doc, _score in results]
-    sources_md = format_sources_as_markdown(sources)
+    def remember_answer(response_text: str) -> None:
+        if cache_key is not None:
+            answer_cache.set(cache_key, response_text, sources_md)
+        if semantic_partition is not None:
+            semantic_cache.set(
+                semantic_partition, query_embedding, chunk_ids, response_text, sources_md
+            )
 
     if stream:
         # For streaming mode, return an async generator that yields chunks
@@ -144,30 +290,78 @@ async def query_rag_async(
             # stop_model(model_name)
             # await asyncio.sleep(5)
 
-            # Start streaming the response
+            # Start streaming the response, closing this generator aborts the generation
             response_chunks = []
-            async for chunk in model.astream(prompt):
-                yield {"type": "content", "data": chunk}
-                response_chunks.append(chunk)
+            async with aclosing(stream_generation(model, prompt, lane, trace=trace)) as chunks:
+                async for chunk in chunks:
+                    yield {"type": "content", "data": chunk}
+                    response_chunks.append(chunk)
+
+            # Only complete generations are cached
+            remember_answer("".join(response_chunks))
 
             # After all chunks are yielded, yield the sources
             yield {"type": "sources", "data": sources_md}
 
         return response_generator()
     else:
-        # For non-streaming mode, use the original approach
-        response_text = model.invoke(prompt)
+        # For non-streaming mode, use the native async client
+        response_text = await invoke_generation(model, prompt, lane, trace=trace)
 
         # Make sure to always return a string value
         if not response_text:
             return "No response could be generated for this query."
 
+        remember_answer(response_text)
+
         # Combine response text with formatted sources
         formatted_response = f"{response_text}{sources_md}"
 
         return formatted_response
 
 
+async def _retrieve(query_text: str, vector_store, collection_name: str, k: int):
+    """
+    Searches the given vector store, or the shared one for the collection.
+    Returns the query embedding and the scored results.
+
+    Searches of the shared stores are cached per collection version, so
+    results are reused until the collection is modified.
+    """
+    if vector_store is not None:
+        return await asearch_with_embedding(vector_store, query_text, k)
+
+    collection_name = collection_name or COLLECTION_NAME
+    version = vector_store_registry.version(collection_name)
+    cached = retrieval_cache.get(collection_name, version, query_text, k)
+    record_cache_lookup("retrieval", cached is not None)
+    if cached is not None:
+        return cached
+
+    # Use the shared vector store if none was provided
+    vector_store = await run_blocking(get_vector_store, collection_name)
+    result = await asearch_with_embedding(vector_store, query_text, k)
+    retrieval_cache.set(collection_name, version, query_text, k, result)
+    return result
+
+
+def _annotate_results(results) -> None:
+    """Adds the retrieval scores and chunk ids to the query record."""
+    annotate(
+        scores=[round(float(score), 4) for _doc, score in results],
+        chunk_ids=[doc.metadata.get("id") or doc.id for doc, _score in results],
+    )
+
+
+def _discard_task(task):
+    """Cancels a speculative task whose result is no longer needed."""
+    if task is None:
+        return
+    task.cancel()
+    # Retrieve the outcome so a failed task does not log "exception was never retrieved"
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+
 def extract_suggestion(processed_query):
     """Extract a suggestion from the processed query using multiple patterns."""
     suggested_query = None
@@ -325,6 +519,56 @@ async def compare_standards_async(
     Returns:
         Generated comparison response or async generator for streaming
     """
+    trace = RequestTrace(
+        "/compare/stream" if stream else "/compare",
+        model_name or CHAT_MODEL,
+        collection_name or COLLECTION_NAME,
+        query=f"{file1_name} vs {file2_name}",
+    )
+
+    # Requests on a caller-provided vector store are never shared
+    if vector_store is not None or not SINGLE_FLIGHT_ENABLED:
+        return await trace.run(
+            lambda: _compare_standards_async(
+                file1_content, file1_name, file2_content, file2_name, mode,
+                vector_store, model_name, stream, collection_name,
+            )
+        )
+
+    key = (
+        "compare",
+        hashlib.sha256(file1_content.encode("utf-8")).hexdigest(),
+        file1_name,
+        hashlib.sha256(file2_content.encode("utf-8")).hexdigest(),
+        file2_name,
+        mode,
+        model_name or CHAT_MODEL,
+        collection_name or COLLECTION_NAME,
+    )
+    return await trace.run(
+        lambda: _coalesced(
+            key,
+            lambda: _compare_standards_async(
+                file1_content, file1_name, file2_content, file2_name, mode,
+                None, model_name, stream, collection_name,
+            ),
+            stream,
+        )
+    )
+
+
+async def _compare_standards_async(
+    file1_content: str,
+    file1_name: str,
+    file2_content: str,
+    file2_name: str,
+    mode: str,
+    vector_store=None,
+    model_name=None,
+    stream=False,
+    collection_name: str = COLLECTION_NAME,
+):
+    trace = current_trace()
 
     # Validate mode
     if mode not in COMPARISON_TEMPLATES:
@@ -332,29 +576,19 @@ async def compare_standards_async(
             f"Invalid comparison mode: {mode}. Must be one of: {list(COMPARISON_TEMPLATES.keys())}"
         )
 
-    # Clean the file contents first
-    cleaned_file1_content = clean_text(file1_content, file1_name)
-    cleaned_file2_content = clean_text(file2_content, file2_name)
-
-    # Prepare the vector store if not provided
-    if vector_store is None:
-        embedding_function = embedding()
-        current_collection_name = (
-            collection_name if collection_name else COLLECTION_NAME
-        )
-        vector_store = Chroma(
-            persist_directory="./rag/" + CHROMA_PERSIST_PATH,
-            collection_name=current_collection_name,
-            embedding_function=embedding_function,
-        )
+    # Clean the file contents first (CPU-bound on large documents)
+    cleaned_file1_content = await run_blocking(clean_text, file1_content, file1_name)
+    cleaned_file2_content = await run_blocking(clean_text, file2_content, file2_name)
 
     # Create a query to retrieve relevant context from both documents
     combined_query = f"Compare electrical standards {file1_name} and {file2_name} technical specifications requirements compliance"
 
     # Search the vector store for relevant context
-    results = vector_store.similarity_search_with_relevance_scores(
-        combined_query, k=COMPARISON_TOP_K
+    _query_embedding, results = await _retrieve(
+        combined_query, vector_store, collection_name, COMPARISON_TOP_K
     )
+    annotate(mode=mode)
+    _annotate_results(results)
 
     # Build context from retrieved documents
     if results and results[0][1] >= RETRIEVING_THRESHOLD:
@@ -374,39 +608,39 @@ async def compare_standards_async(
     # Get the appropriate prompt template for the mode
     prompt_template_text = COMPARISON_TEMPLATES[mode]
 
-    # Truncate cleaned file contents if they're too long (to fit in context window)
-    max_content_tokens = 10000  # Reserve tokens for each file content
-    max_content_length = (
-        max_content_tokens * 4
-    )  # Approximate token length for English text
-    truncated_file1 = (
-        cleaned_file1_content[:max_content_length] + "..."
-        if len(cleaned_file1_content) > max_content_length
-        else cleaned_file1_content
-    )
-    truncated_file2 = (
-        cleaned_file2_content[:max_content_length] + "..."
-        if len(cleaned_file2_content) > max_content_length
-        else cleaned_file2_content
-    )
+    with stage("prompt_build"):
+        # Truncate cleaned file contents if they're too long (to fit in context window)
+        max_content_tokens = 10000  # Reserve tokens for each file content
+        max_content_length = (
+            max_content_tokens * 4
+        )  # Approximate token length for English text
+        truncated_file1 = (
+            cleaned_file1_content[:max_content_length] + "..."
+            if len(cleaned_file1_content) > max_content_length
+            else cleaned_file1_content
+        )
+        truncated_file2 = (
+            cleaned_file2_content[:max_content_length] + "..."
+            if len(cleaned_file2_content) > max_content_length
+            else cleaned_file2_content
+        )
 
-    # Format the prompt with all variables
-    prompt_template = ChatPromptTemplate.from_template(prompt_template_text)
-    prompt = prompt_template.format(
-        context=context_text,
-        file1_name=file1_name,
-        file1_content=truncated_file1,
-        file2_name=file2_name,
-        file2_content=truncated_file2,
-    )
+        # Format the prompt with all variables
+        prompt_template = ChatPromptTemplate.from_template(prompt_template_text)
+        prompt = prompt_template.format(
+            context=context_text,
+            file1_name=file1_name,
+            file1_content=truncated_file1,
+            file2_name=file2_name,
+            file2_content=truncated_file2,
+        )
 
     # Set up the model
     used_model = model_name if model_name else CHAT_MODEL
     logging.info(f"Using model for comparison: {used_model}")
 
-    model = OllamaLLM(
-        base_url=OLLAMA_BASE_URL,
-        model=used_model,
+    model = ollama_clients.llm(
+        used_model,
         temperature=float(CHAT_MODEL_TEMPERATURE),
         num_predict=8192,
         num_ctx=16384,  # Use large context window for comparison
@@ -419,9 +653,11 @@ async def compare_standards_async(
         # For streaming mode, return an async generator
         async def response_generator():
             response_chunks = []
-            async for chunk in model.astream(prompt):
-                yield {"type": "content", "data": chunk}
-                response_chunks.append(chunk)
+            generation = stream_generation(model, prompt, COMPARISON_LANE, trace=trace)
+            async with aclosing(generation) as chunks:
+                async for chunk in chunks:
+                    yield {"type": "content", "data": chunk}
+                    response_chunks.append(chunk)
 
             # After all chunks are yielded, yield the sources
             yield {"type": "sources", "data": sources_md}
@@ -429,7 +665,7 @@ async def compare_standards_async(
         return response_generator()
     else:
         # For non-streaming mode
-        response_text = model.invoke(prompt)
+        response_text = await invoke_generation(model, prompt, COMPARISON_LANE, trace=trace)
 
         if not response_text:
             return "No comparison could be generated for these documents."
@@ -446,40 +682,30 @@ async def query_rag_with_file_async(
     Query the RAG system with an uploaded PDF file.
     This function will extract text from the PDF and use it as additional context.
     """
+    trace = RequestTrace(
+        "/chat-with-file", model_name or CHAT_MODEL, COLLECTION_NAME, query=query_text
+    )
+    return await trace.run(
+        lambda: _query_rag_with_file_async(query_text, pdf_file_path, model_name)
+    )
+
+
+async def _query_rag_with_file_async(
+    query_text: str, pdf_file_path: str, model_name=None
+):
+    trace = current_trace()
     try:
-        # Load and process the PDF file
-        loader = fitz.open(pdf_file_path)
-        documents = []
-        for page in loader:
-            text = page.get_text()
-            if text.strip():  # Avoid adding empty documents
-                documents.append(
-                    Document(page_content=text, metadata={"id": pdf_file_path})
-                )
-
-        # Split the document into chunks
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len,
-        )
-        pdf_chunks = text_splitter.split_documents(documents)
+        # Load and split the PDF file off the event loop
+        pdf_chunks = await run_blocking(_load_pdf_chunks, pdf_file_path)
 
         # Extract text content from PDF chunks
         pdf_context = "\n\n".join([chunk.page_content for chunk in pdf_chunks])
 
-        # Get existing vector store results
-        embedding_function = embedding()
-        vector_store = Chroma(
-            collection_name=COLLECTION_NAME,
-            persist_directory="./rag/" + COLLECTION_NAME,
-            embedding_function=embedding_function,
-        )
-
         # Search the existing vector store
-        results = vector_store.similarity_search_with_relevance_scores(
-            query_text, k=TOP_K
+        _query_embedding, results = await _retrieve(
+            query_text, None, COLLECTION_NAME, TOP_K
         )
+        _annotate_results(results)
 
         # Combine PDF content with vector store results
         existing_context = ""
@@ -519,22 +745,22 @@ Tu es un assistant technique spécialisé. Analyse le document téléchargé et
 Répondez de manière complète et technique, en utilisant le contenu du document comme source principale.
 """
 
-        prompt_template = ChatPromptTemplate.from_template(file_prompt_template)
-        prompt = prompt_template.format(context=combined_context, question=query_text)
+        with stage("prompt_build"):
+            prompt_template = ChatPromptTemplate.from_template(file_prompt_template)
+            prompt = prompt_template.format(context=combined_context, question=query_text)
 
         used_model = model_name if model_name else CHAT_MODEL
         logging.info(f"Using model for file query: {used_model}")
 
-        model = OllamaLLM(
-            base_url=OLLAMA_BASE_URL,
-            model=used_model,
+        model = ollama_clients.llm(
+            used_model,
             temperature=CHAT_MODEL_TEMPERATURE,
             num_predict=8192,
             num_ctx=10500,
         )
 
         # Generate response
-        response_text = model.invoke(prompt)
+        response_text = await invoke_generation(model, prompt, FILE_CHAT_LANE, trace=trace)
 
         if not response_text:
             return (
@@ -551,77 +777,34 @@ Répondez de manière complète et technique, en utilisant le contenu du documen
 
         return f"{response_text}{sources_info}"
 
+    except OverloadedError:
+        # Answered with 429/503 and Retry-After by the API
+        raise
     except Exception as e:
+        set_outcome("error")
         logging.error(f"Error processing PDF file: {str(e)}")
         return f"Erreur lors du traitement du fichier PDF: {str(e)}"
 
 
-_generic_cleaning_patterns = [
-    re.compile(r"Customer:\s*.*", re.IGNORECASE),
-    re.compile(r"No\.\s+of\s+User\(s\):\s*\d+", re.IGNORECASE),
-    re.compile(r"Company:\s*.*", re.IGNORECASE),
-    re.compile(r"Order\s+No\.:\s*.*", re.IGNORECASE),
-    re.compile(r"copyright\s+of\s+.*", re.IGNORECASE),
-    re.compile(r"All\s+rights\s+reserved", re.IGNORECASE),
-    re.compile(r"licence\s+agreement", re.IGNORECASE),
-]
-
-
-def _remove_vendor_block_programmatically(text_input: str, doc_path_info: str) -> str:
-    """
-    Programmatically removes vendor-specific blocks from text.
-    This is a generic alternative to vendor-specific regex patterns.
+def _load_pdf_chunks(pdf_file_path: str):
     """
-    output_parts = []
-    current_search_start_index = 0
-    text_len = len(text_input)
-
-    while current_search_start_index < text_len:
-        # Find the start of a potential block ("Customer:" or similar)
-        match_found = False
-        for pattern in _generic_cleaning_patterns:
-            match_p1 = pattern.search(text_input, pos=current_search_start_index)
-            if match_p1:
-                block_potential_start_index = match_p1.start()
-                output_parts.append(text_input[current_search_start_index:block_potential_start_index])
-                current_search_start_index = match_p1.end()
-                match_found = True
-                break
-        
-        if not match_found:
-            output_parts.append(text_input[current_search_start_index:])
-            break
-
-    return ''.join(output_parts)
-
-
-def clean_text(text, doc_path_info=""):
+    Extracts the text of a PDF file and splits it into chunks.
+    Blocking: call it through `run_blocking` from async code.
     """
-    Clean text by removing vendor-specific blocks and formatting.
-    """
-    cleaned = re.sub(r"<[^>]+>", "", text)  # Remove HTML tags
-    cleaned = re.sub(
-        r"\.{2,}", " ", cleaned
-    )  # Replace multiple dots with a single space
-    cleaned = re.sub(
-        r"\.\s+\.\s+\.\s+\.+", " ", cleaned
-    )  # Replace spaced multiple dots
-
-    # Apply generic cleaning
-    cleaned = _remove_vendor_block_programmatically(cleaned, doc_path_info)
-
-    # Remove general copyright blocks (keep generic)
-    cleaned = re.sub(
-        r"THIS PUBLICATION IS COPYRIGHT PROTECTED.*?Copyright.*?All rights reserved.*?",
-        "",
-        cleaned,
-        flags=re.DOTALL | re.IGNORECASE,
+    loader = fitz.open(pdf_file_path)
+    documents = []
+    for page in loader:
+        text = page.get_text()
+        if text.strip():  # Avoid adding empty documents
+            documents.append(
+                Document(page_content=text, metadata={"id": pdf_file_path})
+            )
+    loader.close()
+
+    # Split the document into chunks
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=1000,
+        chunk_overlap=200,
+        length_function=len,
     )
-    
-    # Remove common formatting patterns
-    cleaned = re.sub(r"Tel\.: \+[\d\s]+", "", cleaned)  # Remove phone numbers
-    cleaned = html.unescape(cleaned)  # Unescape HTML entities
-    cleaned = re.sub(r"\s+", " ", cleaned)  # Normalize whitespace to single spaces
-
-    cleaned = cleaned.strip()  # Remove leading/trailing whitespace
-    return cleaned
+    return text_splitter.split_documents(documents)
@@ -0,0 +1,65 @@
+import os
+import re
+import hashlib
+from typing import AsyncIterator, Dict, Optional, Tuple
+from dotenv import load_dotenv
+
+from rag.utils.cache import TTLCache
+from rag.utils.normalization import normalize_query
+
+load_dotenv()
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+# Number of words per chunk when a cached answer is replayed as a stream
+ANSWER_REPLAY_CHUNK_WORDS = 8
+
+_word_pattern = re.compile(r"\S+\s*|\s+")
+
+
+class AnswerCache:
+    """
+    Exact-match cache of generated answers.
+
+    Keys are (normalized query, model, collection, prompt template digest) and
+    values are (answer text, sources markdown) tuples.
+    """
+
+    def __init__(self, max_size: int = ANSWER_CACHE_SIZE, ttl: float = ANSWER_CACHE_TTL):
+        self._cache = TTLCache(max_size=max_size, ttl=ttl)
+
+    @staticmethod
+    def key(query_text: str, model: str, collection_name: str, prompt_template: str) -> Tuple[str, str, str, str]:
+        template_digest = hashlib.sha256(prompt_template.encode("utf-8")).hexdigest()[:16]
+        return normalize_query(query_text), model, collection_name, template_digest
+
+    def get(self, key: Tuple[str, str, str, str]) -> Optional[Tuple[str, str]]:
+        return self._cache.get(key)
+
+    def set(self, key: Tuple[str, str, str, str], response_text: str, sources_md: str) -> None:
+        if response_text:
+            self._cache.set(key, (response_text, sources_md))
+
+    def invalidate_collection(self, collection_name: str) -> int:
+        """Drops every answer generated from a collection. Returns the number of entries removed."""
+        return self._cache.discard_where(lambda key: key[2] == collection_name)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, float]:
+        return self._cache.stats()
+
+
+async def replay_answer(response_text: str, sources_md: str) -> AsyncIterator[dict]:
+    """
+    Replays a cached answer with the same chunk protocol as a live generation:
+    content chunks followed by a final sources chunk.
+    """
+    words = _word_pattern.findall(response_text)
+    for start in range(0, len(words), ANSWER_REPLAY_CHUNK_WORDS):
+        yield {"type": "content", "data": "".join(words[start:start + ANSWER_REPLAY_CHUNK_WORDS])}
+    yield {"type": "sources", "data": sources_md}
+
+
+# Create a global answer cache instance
+answer_cache = AnswerCache()
@@ -0,0 +1,136 @@
+"""
+Background batch writer.
+
+Records are put on a bounded in-memory queue and written by a background
+thread in batches, so the request path never waits on the destination (a log
+file, a database...). When the queue is full, new records are dropped and
+counted instead of blocking.
+"""
+
+import abc
+import time
+import queue
+import atexit
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+_STOP = object()
+
+
+class BatchWriter(abc.ABC):
+    """
+    Base class of the queue-fed writers. Subclasses implement `write_batch`.
+
+    Attributes:
+        batch_size (int): Maximum number of records per batch.
+        flush_interval (float): Maximum delay in seconds before a queued record is written.
+    """
+
+    name = "batch-writer"
+
+    def __init__(self, queue_size: int, batch_size: int, flush_interval: float):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._registered_exit = False
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.failed = 0
+
+    @abc.abstractmethod
+    def write_batch(self, records: List[Dict[str, Any]]) -> None:
+        """Writes a batch of records. Runs on the writer thread; errors are logged and counted."""
+
+    def log(self, record: Dict[str, Any]) -> bool:
+        """
+        Queues a record for writing. Never blocks.
+
+        Returns:
+            bool: False if the queue was full and the record was dropped
+        """
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+            if not self._registered_exit:
+                atexit.register(self.close)
+                self._registered_exit = True
+
+    def _next_batch(self) -> List[Any]:
+        """Waits for a record, then gathers more until the batch is full or the flush interval passed."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size and batch[-1] is not _STOP:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            stop = batch[-1] is _STOP
+            records = [record for record in batch if record is not _STOP]
+            if records:
+                try:
+                    self.write_batch(records)
+                    self.written += len(records)
+                    self.batches += 1
+                except Exception as e:
+                    self.failed += len(records)
+                    logging.error(f"{self.name} could not write {len(records)} records: {str(e)}")
+            for _item in batch:
+                self._queue.task_done()
+            if stop:
+                return
+
+    def flush(self, timeout: float = 5.0) -> None:
+        """Waits until the queued records are written."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            if self._thread is None or not self._thread.is_alive():
+                return
+            time.sleep(0.01)
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Writes the queued records and stops the writer thread."""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is None or not thread.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logging.warning(f"{self.name} queue full at shutdown, pending records are lost")
+            return
+        thread.join(timeout)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "batches": self.batches,
+        }
@@ -0,0 +1,256 @@
+"""
+Cache warm-up from the query log.
+
+After a deploy or a restart every cache is empty. The warmer reads the most
+frequent recent questions from the query log and replays them through
+`query_rag_async` in the lowest priority scheduling lane, which fills the
+formulator, embedding, retrieval and answer caches before the traffic arrives.
+
+A run stops when its budget (number of queries, wall-clock seconds) is spent,
+and waits whenever live requests are queued for a model or a model is busy.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+from dotenv import load_dotenv
+
+from rag.utils.normalization import normalize_query
+from rag.utils.query_log import query_log, QueryLog
+from rag.utils.scheduler import model_scheduler, ModelScheduler, OverloadedError, WARMUP_LANE
+
+load_dotenv()
+CACHE_WARMUP_ENABLED = os.getenv("CACHE_WARMUP_ENABLED", "false").lower() == "true"
+# Budget of a run: number of queries replayed, and seconds spent including pauses
+CACHE_WARMUP_MAX_QUERIES = int(os.getenv("CACHE_WARMUP_MAX_QUERIES", "50"))
+CACHE_WARMUP_TIME_BUDGET = float(os.getenv("CACHE_WARMUP_TIME_BUDGET", "600"))
+# Only queries asked at least this many times in the lookback window are replayed
+CACHE_WARMUP_LOOKBACK_HOURS = float(os.getenv("CACHE_WARMUP_LOOKBACK_HOURS", "72"))
+CACHE_WARMUP_MIN_COUNT = int(os.getenv("CACHE_WARMUP_MIN_COUNT", "2"))
+# Seconds between runs after the startup run, 0 to only warm up at startup
+CACHE_WARMUP_INTERVAL = float(os.getenv("CACHE_WARMUP_INTERVAL", "0"))
+# Delay before the startup run, lets the vector stores and the clients settle
+CACHE_WARMUP_START_DELAY = float(os.getenv("CACHE_WARMUP_START_DELAY", "10"))
+# A model is busy once live requests hold this share of its slots
+CACHE_WARMUP_BUSY_SHARE = float(os.getenv("CACHE_WARMUP_BUSY_SHARE", "0.5"))
+# Seconds to wait before checking the load again
+CACHE_WARMUP_PAUSE = float(os.getenv("CACHE_WARMUP_PAUSE", "5"))
+
+# Requests whose answers are worth replaying
+WARMUP_ENDPOINTS = ("/chat", "/chat/stream")
+WARMUP_OUTCOMES = ("generated", "coalesced", "answer_cache", "semantic_cache")
+
+
+def frequent_queries(
+    records: Iterable[Dict[str, Any]],
+    since: datetime,
+    limit: int = CACHE_WARMUP_MAX_QUERIES,
+    min_count: int = CACHE_WARMUP_MIN_COUNT,
+) -> List[Dict[str, Any]]:
+    """
+    Ranks the answered chat queries of the query log by frequency.
+
+    Queries are grouped by normalized text, model and collection; the most
+    recent wording is kept.
+
+    Args:
+        records: Query log records, oldest first
+        since: Records before this date are ignored
+        limit: Maximum number of queries returned
+        min_count: Minimum number of occurrences
+
+    Returns:
+        List[dict]: `query`, `model`, `collection` and `count`, most frequent first
+    """
+    groups: Dict[tuple, Dict[str, Any]] = {}
+    for record in records:
+        query = record.get("query")
+        if not query or record.get("endpoint") not in WARMUP_ENDPOINTS:
+            continue
+        if record.get("outcome") not in WARMUP_OUTCOMES:
+            continue
+        try:
+            timestamp = datetime.fromisoformat(record["timestamp"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if timestamp < since:
+            continue
+
+        key = (normalize_query(query), record.get("model"), record.get("collection"))
+        group = groups.setdefault(key, {"count": 0})
+        group.update(query=query, model=key[1], collection=key[2], last_seen=timestamp)
+        group["count"] += 1
+
+    ranked = sorted(
+        (group for group in groups.values() if group["count"] >= min_count),
+        key=lambda group: (group["count"], group["last_seen"]),
+        reverse=True,
+    )
+    return [
+        {name: group[name] for name in ("query", "model", "collection", "count")}
+        for group in ranked[:limit]
+    ]
+
+
+async def _replay(query: Dict[str, Any]) -> Any:
+    # Imported here: the RAG pipeline imports the whole vector store stack
+    from rag.query_data import query_rag_async
+
+    return await query_rag_async(
+        query["query"],
+        model_name=query["model"],
+        collection_name=query["collection"],
+        lane=WARMUP_LANE,
+    )
+
+
+class CacheWarmer:
+    """
+    Replays the frequent queries of the query log at low priority.
+
+    Attributes:
+        max_queries (int): Queries replayed per run at most.
+        time_budget (float): Seconds a run may take, pauses included.
+        busy_share (float): Share of a model's slots held by live requests above which the warmer waits.
+        pause (float): Seconds between two load checks while waiting.
+    """
+
+    def __init__(
+        self,
+        log: QueryLog = query_log,
+        scheduler: ModelScheduler = model_scheduler,
+        max_queries: int = CACHE_WARMUP_MAX_QUERIES,
+        time_budget: float = CACHE_WARMUP_TIME_BUDGET,
+        lookback_hours: float = CACHE_WARMUP_LOOKBACK_HOURS,
+        min_count: int = CACHE_WARMUP_MIN_COUNT,
+        busy_share: float = CACHE_WARMUP_BUSY_SHARE,
+        pause: float = CACHE_WARMUP_PAUSE,
+        replay: Callable[[Dict[str, Any]], Awaitable[Any]] = _replay,
+    ):
+        self.log = log
+        self.scheduler = scheduler
+        self.max_queries = max_queries
+        self.time_budget = time_budget
+        self.lookback = timedelta(hours=lookback_hours)
+        self.min_count = min_count
+        self.busy_share = busy_share
+        self.pause = pause
+        self.replay = replay
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.warmed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.paused_seconds = 0.0
+        self.last_run: Dict[str, Any] = {}
+
+    def is_busy(self, model: str) -> bool:
+        """True while live requests wait for any model, or hold too many slots of this one."""
+        stats = self.scheduler.stats()
+        if any(model_stats["queued"] for model_stats in stats.values()):
+            return True
+        model_stats = stats.get(model)
+        if model_stats is None:
+            return False
+        return model_stats["active"] >= max(1, model_stats["limit"] * self.busy_share)
+
+    async def _wait_for_capacity(self, model: str, deadline: float) -> bool:
+        """Waits until the model is idle enough. Returns False if the deadline passed first."""
+        while self.is_busy(model):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            delay = min(self.pause, remaining)
+            await asyncio.sleep(delay)
+            self.paused_seconds += delay
+        return time.monotonic() < deadline
+
+    async def run_once(self) -> Dict[str, Any]:
+        """
+        Replays the most frequent recent queries within the budget.
+
+        Returns:
+            dict: Summary of the run (`candidates`, `warmed`, `failed`, `rejected`, `stopped`, `seconds`)
+        """
+        started = time.monotonic()
+        deadline = started + self.time_budget
+        since = datetime.now(timezone.utc) - self.lookback
+        queries = await asyncio.to_thread(
+            lambda: frequent_queries(self.log.read(), since, self.max_queries, self.min_count)
+        )
+
+        summary = {"candidates": len(queries), "warmed": 0, "failed": 0, "rejected": 0, "stopped": "done"}
+        for query in queries:
+            if not await self._wait_for_capacity(query["model"], deadline):
+                summary["stopped"] = "budget"
+                break
+            try:
+                await self.replay(query)
+                summary["warmed"] += 1
+            except OverloadedError as e:
+                # Live traffic took the slots, back off before the next query
+                summary["rejected"] += 1
+                await asyncio.sleep(min(e.retry_after, self.pause))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                summary["failed"] += 1
+                logging.warning(f"Cache warm-up failed for query {query['query']!r}: {e}")
+
+        summary["seconds"] = round(time.monotonic() - started, 3)
+        self.runs += 1
+        self.warmed += summary["warmed"]
+        self.failed += summary["failed"]
+        self.rejected += summary["rejected"]
+        self.last_run = summary
+        logging.info(f"Cache warm-up run: {summary}")
+        return summary
+
+    async def _loop(self, start_delay: float, interval: float) -> None:
+        await asyncio.sleep(start_delay)
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.warning(f"Cache warm-up run failed: {e}")
+            if interval <= 0:
+                return
+            await asyncio.sleep(interval)
+
+    def start(
+        self, start_delay: float = CACHE_WARMUP_START_DELAY, interval: float = CACHE_WARMUP_INTERVAL
+    ) -> None:
+        """Schedules a run after `start_delay` seconds, then every `interval` seconds if positive."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._loop(start_delay, interval))
+
+    async def stop(self) -> None:
+        """Cancels the pending or running warm-up."""
+        task, self._task = self._task, None
+        if task is None or task.done():
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "runs": self.runs,
+            "warmed": self.warmed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "paused_seconds": round(self.paused_seconds, 3),
+            "last_run": self.last_run,
+        }
+
+
+# Create a global cache warmer instance
+cache_warmer = CacheWarmer()
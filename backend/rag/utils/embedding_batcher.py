@@ -0,0 +1,119 @@
+"""
+Micro-batching of concurrent embedding requests.
+
+Texts submitted within a few milliseconds of each other are sent to the
+embeddings model as a single `aembed_documents` call, and each waiting
+coroutine receives its own vector.
+"""
+
+import asyncio
+import logging
+from typing import Dict, List, Optional, Set, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+
+class EmbeddingBatcher:
+    """
+    Collects single-text embedding requests into batches.
+
+    A batch is dispatched as soon as it holds `max_batch_size` texts, or
+    `max_wait_ms` milliseconds after its first text arrived.
+    """
+
+    def __init__(self, embeddings: Embeddings, max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self.embeddings = embeddings
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # The event loop only keeps weak references to tasks
+        self._dispatches: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+
+    async def embed(self, text: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Pending work belongs to a previous event loop (e.g. between tests)
+            self._pending = []
+            self._flush_handle = None
+            self._dispatches = set()
+            self._loop = loop
+
+        future = loop.create_future()
+        self._pending.append((text, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            task = self._loop.create_task(self._dispatch(batch))
+            self._dispatches.add(task)
+            task.add_done_callback(self._dispatches.discard)
+
+    async def _dispatch(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        # Identical texts in the same batch are embedded once
+        unique_texts = list(dict.fromkeys(text for text, _future in batch))
+        self.batches += 1
+        self.items += len(batch)
+        self.largest_batch = max(self.largest_batch, len(unique_texts))
+
+        try:
+            vectors = await self.embeddings.aembed_documents(unique_texts)
+        except Exception as e:
+            logging.error(f"Batched embedding of {len(unique_texts)} texts failed: {str(e)}")
+            for _text, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        vectors_by_text: Dict[str, List[float]] = dict(zip(unique_texts, vectors))
+        for text, future in batch:
+            if not future.done():
+                future.set_result(vectors_by_text[text])
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "largest_batch": self.largest_batch,
+            "average_batch": self.items / self.batches if self.batches else 0.0,
+        }
+
+
+class BatchedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper routing small async requests through an `EmbeddingBatcher`.
+    Synchronous calls and large document batches go straight to the wrapped model.
+    """
+
+    def __init__(self, base_embeddings: Embeddings, batcher: EmbeddingBatcher):
+        self.base_embeddings = base_embeddings
+        self.batcher = batcher
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.base_embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.base_embeddings.embed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        if len(texts) >= self.batcher.max_batch_size:
+            return await self.base_embeddings.aembed_documents(texts)
+        return list(await asyncio.gather(*(self.batcher.embed(text) for text in texts)))
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.batcher.embed(text)
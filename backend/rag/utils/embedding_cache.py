@@ -0,0 +1,242 @@
+"""
+Query embedding cache with an in-memory LRU tier and an optional memory-mapped disk tier.
+
+Entries are keyed by (provider, model, sha256(text)), so a cached vector is only
+reused for the exact text and embedding model that produced it.
+"""
+
+import os
+import json
+import fcntl
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from rag.utils.cache import TTLCache
+from rag.utils.executor import run_blocking
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class DiskEmbeddingStore:
+    """
+    Append-only on-disk embedding store for one (provider, model) pair.
+
+    Vectors are kept in a float32 memory-mapped matrix (`vectors.f32`) and an
+    append-only index (`index.tsv`) maps text hashes to matrix rows. Writers take
+    an exclusive file lock so several worker processes can share the directory.
+    """
+
+    INITIAL_CAPACITY = 1024
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._meta_path = os.path.join(directory, "meta.json")
+        self._index_path = os.path.join(directory, "index.tsv")
+        self._vectors_path = os.path.join(directory, "vectors.f32")
+        self._lock_path = os.path.join(directory, ".lock")
+        self._rows: Dict[str, int] = {}
+        self._index_offset = 0
+        self._dimension: Optional[int] = None
+        self._capacity = 0
+        self._vectors: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+        self._load_meta()
+
+    def _load_meta(self) -> None:
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path) as f:
+                self._dimension = json.load(f)["dimension"]
+
+    def _sync_index(self) -> None:
+        """Reads the index entries appended (possibly by another process) since the last sync."""
+        if not os.path.exists(self._index_path):
+            return
+        if os.path.getsize(self._index_path) <= self._index_offset:
+            return
+
+        with open(self._index_path, "r", encoding="utf-8") as f:
+            f.seek(self._index_offset)
+            for line in f:
+                if not line.endswith("\n"):
+                    # Partially written line, picked up on the next sync
+                    break
+                key, row = line.rstrip("\n").split("\t")
+                self._rows[key] = int(row)
+                self._index_offset += len(line.encode("utf-8"))
+
+    def _map_vectors(self) -> None:
+        if self._dimension is None or not os.path.exists(self._vectors_path):
+            return
+        row_bytes = self._dimension * np.dtype(np.float32).itemsize
+        self._capacity = os.path.getsize(self._vectors_path) // row_bytes
+        if self._capacity:
+            self._vectors = np.memmap(
+                self._vectors_path, dtype=np.float32, mode="r+",
+                shape=(self._capacity, self._dimension),
+            )
+
+    def _grow(self, min_capacity: int) -> None:
+        capacity = max(self.INITIAL_CAPACITY, self._capacity)
+        while capacity < min_capacity:
+            capacity *= 2
+        row_bytes = self._dimension * np.dtype(np.float32).itemsize
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(capacity * row_bytes)
+        self._vectors = None
+        self._map_vectors()
+
+    def get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            row = self._rows.get(key)
+            if row is None:
+                self._sync_index()
+                row = self._rows.get(key)
+                if row is None:
+                    return None
+
+            if self._dimension is None:
+                self._load_meta()
+            if self._vectors is None or row >= self._capacity:
+                self._map_vectors()
+            if self._vectors is None or row >= self._capacity:
+                return None
+            return self._vectors[row].tolist()
+
+    def put_many(self, items: Dict[str, Sequence[float]]) -> None:
+        if not items:
+            return
+
+        with self._lock, open(self._lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._sync_index()
+                new_items = {key: vector for key, vector in items.items() if key not in self._rows}
+                if not new_items:
+                    return
+
+                if self._dimension is None:
+                    self._load_meta()
+                if self._dimension is None:
+                    self._dimension = len(next(iter(new_items.values())))
+                    with open(self._meta_path, "w") as f:
+                        json.dump({"dimension": self._dimension}, f)
+
+                self._map_vectors()
+                next_row = len(self._rows)
+                if next_row + len(new_items) > self._capacity:
+                    self._grow(next_row + len(new_items))
+
+                lines = []
+                for key, vector in new_items.items():
+                    if len(vector) != self._dimension:
+                        logging.warning(
+                            f"Skipping embedding of dimension {len(vector)} in a {self._dimension}-d cache"
+                        )
+                        continue
+                    self._vectors[next_row] = np.asarray(vector, dtype=np.float32)
+                    self._rows[key] = next_row
+                    lines.append(f"{key}\t{next_row}\n")
+                    next_row += 1
+                self._vectors.flush()
+
+                with open(self._index_path, "a", encoding="utf-8") as f:
+                    f.write("".join(lines))
+                self._index_offset = os.path.getsize(self._index_path)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that serves repeated query texts from cache.
+
+    Query lookups go through the in-memory LRU tier first, then the optional disk
+    tier; only queries missing from both are sent to the wrapped embeddings model.
+    Documents are passed straight through: they are embedded once, at ingestion,
+    and caching them would evict the hot query vectors and grow the disk tier
+    with the whole corpus.
+    """
+
+    def __init__(
+        self,
+        base_embeddings: Embeddings,
+        provider: str,
+        model: str,
+        memory_cache: TTLCache,
+        disk_store: Optional[DiskEmbeddingStore] = None,
+    ):
+        self.base_embeddings = base_embeddings
+        self.provider = provider
+        self.model = model
+        self.memory_cache = memory_cache
+        self.disk_store = disk_store
+        self.disk_hits = 0
+
+    def _key(self, text: str) -> str:
+        return text_hash(text)
+
+    def _lookup_disk(self, key: str) -> Optional[List[float]]:
+        if self.disk_store is None:
+            return None
+        vector = self.disk_store.get(key)
+        if vector is not None:
+            self.disk_hits += 1
+            self.memory_cache.set((self.provider, self.model, key), vector)
+        return vector
+
+    def _store(self, key: str, vector: List[float]) -> None:
+        self.memory_cache.set((self.provider, self.model, key), vector)
+        if self.disk_store is None:
+            return
+        try:
+            self.disk_store.put_many({key: vector})
+        except OSError as e:
+            logging.warning(f"Could not write embeddings to the disk cache: {str(e)}")
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.base_embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        vector = self.memory_cache.get((self.provider, self.model, key))
+        if vector is None:
+            vector = self._lookup_disk(key)
+        if vector is None:
+            vector = self.base_embeddings.embed_query(text)
+            self._store(key, vector)
+        return vector
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.base_embeddings.aembed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        vector = self.memory_cache.get((self.provider, self.model, key))
+        if vector is None and self.disk_store is not None:
+            # The disk tier reads files, off the event loop
+            vector = await run_blocking(self._lookup_disk, key)
+        if vector is None:
+            vector = await self.base_embeddings.aembed_query(text)
+            if self.disk_store is None:
+                self._store(key, vector)
+            else:
+                # File locking and writes stay off the event loop
+                await run_blocking(self._store, key, vector)
+        return vector
+
+    def stats(self) -> Dict[str, float]:
+        stats = dict(self.memory_cache.stats())
+        stats["disk_hits"] = self.disk_hits
+        stats["disk_size"] = len(self.disk_store) if self.disk_store is not None else 0
+        return stats
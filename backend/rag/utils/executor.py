@@ -0,0 +1,85 @@
+import os
+import asyncio
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+# Upper bound on blocking work (vector search, PDF parsing, text cleaning) running at once
+RAG_EXECUTOR_WORKERS = int(os.getenv("RAG_EXECUTOR_WORKERS", "8"))
+# Processes for CPU-bound work that holds the GIL (PDF extraction and cleaning at ingestion)
+RAG_PROCESS_WORKERS = int(os.getenv("RAG_PROCESS_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    Returns the bounded thread pool used for blocking RAG work.
+    The pool is created on first use.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=RAG_EXECUTOR_WORKERS, thread_name_prefix="rag-worker"
+        )
+    return _executor
+
+
+async def run_blocking(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Runs a blocking callable in the bounded RAG thread pool without blocking the event loop.
+
+    Args:
+        func: The blocking function to call
+        *args, **kwargs: Arguments forwarded to the function
+
+    Returns:
+        The return value of the function.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_executor(), functools.partial(func, *args, **kwargs)
+    )
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """
+    Returns the process pool used for CPU-bound RAG work.
+    Workers are spawned rather than forked: the server process runs threads.
+    """
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(
+            max_workers=RAG_PROCESS_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _process_pool
+
+
+async def run_in_process(func: Callable[..., Any], *args) -> Any:
+    """
+    Runs a CPU-bound function in the process pool without blocking the event loop.
+
+    Args:
+        func: A module-level function, its arguments and result must be picklable
+        *args: Arguments forwarded to the function
+
+    Returns:
+        The return value of the function.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_process_pool(), func, *args)
+
+
+def shutdown_executor() -> None:
+    """Stops the thread and process pools, waiting for the running tasks to finish."""
+    global _executor, _process_pool
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=True, cancel_futures=True)
+        _process_pool = None
@@ -0,0 +1,166 @@
+"""
+Streaming of LLM generations with cancellation accounting.
+
+Every generation holds a slot of its model in `model_scheduler` while it runs,
+and is sent to an Ollama backend chosen by `ollama_router`.
+
+When the consumer of a stream goes away, the model stream is closed right
+away: the HTTP response from Ollama is dropped, which aborts the generation
+and frees the model slot. Each cancellation records how many tokens of the
+generation budget were left unproduced.
+
+Slot waits, generation times and token counts are recorded on the trace of
+the request (see `rag.utils.instrumentation`).
+"""
+
+import time
+import asyncio
+import logging
+import threading
+from contextlib import aclosing
+from typing import AsyncIterator, Dict, Optional
+
+from rag.utils.ollama_client import ollama_clients
+from rag.utils.ollama_router import ollama_router
+from rag.utils.scheduler import model_scheduler, CHAT_LANE
+from rag.utils.instrumentation import RequestTrace, UsageCallback, usage_config
+
+
+class CancellationStats:
+    """Counters of the generations cancelled before completion."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.cancellations = 0
+        self.tokens_generated = 0
+        self.tokens_saved = 0
+
+    def record(self, tokens_generated: int, token_budget: int) -> int:
+        """
+        Records a cancelled generation.
+
+        Args:
+            tokens_generated: Tokens streamed before the cancellation
+            token_budget: Maximum number of tokens the generation could produce (num_predict)
+
+        Returns:
+            int: Number of tokens saved by the cancellation
+        """
+        saved = max(0, token_budget - tokens_generated)
+        with self._lock:
+            self.cancellations += 1
+            self.tokens_generated += tokens_generated
+            self.tokens_saved += saved
+        return saved
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "cancellations": self.cancellations,
+                "tokens_generated": self.tokens_generated,
+                "tokens_saved": self.tokens_saved,
+            }
+
+
+def _model_name(model) -> str:
+    return getattr(model, "model", None) or "default"
+
+
+def _record_usage(
+    trace: Optional[RequestTrace],
+    usage: UsageCallback,
+    tokens_counted: int,
+    seconds: float,
+) -> None:
+    """Records the counts reported by Ollama, falling back to the chunks counted."""
+    if trace is None:
+        return
+    completion = usage.completion_tokens if usage.completion_tokens is not None else tokens_counted
+    trace.generation(usage.prompt_tokens or 0, completion, usage.eval_seconds or seconds)
+
+
+async def stream_generation(
+    model, prompt: str, lane: str = CHAT_LANE, trace: Optional[RequestTrace] = None
+) -> AsyncIterator[str]:
+    """
+    Yields the tokens of `model.astream(prompt)`, once a slot of the model is
+    available in the given scheduling lane.
+
+    If the iteration is closed or cancelled before the end, the model stream
+    is closed immediately and the cancellation is recorded in `cancellation_stats`.
+
+    Args:
+        model: LLM to stream from
+        prompt: Prompt of the generation
+        lane: Scheduling lane of the request
+        trace: Request trace receiving the slot wait, generation time and token counts
+    """
+    usage = UsageCallback()
+    tokens_generated = 0
+    try:
+        model_name = _model_name(model)
+        queued = time.monotonic()
+        async with model_scheduler.slot(model_name, lane):
+            started = time.monotonic()
+            if trace is not None:
+                trace.observe("queue_wait", started - queued)
+            routed = ollama_router.stream(
+                model_name,
+                lambda url: ollama_clients.on_host(model, url).astream(
+                    prompt, **usage_config(model, usage)
+                ),
+            )
+            async with aclosing(routed) as tokens:
+                async for token in tokens:
+                    tokens_generated += 1
+                    yield token
+            elapsed = time.monotonic() - started
+            if trace is not None:
+                trace.observe("generate", elapsed)
+            _record_usage(trace, usage, tokens_generated, elapsed)
+    except (GeneratorExit, asyncio.CancelledError):
+        token_budget = getattr(model, "num_predict", None) or 0
+        saved = cancellation_stats.record(tokens_generated, token_budget)
+        logging.info(
+            f"Generation cancelled after {tokens_generated} tokens, "
+            f"{saved} tokens of budget saved"
+        )
+        raise
+
+
+async def invoke_generation(
+    model,
+    prompt: str,
+    lane: str = CHAT_LANE,
+    hedge: bool = False,
+    trace: Optional[RequestTrace] = None,
+) -> str:
+    """
+    Runs `model.ainvoke(prompt)` once a slot of the model is available in the given lane.
+    Short idempotent calls can be hedged across backends with `hedge=True`.
+    The slot wait, generation time and token counts are recorded on `trace`, if given.
+    """
+    usage = UsageCallback()
+    model_name = _model_name(model)
+    route = ollama_router.hedged if hedge else ollama_router.run
+    queued = time.monotonic()
+    async with model_scheduler.slot(model_name, lane):
+        started = time.monotonic()
+        response = await route(
+            model_name,
+            lambda url: ollama_clients.on_host(model, url).ainvoke(
+                prompt, **usage_config(model, usage)
+            ),
+        )
+        elapsed = time.monotonic() - started
+
+    if trace is not None:
+        trace.observe("queue_wait", started - queued)
+        trace.observe("generate", elapsed)
+    # Without counts from Ollama, the response length is a rough estimate
+    _record_usage(trace, usage, len(response.split()) if isinstance(response, str) else 0, elapsed)
+    return response
+
+
+# Create a global cancellation counter instance
+cancellation_stats = CancellationStats()
@@ -0,0 +1,405 @@
+"""
+Per-request instrumentation of the RAG pipeline.
+
+Each RAG request is followed by a `RequestTrace` labelled by endpoint, model
+and collection. The pipeline records its stages (formulate, embed,
+vector_search, prompt_build, queue_wait, generate) on the trace of the
+current request, along with the time to first token, the generation speed,
+the prompt/completion token counts and the cache lookups. Everything lands
+in `metrics_registry`, which the API exposes on `/metrics`. When a trace
+finishes, its structured record (query, status, scores, latencies...) is
+handed to the listeners registered with `add_trace_listener`.
+
+The state of the shared components (caches, scheduler, router, single-flight)
+is exported at scrape time by `collect_components`.
+"""
+
+import time
+import asyncio
+import logging
+from datetime import datetime, timezone
+from contextlib import aclosing, contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.outputs import LLMResult
+
+from rag.utils.metrics import metrics_registry, Family
+from rag.utils.scheduler import OverloadedError
+
+REQUEST_LABELS = ("endpoint", "model", "collection")
+TOKENS_PER_SECOND_BUCKETS = (1, 2, 5, 10, 15, 20, 30, 50, 75, 100, 200)
+
+stage_duration = metrics_registry.histogram(
+    "rag_stage_duration_seconds",
+    "Duration of each stage of a RAG request",
+    REQUEST_LABELS + ("stage",),
+)
+request_duration = metrics_registry.histogram(
+    "rag_request_duration_seconds",
+    "Total duration of RAG requests, until the last chunk for streams",
+    REQUEST_LABELS,
+)
+time_to_first_token = metrics_registry.histogram(
+    "rag_time_to_first_token_seconds",
+    "Time from the start of a streamed RAG request to its first content chunk",
+    REQUEST_LABELS,
+)
+generation_speed = metrics_registry.histogram(
+    "rag_generation_tokens_per_second",
+    "Generation speed of the LLM calls",
+    REQUEST_LABELS,
+    buckets=TOKENS_PER_SECOND_BUCKETS,
+)
+prompt_tokens = metrics_registry.counter(
+    "rag_prompt_tokens_total", "Prompt tokens sent to the LLM", REQUEST_LABELS
+)
+completion_tokens = metrics_registry.counter(
+    "rag_completion_tokens_total", "Completion tokens generated by the LLM", REQUEST_LABELS
+)
+requests_total = metrics_registry.counter(
+    "rag_requests_total",
+    "RAG requests by outcome (generated, coalesced, answer_cache, semantic_cache, rejected, no_context, overloaded, cancelled, error)",
+    REQUEST_LABELS + ("outcome",),
+)
+cache_lookups = metrics_registry.counter(
+    "rag_cache_lookups_total",
+    "Cache lookups made by RAG requests",
+    REQUEST_LABELS + ("cache", "result"),
+)
+
+_current_trace: ContextVar[Optional["RequestTrace"]] = ContextVar("rag_request_trace", default=None)
+_trace_listeners: List[Callable[[Dict[str, Any]], None]] = []
+
+
+class RequestTrace:
+    """
+    Timings and token counts of one RAG request.
+
+    Attributes:
+        labels (dict): endpoint, model and collection labels of every metric recorded
+        query (str): Query text, for the structured record
+        outcome (str): How the request was answered, reported when it finishes
+        fields (dict): Extra fields of the structured record (status, scores, chunk ids)
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        model: Optional[str],
+        collection: Optional[str],
+        query: Optional[str] = None,
+    ):
+        self.labels = {
+            "endpoint": endpoint,
+            "model": model or "default",
+            "collection": collection or "default",
+        }
+        self.query = query
+        self.outcome = "generated"
+        self.fields: Dict[str, Any] = {}
+        self.stages: Dict[str, float] = {}
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.timestamp = datetime.now(timezone.utc)
+        self.started = time.monotonic()
+        self.first_token_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.finished = False
+
+    @contextmanager
+    def stage(self, name: str):
+        """Records the duration of the block as a stage of the request."""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - started)
+
+    def observe(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+        stage_duration.observe(seconds, stage=name, **self.labels)
+
+    def cache_lookup(self, cache: str, hit: bool) -> None:
+        cache_lookups.inc(cache=cache, result="hit" if hit else "miss", **self.labels)
+
+    def first_token(self) -> None:
+        if self.first_token_at is None:
+            self.first_token_at = time.monotonic()
+            time_to_first_token.observe(self.first_token_at - self.started, **self.labels)
+
+    def generation(self, prompt_count: int, completion_count: int, seconds: float) -> None:
+        """Records the token counts and speed of an LLM call."""
+        self.prompt_tokens += prompt_count
+        self.completion_tokens += completion_count
+        prompt_tokens.inc(prompt_count, **self.labels)
+        completion_tokens.inc(completion_count, **self.labels)
+        if completion_count and seconds > 0:
+            generation_speed.observe(completion_count / seconds, **self.labels)
+
+    def finish(self, outcome: Optional[str] = None) -> None:
+        """Records the total duration and outcome, once, and notifies the trace listeners."""
+        if self.finished:
+            return
+        self.finished = True
+        self.finished_at = time.monotonic()
+        if outcome is not None:
+            self.outcome = outcome
+        request_duration.observe(self.finished_at - self.started, **self.labels)
+        requests_total.inc(outcome=self.outcome, **self.labels)
+
+        if _trace_listeners:
+            record = self.record()
+            for listener in _trace_listeners:
+                try:
+                    listener(record)
+                except Exception as e:
+                    logging.error(f"Trace listener failed: {str(e)}")
+
+    def record(self) -> Dict[str, Any]:
+        """Structured record of the request, with latencies in seconds."""
+        end = self.finished_at if self.finished_at is not None else time.monotonic()
+        return {
+            "timestamp": self.timestamp.isoformat(),
+            **self.labels,
+            "query": self.query,
+            "outcome": self.outcome,
+            **self.fields,
+            "latencies": {name: round(seconds, 6) for name, seconds in self.stages.items()},
+            "ttft": round(self.first_token_at - self.started, 6) if self.first_token_at else None,
+            "total": round(end - self.started, 6),
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+        }
+
+    async def run(self, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Runs a request with this trace as the current one.
+
+        Plain results finish the trace right away. Streams finish it when they
+        are exhausted or closed, and report their first content chunk.
+        """
+        token = _current_trace.set(self)
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            self.finish("cancelled")
+            raise
+        except OverloadedError:
+            self.finish("overloaded")
+            raise
+        except Exception:
+            self.finish("error")
+            raise
+        finally:
+            _current_trace.reset(token)
+
+        if hasattr(result, "__aiter__"):
+            return self._follow(result)
+        self.finish()
+        return result
+
+    async def _follow(self, stream: AsyncIterator[Any]) -> AsyncIterator[Any]:
+        outcome = None
+        try:
+            async with aclosing(stream) as chunks:
+                async for chunk in chunks:
+                    if isinstance(chunk, dict) and chunk.get("type") == "content":
+                        self.first_token()
+                    yield chunk
+        except (GeneratorExit, asyncio.CancelledError):
+            outcome = "cancelled"
+            raise
+        except OverloadedError:
+            outcome = "overloaded"
+            raise
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            self.finish(outcome)
+
+
+class UsageCallback(BaseCallbackHandler):
+    """Reads the token counts Ollama reports at the end of a generation."""
+
+    run_inline = True
+
+    def __init__(self):
+        self.prompt_tokens: Optional[int] = None
+        self.completion_tokens: Optional[int] = None
+        self.eval_seconds: Optional[float] = None
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        try:
+            info = response.generations[0][0].generation_info or {}
+        except IndexError:
+            return
+        self.prompt_tokens = info.get("prompt_eval_count")
+        self.completion_tokens = info.get("eval_count")
+        if info.get("eval_duration"):
+            self.eval_seconds = info["eval_duration"] / 1e9
+
+
+def usage_config(model, callback: UsageCallback) -> Dict[str, Any]:
+    """Keyword arguments attaching the callback to a call of a LangChain model."""
+    if isinstance(model, BaseLanguageModel):
+        return {"config": {"callbacks": [callback]}}
+    return {}
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+def add_trace_listener(listener: Callable[[Dict[str, Any]], None]) -> None:
+    """Registers a callback receiving the record of every finished request. It must not block."""
+    _trace_listeners.append(listener)
+
+
+def remove_trace_listener(listener: Callable[[Dict[str, Any]], None]) -> None:
+    """Unregisters a callback added with `add_trace_listener`."""
+    if listener in _trace_listeners:
+        _trace_listeners.remove(listener)
+
+
+def annotate(**fields: Any) -> None:
+    """Adds fields to the structured record of the current request, if any."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.fields.update(fields)
+
+
+def stage(name: str):
+    """Records a stage on the current request, if any."""
+    trace = _current_trace.get()
+    return trace.stage(name) if trace is not None else nullcontext()
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.cache_lookup(cache, hit)
+
+
+def set_outcome(outcome: str) -> None:
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.outcome = outcome
+
+
+def _family(name: str, type_name: str, help_text: str, samples: List) -> Family:
+    return name, type_name, help_text, samples
+
+
+def _cache_families(caches: Dict[str, Dict[str, float]]) -> Iterable[Family]:
+    yield _family("rag_cache_hits_total", "counter", "Hits of the shared caches",
+                  [({"cache": name}, stats.get("hits", 0)) for name, stats in caches.items()])
+    yield _family("rag_cache_misses_total", "counter", "Misses of the shared caches",
+                  [({"cache": name}, stats.get("misses", 0)) for name, stats in caches.items()])
+    yield _family("rag_cache_hit_ratio", "gauge", "Hit ratio of the shared caches since startup",
+                  [({"cache": name}, stats.get("hit_rate", 0.0)) for name, stats in caches.items()])
+    yield _family("rag_cache_entries", "gauge", "Entries held by the shared caches",
+                  [({"cache": name}, stats.get("size", 0)) for name, stats in caches.items()])
+
+
+def collect_components() -> Iterable[Family]:
+    """Exports the statistics of the shared components at scrape time."""
+    # Imported here: those modules are instrumented themselves
+    from rag import embedding
+    from rag.utils.answer_cache import answer_cache
+    from rag.utils.semantic_cache import semantic_cache
+    from rag.utils.retrieval_cache import retrieval_cache
+    from rag.utils.query_formulator import formulator_cache
+    from rag.utils.generation import cancellation_stats
+    from rag.utils.ollama_router import ollama_router
+    from rag.utils.scheduler import model_scheduler
+    from rag.utils.single_flight import single_flight
+    from rag.utils.query_log import query_log
+    from rag.utils.cache_warmer import cache_warmer
+    from rag.utils.query_classifier import query_classifier
+
+    caches = {
+        "answer": answer_cache.stats(),
+        "semantic": semantic_cache.stats(),
+        "retrieval": retrieval_cache.stats(),
+        "formulator": formulator_cache.stats(),
+    }
+    for (provider, model, endpoint), cache in list(embedding._memory_caches.items()):
+        caches[f"embedding:{provider}:{model}@{endpoint}"] = cache.stats()
+    yield from _cache_families(caches)
+
+    classified = query_classifier.stats()
+    yield _family("rag_query_classifier_queries_total", "counter",
+                  "Queries classified by path (fast_valid, fast_non_relevant, llm)",
+                  [({"path": path}, count) for path, count in classified.items()])
+
+    scheduler = model_scheduler.stats()
+    lanes = [
+        ({"model": model, "lane": lane}, stats)
+        for model, model_stats in scheduler.items()
+        for lane, stats in model_stats["lanes"].items()
+    ]
+    yield _family("rag_scheduler_queue_depth", "gauge", "Requests waiting for a model slot",
+                  [(labels, stats["queued"]) for labels, stats in lanes])
+    yield _family("rag_scheduler_active", "gauge", "Generations holding a model slot",
+                  [(labels, stats["active"]) for labels, stats in lanes])
+    yield _family("rag_scheduler_admitted_total", "counter", "Requests admitted to a model slot",
+                  [(labels, stats["admitted"]) for labels, stats in lanes])
+    yield _family("rag_scheduler_wait_seconds_total", "counter", "Time spent waiting for a model slot",
+                  [(labels, stats["wait_seconds_total"]) for labels, stats in lanes])
+    yield _family("rag_scheduler_wait_seconds_max", "gauge", "Longest wait for a model slot",
+                  [(labels, stats["wait_seconds_max"]) for labels, stats in lanes])
+    yield _family("rag_scheduler_rejected_total", "counter", "Requests rejected because the queue was full",
+                  [({"model": model}, stats["rejected"]) for model, stats in scheduler.items()])
+    yield _family("rag_scheduler_timed_out_total", "counter", "Requests that timed out waiting for a slot",
+                  [({"model": model}, stats["timed_out"]) for model, stats in scheduler.items()])
+
+    router = ollama_router.stats()
+    backends = router["backends"]
+    yield _family("rag_ollama_backend_healthy", "gauge", "Whether an Ollama backend accepts requests",
+                  [({"backend": url}, 1 if stats["healthy"] else 0) for url, stats in backends.items()])
+    yield _family("rag_ollama_backend_in_flight", "gauge", "Calls in flight on an Ollama backend",
+                  [({"backend": url}, stats["in_flight"]) for url, stats in backends.items()])
+    yield _family("rag_ollama_backend_requests_total", "counter", "Calls sent to an Ollama backend",
+                  [({"backend": url}, stats["requests"]) for url, stats in backends.items()])
+    yield _family("rag_ollama_backend_failures_total", "counter", "Connection failures of an Ollama backend",
+                  [({"backend": url}, stats["failures"]) for url, stats in backends.items()])
+    for name in ("failovers", "hedgeable_calls", "hedges", "hedge_wins"):
+        yield _family(f"rag_ollama_{name}_total", "counter", f"Router {name.replace('_', ' ')}",
+                      [({}, router[name])])
+
+    cancellations = cancellation_stats.stats()
+    yield _family("rag_generation_cancellations_total", "counter",
+                  "Generations cancelled because their client went away",
+                  [({}, cancellations["cancellations"])])
+    yield _family("rag_generation_tokens_saved_total", "counter",
+                  "Token budget left unproduced by cancelled generations",
+                  [({}, cancellations["tokens_saved"])])
+
+    coalescing = single_flight.stats()
+    yield _family("rag_single_flight_executions_total", "counter", "Requests executed by single-flight",
+                  [({}, coalescing["executions"])])
+    yield _family("rag_single_flight_coalesced_total", "counter",
+                  "Requests served by an identical in-flight request",
+                  [({}, coalescing["coalesced"])])
+    yield _family("rag_single_flight_in_flight", "gauge", "Shared requests in flight",
+                  [({}, coalescing["in_flight"])])
+
+    records = query_log.stats()
+    yield _family("rag_query_log_records_total", "counter", "Query records by fate (written, dropped, failed)",
+                  [({"result": name}, records[name]) for name in ("written", "dropped", "failed")])
+    yield _family("rag_query_log_queued", "gauge", "Query records waiting to be written",
+                  [({}, records["queued"])])
+
+    warmup = cache_warmer.stats()
+    yield _family("rag_cache_warmup_queries_total", "counter", "Queries replayed by the cache warm-up",
+                  [({"result": name}, warmup[name]) for name in ("warmed", "failed", "rejected")])
+    yield _family("rag_cache_warmup_paused_seconds_total", "counter",
+                  "Time the cache warm-up waited for live load to drop",
+                  [({}, warmup["paused_seconds"])])
+
+
+metrics_registry.register_collector(collect_components)
@@ -0,0 +1,155 @@
+"""
+Prometheus metrics: counters, histograms and scrape-time collectors.
+
+The metrics live in a `prometheus_client` CollectorRegistry, which renders
+them in the Prometheus text exposition format. Collectors are plain
+callables yielding `Family` tuples; they are adapted into custom
+`prometheus_client` collectors so components do not depend on it.
+"""
+
+import logging
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import prometheus_client
+from prometheus_client import CollectorRegistry, generate_latest
+from prometheus_client.core import Metric
+from prometheus_client.registry import Collector
+
+# (name, type, help, [(labels, value)]) produced by a collector at scrape time
+Family = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+DEFAULT_LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0,
+)
+CONTENT_TYPE_LATEST = prometheus_client.CONTENT_TYPE_LATEST
+
+
+class _Metric:
+    """Wraps a `prometheus_client` metric so labels are passed as keyword arguments."""
+
+    def __init__(self, name: str, metric, labelnames: Sequence[str]):
+        self.name = name
+        self.labelnames = tuple(labelnames)
+        self._metric = metric
+
+    def _child(self, labels: Dict[str, str]):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return self._metric.labels(**labels) if self.labelnames else self._metric
+
+    def _sample(self, sample_name: str, labels: Dict[str, str]) -> float:
+        self._child(labels)
+        wanted = {name: str(value) for name, value in labels.items()}
+        for family in self._metric.collect():
+            for sample in family.samples:
+                if sample.name == sample_name and sample.labels == wanted:
+                    return sample.value
+        return 0.0
+
+
+class Counter(_Metric):
+    """Monotonically increasing value per label set."""
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        self._child(labels).inc(amount)
+
+    def value(self, **labels: str) -> float:
+        return self._sample(self.name.removesuffix("_total") + "_total", labels)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets, per label set."""
+
+    def observe(self, value: float, **labels: str) -> None:
+        self._child(labels).observe(value)
+
+    def count(self, **labels: str) -> int:
+        return int(self._sample(self.name + "_count", labels))
+
+
+class _FamilyCollector(Collector):
+    """Exposes the families yielded by a collector callable at scrape time."""
+
+    def __init__(self, collector: Callable[[], Iterable[Family]]):
+        self._collector = collector
+
+    def collect(self) -> Iterable[Metric]:
+        try:
+            families = list(self._collector())
+        except Exception as e:
+            logging.error(f"Metrics collector {self._collector.__name__} failed: {str(e)}")
+            return []
+
+        metrics = []
+        for name, type_name, help_text, samples in families:
+            if type_name == "counter":
+                # The family of a counter is named without the suffix of its samples
+                name = name.removesuffix("_total")
+                metric, sample_name = Metric(name, help_text, type_name), name + "_total"
+            else:
+                metric, sample_name = Metric(name, help_text, type_name), name
+            for labels, value in samples:
+                metric.add_sample(sample_name, {key: str(label) for key, label in labels.items()}, value)
+            metrics.append(metric)
+        return metrics
+
+
+class MetricsRegistry:
+    """
+    Holds the application metrics and renders them for Prometheus.
+
+    Besides counters and histograms updated as requests run, collectors are
+    called at scrape time to export the state of other components (cache
+    statistics, queue depths...).
+    """
+
+    def __init__(self):
+        self.registry = CollectorRegistry()
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, name: str, kind: type, labelnames: Sequence[str], create: Callable[[], _Metric]) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(name)
+            if existing is not None:
+                if type(existing) is not kind or existing.labelnames != tuple(labelnames):
+                    raise ValueError(f"Metric {name} is already registered differently")
+                return existing
+            metric = create()
+            self._metrics[name] = metric
+            return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(name, Counter, labelnames, lambda: Counter(
+            name,
+            prometheus_client.Counter(name, help_text, labelnames, registry=self.registry),
+            labelnames,
+        ))
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Optional[Sequence[float]] = None,
+    ) -> Histogram:
+        return self._register(name, Histogram, labelnames, lambda: Histogram(
+            name,
+            prometheus_client.Histogram(
+                name, help_text, labelnames, registry=self.registry,
+                buckets=buckets or DEFAULT_LATENCY_BUCKETS,
+            ),
+            labelnames,
+        ))
+
+    def register_collector(self, collector: Callable[[], Iterable[Family]]) -> None:
+        self.registry.register(_FamilyCollector(collector))
+
+    def render(self) -> str:
+        """Returns every metric in the Prometheus text exposition format."""
+        return generate_latest(self.registry).decode("utf-8")
+
+
+# Create a global metrics registry instance
+metrics_registry = MetricsRegistry()
@@ -0,0 +1,19 @@
+import re
+import unicodedata
+
+_whitespace_pattern = re.compile(r"\s+")
+
+
+def strip_accents(text: str) -> str:
+    """Removes diacritics ("procédure" -> "procedure")."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def normalize_query(query_text: str) -> str:
+    """
+    Returns a canonical form of a user query, used to compare queries and build cache keys.
+    Case, accents and whitespace differences are ignored.
+    """
+    normalized = strip_accents(query_text).casefold()
+    return _whitespace_pattern.sub(" ", normalized).strip()
@@ -0,0 +1,164 @@
+"""
+Shared Ollama clients.
+
+Every LLM call site gets its `OllamaLLM` from a single factory that caches
+instances by (base url, model, options), so HTTP connections are kept alive
+and reused across requests instead of being opened per call. The factory owns
+the connection pools (httpx transports) of those clients and closes them on
+shutdown.
+"""
+
+import os
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+from dotenv import load_dotenv
+
+import httpx
+from langchain_ollama.llms import OllamaLLM
+
+load_dotenv()
+OLLAMA_BASE_URL = os.getenv("VITE_OLLAMA_BASE_URL")
+# Connection pool limits, per client (each client talks to a single host)
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "32"))
+OLLAMA_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OLLAMA_MAX_KEEPALIVE_CONNECTIONS", "16"))
+OLLAMA_KEEPALIVE_EXPIRY = float(os.getenv("OLLAMA_KEEPALIVE_EXPIRY", "120"))
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "10"))
+# Timeout of the plain HTTP client used for short calls (e.g. chat summaries)
+OLLAMA_HTTP_TIMEOUT = float(os.getenv("OLLAMA_HTTP_TIMEOUT", "30"))
+
+
+def _pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=OLLAMA_MAX_CONNECTIONS,
+        max_keepalive_connections=OLLAMA_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=OLLAMA_KEEPALIVE_EXPIRY,
+    )
+
+
+def client_kwargs() -> Dict[str, Any]:
+    """
+    Keyword arguments for the httpx clients created by the Ollama integrations.
+    Generations can be long, so only connecting is bounded in time.
+    """
+    return {
+        "limits": _pool_limits(),
+        "timeout": httpx.Timeout(None, connect=OLLAMA_CONNECT_TIMEOUT),
+    }
+
+
+class OllamaClientFactory:
+    """
+    Cache of Ollama clients shared by the whole application.
+
+    Attributes:
+        base_url (str): Default Ollama server URL.
+    """
+
+    def __init__(self, base_url: Optional[str] = OLLAMA_BASE_URL):
+        self.base_url = base_url
+        self._llms: Dict[Tuple[Hashable, ...], OllamaLLM] = {}
+        self._transports: List[Tuple[httpx.HTTPTransport, httpx.AsyncHTTPTransport]] = []
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+    def _check_loop(self) -> None:
+        """Async clients are bound to an event loop, drop the ones created on a previous loop."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if loop is not self._loop:
+            if self._loop is not None:
+                self._llms.clear()
+                self._transports.clear()
+                self._http_client = None
+            self._loop = loop
+
+    def llm(self, model: str, base_url: Optional[str] = None, **options: Any) -> OllamaLLM:
+        """
+        Returns the shared `OllamaLLM` for a model and set of options.
+
+        Args:
+            model: Ollama model name
+            base_url: Ollama server URL (defaults to the factory's one)
+            **options: Generation options, e.g. temperature, num_predict, num_ctx
+
+        Returns:
+            OllamaLLM: A client reused by every caller asking for the same model and options
+        """
+        url = (base_url or self.base_url or "").rstrip("/") or None
+        key = (url, model, tuple(sorted(options.items())))
+        with self._lock:
+            self._check_loop()
+            llm = self._llms.get(key)
+            if llm is None:
+                # The pools are passed in, rather than created by the clients, so they can be closed here
+                transport = httpx.HTTPTransport(limits=_pool_limits())
+                async_transport = httpx.AsyncHTTPTransport(limits=_pool_limits())
+                llm = OllamaLLM(
+                    base_url=url,
+                    model=model,
+                    client_kwargs=client_kwargs(),
+                    sync_client_kwargs={"transport": transport},
+                    async_client_kwargs={"transport": async_transport},
+                    **options,
+                )
+                self._llms[key] = llm
+                self._transports.append((transport, async_transport))
+            return llm
+
+    def on_host(self, llm: OllamaLLM, base_url: str) -> OllamaLLM:
+        """
+        Returns the shared client with the same model and options as `llm`, on another host.
+        Models not created by the factory are returned unchanged.
+        """
+        with self._lock:
+            key = next((key for key, cached in self._llms.items() if cached is llm), None)
+        if key is None:
+            return llm
+        _url, model, options = key
+        return self.llm(model, base_url=base_url, **dict(options))
+
+    def http_client(self) -> httpx.AsyncClient:
+        """Returns the shared async HTTP client for direct calls to the Ollama API."""
+        with self._lock:
+            self._check_loop()
+            if self._http_client is None or self._http_client.is_closed:
+                self._http_client = httpx.AsyncClient(
+                    base_url=self.base_url or "http://localhost:11434",
+                    limits=_pool_limits(),
+                    timeout=OLLAMA_HTTP_TIMEOUT,
+                )
+            return self._http_client
+
+    def startup(self) -> None:
+        """Creates the shared HTTP client ahead of the first request."""
+        self.http_client()
+
+    async def aclose(self) -> None:
+        """Closes every pooled connection and forgets the cached clients."""
+        with self._lock:
+            transports = list(self._transports)
+            http_client = self._http_client
+            self._llms.clear()
+            self._transports.clear()
+            self._http_client = None
+
+        for transport, async_transport in transports:
+            try:
+                transport.close()
+                await async_transport.aclose()
+            except Exception as e:
+                logging.warning(f"Could not close an Ollama connection pool: {str(e)}")
+        if http_client is not None:
+            await http_client.aclose()
+
+    def cached_clients(self) -> int:
+        return len(self._llms)
+
+
+# Create a global Ollama client factory instance
+ollama_clients = OllamaClientFactory()
@@ -0,0 +1,342 @@
+"""
+Routing of Ollama calls across several backends.
+
+Each call goes to the least-loaded healthy backend, preferring hosts that
+served the model recently (so it is likely still loaded in memory). A backend
+that refuses connections is taken out of rotation for a cooldown period and
+the call fails over to the next one.
+
+Small idempotent calls can also be hedged: when the first attempt is slower
+than a percentile of the recent latencies, a duplicate is sent to another
+backend and the first answer wins.
+"""
+
+import os
+import math
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Sequence
+from dotenv import load_dotenv
+
+import httpx
+
+load_dotenv()
+OLLAMA_BASE_URL = os.getenv("VITE_OLLAMA_BASE_URL")
+# Comma separated Ollama URLs, defaults to the single VITE_OLLAMA_BASE_URL
+OLLAMA_BACKENDS = os.getenv("OLLAMA_BACKENDS", "")
+# Seconds a backend stays out of rotation after a connection error
+OLLAMA_BACKEND_COOLDOWN = float(os.getenv("OLLAMA_BACKEND_COOLDOWN", "15"))
+# Seconds a model is assumed to stay loaded on a host after its last use (Ollama keep_alive)
+OLLAMA_MODEL_KEEP_ALIVE = float(os.getenv("OLLAMA_MODEL_KEEP_ALIVE", "300"))
+# Hedging of small idempotent calls (formulator, query embeddings)
+OLLAMA_HEDGING_ENABLED = os.getenv("OLLAMA_HEDGING_ENABLED", "false").lower() == "true"
+# A duplicate is sent once the first attempt is slower than this percentile of recent latencies
+OLLAMA_HEDGE_PERCENTILE = float(os.getenv("OLLAMA_HEDGE_PERCENTILE", "95"))
+# Delay used until enough latencies have been observed, in seconds
+OLLAMA_HEDGE_DEFAULT_DELAY = float(os.getenv("OLLAMA_HEDGE_DEFAULT_DELAY", "1.0"))
+OLLAMA_HEDGE_MIN_DELAY = float(os.getenv("OLLAMA_HEDGE_MIN_DELAY", "0.05"))
+OLLAMA_HEDGE_WINDOW = int(os.getenv("OLLAMA_HEDGE_WINDOW", "200"))
+OLLAMA_HEDGE_MIN_SAMPLES = 20
+
+# Errors meaning the request never reached the backend, safe to retry elsewhere
+CONNECTION_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, ConnectionError)
+
+# Weight of the latest sample in the latency moving averages
+LATENCY_SMOOTHING = 0.2
+
+
+def parse_backends(value: str, default: Optional[str] = OLLAMA_BASE_URL) -> List[str]:
+    backends = [url.strip().rstrip("/") for url in value.split(",") if url.strip()]
+    if not backends and default:
+        backends = [default.rstrip("/")]
+    return backends
+
+
+class _ModelState:
+    def __init__(self):
+        self.in_flight = 0
+        self.latency: Optional[float] = None
+        self.last_used = 0.0
+
+
+class Backend:
+    """
+    Load and health of one Ollama host.
+
+    Attributes:
+        url (str): Base URL of the host.
+        in_flight (int): Requests currently running on the host.
+        latency (Optional[float]): Moving average of the response latency, in seconds.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.in_flight = 0
+        self.latency: Optional[float] = None
+        self.requests = 0
+        self.failures = 0
+        self.unhealthy_until = 0.0
+        self.models: Dict[str, _ModelState] = {}
+
+    def _model(self, model: str) -> _ModelState:
+        if model not in self.models:
+            self.models[model] = _ModelState()
+        return self.models[model]
+
+    def is_healthy(self, now: float) -> bool:
+        return now >= self.unhealthy_until
+
+    def has_loaded(self, model: str, now: float) -> bool:
+        state = self.models.get(model)
+        return state is not None and (state.in_flight > 0 or now - state.last_used < OLLAMA_MODEL_KEEP_ALIVE)
+
+    def start(self, model: str) -> None:
+        self.in_flight += 1
+        self.requests += 1
+        self._model(model).in_flight += 1
+
+    def finish(self, model: str) -> None:
+        state = self._model(model)
+        self.in_flight = max(0, self.in_flight - 1)
+        state.in_flight = max(0, state.in_flight - 1)
+        state.last_used = time.monotonic()
+
+    def record_latency(self, model: str, seconds: float) -> None:
+        state = self._model(model)
+        self.latency = seconds if self.latency is None else (
+            (1 - LATENCY_SMOOTHING) * self.latency + LATENCY_SMOOTHING * seconds
+        )
+        state.latency = seconds if state.latency is None else (
+            (1 - LATENCY_SMOOTHING) * state.latency + LATENCY_SMOOTHING * seconds
+        )
+
+    def mark_failed(self, cooldown: float) -> None:
+        self.failures += 1
+        self.unhealthy_until = time.monotonic() + cooldown
+
+    def model_latency(self, model: str) -> Optional[float]:
+        state = self.models.get(model)
+        return state.latency if state is not None and state.latency is not None else self.latency
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "healthy": self.is_healthy(time.monotonic()),
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "failures": self.failures,
+            "latency": self.latency,
+            "models": {
+                model: {"in_flight": state.in_flight, "latency": state.latency}
+                for model, state in self.models.items()
+            },
+        }
+
+
+class NoBackendAvailableError(ConnectionError):
+    """Raised when every backend refused the request."""
+
+
+class OllamaRouter:
+    """
+    Least-loaded balancing with failover across Ollama backends.
+
+    Attributes:
+        backends (List[Backend]): The routed hosts.
+        cooldown (float): Seconds a failed backend is skipped.
+    """
+
+    def __init__(
+        self,
+        urls: Optional[Sequence[str]] = None,
+        cooldown: float = OLLAMA_BACKEND_COOLDOWN,
+        hedging: bool = OLLAMA_HEDGING_ENABLED,
+        hedge_percentile: float = OLLAMA_HEDGE_PERCENTILE,
+    ):
+        urls = list(urls) if urls is not None else parse_backends(OLLAMA_BACKENDS)
+        self.backends = [Backend(url) for url in urls]
+        self.cooldown = cooldown
+        self.hedging = hedging
+        self.hedge_percentile = hedge_percentile
+        self.failovers = 0
+        # Recent latencies of the hedgeable calls, per model
+        self._latencies: Dict[str, Deque[float]] = {}
+        self.hedgeable_calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def choose(self, model: str, exclude: Sequence[Backend] = ()) -> Optional[Backend]:
+        """
+        Picks the backend for a new request on the model.
+
+        Healthy backends come first. Among them, a host without the model loaded
+        counts as one more request in flight (it has to load the model), and ties
+        go to the lowest recent latency. When every backend is in cooldown, the
+        one that failed longest ago is tried anyway.
+        """
+        candidates = [backend for backend in self.backends if backend not in exclude]
+        if not candidates:
+            return None
+
+        now = time.monotonic()
+        healthy = [backend for backend in candidates if backend.is_healthy(now)]
+        if not healthy:
+            return min(candidates, key=lambda backend: backend.unhealthy_until)
+
+        def load(backend: Backend):
+            cold = 0 if backend.has_loaded(model, now) else 1
+            latency = backend.model_latency(model)
+            return (backend.in_flight + cold, latency if latency is not None else 0.0)
+
+        return min(healthy, key=load)
+
+    def _fail(self, backend: Backend, error: Exception) -> None:
+        logging.warning(f"Ollama backend {backend.url} unreachable, failing over: {str(error)}")
+        backend.mark_failed(self.cooldown)
+        self.failovers += 1
+
+    async def _attempt(self, backend: Backend, model: str, call: Callable[[str], Awaitable[Any]]) -> Any:
+        backend.start(model)
+        started = time.monotonic()
+        try:
+            result = await call(backend.url)
+        except CONNECTION_ERRORS as e:
+            self._fail(backend, e)
+            raise
+        finally:
+            backend.finish(model)
+        latency = time.monotonic() - started
+        backend.record_latency(model, latency)
+        if model in self._latencies:
+            self._latencies[model].append(latency)
+        return result
+
+    async def run(
+        self, model: str, call: Callable[[str], Awaitable[Any]], exclude: Sequence[Backend] = ()
+    ) -> Any:
+        """
+        Runs `call(base_url)` on the best backend, failing over on connection errors.
+
+        Args:
+            model: Ollama model the request is for
+            call: Coroutine function sending the request to the given base URL
+            exclude: Backends not to try
+
+        Returns:
+            The result of the first backend that answered
+        """
+        tried: List[Backend] = list(exclude)
+        last_error: Optional[Exception] = None
+        while True:
+            backend = self.choose(model, exclude=tried)
+            if backend is None:
+                raise NoBackendAvailableError(f"No Ollama backend reachable for {model}: {last_error}")
+            tried.append(backend)
+            try:
+                return await self._attempt(backend, model, call)
+            except CONNECTION_ERRORS as e:
+                last_error = e
+
+    def hedge_delay(self, model: str) -> float:
+        """Seconds to wait for the first attempt before sending a duplicate."""
+        latencies = self._latencies.get(model)
+        if not latencies or len(latencies) < OLLAMA_HEDGE_MIN_SAMPLES:
+            return OLLAMA_HEDGE_DEFAULT_DELAY
+        ordered = sorted(latencies)
+        index = min(len(ordered) - 1, math.ceil(self.hedge_percentile / 100 * len(ordered)) - 1)
+        return max(OLLAMA_HEDGE_MIN_DELAY, ordered[max(0, index)])
+
+    async def hedged(self, model: str, call: Callable[[str], Awaitable[Any]]) -> Any:
+        """
+        Runs an idempotent `call(base_url)`, hedged on a second backend if the first is slow.
+
+        If the first attempt has not answered within `hedge_delay(model)`, the same
+        call is sent to another healthy backend. The first successful answer is
+        returned and the other attempt is cancelled. Without hedging (disabled, or
+        a single backend) this is the same as `run`.
+        """
+        if model not in self._latencies:
+            self._latencies[model] = deque(maxlen=OLLAMA_HEDGE_WINDOW)
+        if not self.hedging or len(self.backends) < 2:
+            return await self.run(model, call)
+
+        self.hedgeable_calls += 1
+        first = self.choose(model)
+        attempts = {asyncio.ensure_future(self._attempt(first, model, call)): first}
+        try:
+            done, _pending = await asyncio.wait(attempts, timeout=self.hedge_delay(model))
+            if not done:
+                second = self.choose(model, exclude=[first])
+                if second is not None and second.is_healthy(time.monotonic()):
+                    self.hedges += 1
+                    attempts[asyncio.ensure_future(self._attempt(second, model, call))] = second
+
+            pending = set(attempts)
+            last_error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for attempt in done:
+                    if attempt.exception() is None:
+                        if attempts[attempt] is not first:
+                            self.hedge_wins += 1
+                        return attempt.result()
+                    last_error = attempt.exception()
+
+            if isinstance(last_error, CONNECTION_ERRORS):
+                # Every attempt was refused, fail over to the remaining backends
+                return await self.run(model, call, exclude=list(attempts.values()))
+            raise last_error
+        finally:
+            for attempt in attempts:
+                if not attempt.done():
+                    attempt.cancel()
+
+    async def stream(self, model: str, open_stream: Callable[[str], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """
+        Yields the chunks of `open_stream(base_url)` from the best backend.
+
+        The request fails over to another backend on connection errors until the
+        first chunk arrives; the latency recorded is the time to that first chunk.
+        """
+        tried: List[Backend] = []
+        last_error: Optional[Exception] = None
+        while True:
+            backend = self.choose(model, exclude=tried)
+            if backend is None:
+                raise NoBackendAvailableError(f"No Ollama backend reachable for {model}: {last_error}")
+            tried.append(backend)
+
+            backend.start(model)
+            started = time.monotonic()
+            first_chunk = True
+            try:
+                async with aclosing(open_stream(backend.url)) as chunks:
+                    async for chunk in chunks:
+                        if first_chunk:
+                            backend.record_latency(model, time.monotonic() - started)
+                            first_chunk = False
+                        yield chunk
+                return
+            except CONNECTION_ERRORS as e:
+                if not first_chunk:
+                    raise
+                self._fail(backend, e)
+                last_error = e
+            finally:
+                backend.finish(model)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "failovers": self.failovers,
+            "hedgeable_calls": self.hedgeable_calls,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "hedge_rate": self.hedges / self.hedgeable_calls if self.hedgeable_calls else 0.0,
+            "backends": {backend.url: backend.stats() for backend in self.backends},
+        }
+
+
+# Create a global Ollama router instance
+ollama_router = OllamaRouter()
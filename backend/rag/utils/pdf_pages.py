@@ -0,0 +1,79 @@
+"""
+Page-level PDF processing, run in the ingestion worker processes.
+
+Each task opens the PDF, extracts a range of pages, cleans their text and
+splits it into chunks. Only light modules are imported here so that spawned
+worker processes start quickly.
+"""
+
+import hashlib
+from typing import Any, Dict, List, Tuple, Union
+
+import fitz  # PyMuPDF
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from rag.utils.text_cleaning import clean_text
+
+# (chunk id, text, metadata)
+Chunk = Tuple[str, str, Dict[str, Any]]
+
+
+def chunk_id(source: str, page: int, index: int) -> str:
+    """Id of a chunk, "path:page:idx" as parsed by `format_sources_as_markdown`."""
+    return f"{source}:{page}:{index}"
+
+
+def content_hash(text: str) -> str:
+    """Hash of the text of a chunk, compared on re-ingestion to skip unchanged chunks."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def page_count(pdf: Union[str, bytes]) -> int:
+    """Number of pages of a PDF, given its path or its content."""
+    if isinstance(pdf, bytes):
+        document = fitz.open(stream=pdf, filetype="pdf")
+    else:
+        document = fitz.open(pdf)
+    with document:
+        return document.page_count
+
+
+def extract_page_chunks(
+    pdf_path: str,
+    source: str,
+    first_page: int,
+    last_page: int,
+    chunk_size: int = 1000,
+    chunk_overlap: int = 200,
+) -> List[Chunk]:
+    """
+    Extracts, cleans and splits a range of pages of a PDF.
+
+    Args:
+        pdf_path: Path of the PDF file
+        source: Document path stored in the chunk ids and metadata
+        first_page: First page of the range (0-based)
+        last_page: Page after the last page of the range
+        chunk_size: Maximum length of a chunk, in characters
+        chunk_overlap: Characters shared by consecutive chunks of a page
+
+    Returns:
+        List[Chunk]: The chunks of the pages, in page order. Chunk indexes restart at 0 on each page,
+            and the metadata holds the content hash of the chunk.
+    """
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+    )
+    chunks = []
+    with fitz.open(pdf_path) as document:
+        for page in range(first_page, min(last_page, document.page_count)):
+            text = clean_text(document[page].get_text(), source)
+            if not text:
+                continue
+            for index, piece in enumerate(splitter.split_text(text)):
+                identifier = chunk_id(source, page, index)
+                metadata = {"id": identifier, "source": source, "page": page, "hash": content_hash(piece)}
+                chunks.append((identifier, piece, metadata))
+    return chunks
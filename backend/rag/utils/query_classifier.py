@@ -0,0 +1,161 @@
+"""
+Cheap in-process query classifier.
+
+Runs before the formulator model: queries it is confident about are accepted
+or rejected immediately, only ambiguous ones pay for a formulator LLM round trip.
+"""
+
+import os
+import re
+import threading
+from collections import Counter
+from typing import Dict, Iterable, Optional
+from dotenv import load_dotenv
+
+from rag.utils.normalization import normalize_query
+
+load_dotenv()
+QUERY_CLASSIFIER_ENABLED = os.getenv("QUERY_CLASSIFIER_ENABLED", "true").lower() == "true"
+# Optional file with one corpus term per line, extends the built-in vocabulary
+QUERY_CLASSIFIER_VOCABULARY = os.getenv("QUERY_CLASSIFIER_VOCABULARY")
+
+# Minimum number of words before a query can be accepted without the LLM
+MIN_WORDS_FOR_FAST_PATH = 4
+
+# Terms are stored normalized (lowercase, no accents)
+TECHNICAL_TERMS = {
+    "norme", "normes", "standard", "standards", "specification", "specifications",
+    "configuration", "installation", "procedure", "procedures", "protocole",
+    "protocol", "manuel", "guide", "documentation", "document", "documents", "api",
+    "exigence", "exigences", "requirement", "requirements", "conformite",
+    "compliance", "essai", "essais", "test", "tests", "parametre", "parametres",
+    "tension", "courant", "transformateur", "disjoncteur", "poste", "postes",
+    "reseau", "protection", "relais", "ied", "ieds", "goose", "mms", "scl",
+    "substation", "cable", "cables", "isolation", "mesure", "mesures", "puissance",
+    "schema", "schemas", "architecture", "interface", "interfaces", "communication",
+    "equipement", "equipements", "securite", "maintenance", "annexe", "clause",
+    "chapitre", "section", "tableau", "definition", "definitions", "modele",
+    "donnees", "automate", "capteur", "capteurs", "frequence", "harmoniques",
+}
+
+TECHNICAL_PHRASES = (
+    "logical node",
+    "logical nodes",
+    "logical device",
+    "noeud logique",
+    "noeuds logiques",
+    "sampled values",
+    "haute tension",
+    "basse tension",
+)
+
+OFF_TOPIC_TERMS = {
+    "meteo", "recette", "recettes", "cuisine", "blague", "blagues", "football",
+    "match", "film", "films", "musique", "chanson", "horoscope", "restaurant",
+    "vacances", "politique", "celebrite", "poeme", "weather", "recipe", "joke",
+}
+
+OFF_TOPIC_PHRASES = (
+    "quel temps fait",
+    "quelle heure est",
+    "raconte moi une blague",
+)
+
+QUESTION_MARKERS = {
+    "quel", "quels", "quelle", "quelles", "comment", "pourquoi", "explique",
+    "expliquez", "expliquer", "decris", "decrivez", "detaille", "detaillez",
+    "donne", "donnez", "liste", "listez", "compare", "comparez", "resume",
+    "resumez", "what", "how", "why", "explain", "describe", "list",
+}
+
+# Standard references such as "IEC 61850", "ISO 9001", "NF C 15-100" or a bare "61850"
+_standard_pattern = re.compile(
+    r"\b(?:iec|cei|iso|nf|ieee|ute|itu|etsi)\s*[-/]?\s*\d{2,5}(?:[-.]\d+)*\b"
+    r"|\b6\d{4}(?:-\d+)*\b"
+)
+_token_pattern = re.compile(r"[a-z0-9]+")
+
+
+class QueryClassifier:
+    """
+    Lexical classifier returning a verdict for confident cases only.
+
+    `classify` returns True for a clearly relevant query, False for a clearly
+    off-topic one and None when the formulator model has to decide.
+    """
+
+    def __init__(self, vocabulary: Optional[Iterable[str]] = None):
+        self.vocabulary = set(TECHNICAL_TERMS)
+        self.phrases = set(TECHNICAL_PHRASES)
+        if vocabulary:
+            self.add_vocabulary(vocabulary)
+        self._counters = Counter()
+        self._lock = threading.Lock()
+
+    def add_vocabulary(self, terms: Iterable[str]) -> None:
+        """Adds corpus terms (e.g. extracted from the indexed documents) to the vocabulary."""
+        for term in terms:
+            normalized = normalize_query(term)
+            if " " in normalized:
+                self.phrases.add(normalized)
+            elif normalized:
+                self.vocabulary.add(normalized)
+
+    def classify(self, query_text: str) -> Optional[bool]:
+        verdict = self._classify(normalize_query(query_text))
+        if verdict is True:
+            self._count("fast_valid")
+        elif verdict is False:
+            self._count("fast_non_relevant")
+        else:
+            self._count("llm")
+        return verdict
+
+    def _classify(self, normalized: str) -> Optional[bool]:
+        tokens = _token_pattern.findall(normalized)
+        if not tokens:
+            return None
+
+        technical_hits = sum(1 for token in tokens if token in self.vocabulary)
+        technical_hits += sum(1 for phrase in self.phrases if phrase in normalized)
+        off_topic_hits = sum(1 for token in tokens if token in OFF_TOPIC_TERMS)
+        off_topic_hits += sum(1 for phrase in OFF_TOPIC_PHRASES if phrase in normalized)
+        has_standard = _standard_pattern.search(normalized) is not None
+
+        if off_topic_hits and not technical_hits and not has_standard:
+            return False
+
+        if off_topic_hits or len(tokens) < MIN_WORDS_FOR_FAST_PATH:
+            return None
+
+        is_question = normalized.endswith("?") or any(
+            token in QUESTION_MARKERS for token in tokens
+        )
+        if (has_standard or technical_hits >= 2) and (is_question or len(tokens) >= 8):
+            return True
+
+        return None
+
+    def _count(self, path: str) -> None:
+        with self._lock:
+            self._counters[path] += 1
+
+    def stats(self) -> Dict[str, int]:
+        """Number of queries that took each path: fast_valid, fast_non_relevant and llm."""
+        with self._lock:
+            return {
+                "fast_valid": self._counters["fast_valid"],
+                "fast_non_relevant": self._counters["fast_non_relevant"],
+                "llm": self._counters["llm"],
+            }
+
+
+def _load_vocabulary(path: Optional[str]) -> Iterable[str]:
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+# Create a global classifier instance
+query_classifier = QueryClassifier(_load_vocabulary(QUERY_CLASSIFIER_VOCABULARY))
@@ -1,14 +1,25 @@
 import os
 import re
+import hashlib
 from dotenv import load_dotenv
 from langchain_ollama.llms import OllamaLLM
 from enum import Enum
 
+from rag.utils.cache import TTLCache
+from rag.utils.normalization import normalize_query
+from rag.utils.query_classifier import query_classifier, QUERY_CLASSIFIER_ENABLED
+from rag.utils.ollama_client import ollama_clients
+from rag.utils.generation import invoke_generation
+from rag.utils.instrumentation import record_cache_lookup
+from rag.utils.scheduler import CHAT_LANE
+
 load_dotenv()
 OLLAMA_BASE_URL = os.getenv("VITE_OLLAMA_BASE_URL")
 FORMULATOR_MODEL = os.getenv(
     "FORMULATOR_MODEL", "mistral:7b"
 )  # Default to a smaller model
+FORMULATOR_CACHE_SIZE = int(os.getenv("FORMULATOR_CACHE_SIZE", "2048"))
+FORMULATOR_CACHE_TTL = float(os.getenv("FORMULATOR_CACHE_TTL", "3600"))
 
 # Define query status types
 class QueryStatus(Enum):
@@ -33,19 +44,37 @@ SUPPORTED_DOCUMENT_TYPES = [
 ]
 
 
-def formulate_query(query_text: str):
+TOO_SHORT_MESSAGE = "Votre requête est trop courte. Veuillez fournir plus de détails."
+
+
+def _is_too_short(query_text: str) -> bool:
+    return len(query_text.strip()) < 3
+
+
+def _non_relevant_message() -> str:
+    document_types_list = "\n- ".join(SUPPORTED_DOCUMENT_TYPES)
+    return f'Votre question ne semble pas concerner l\'analyse de documents techniques. Je peux vous aider avec les types de documents suivants:\n- {document_types_list}\n\nEssayez par exemple: "Expliquez la procédure décrite dans le document" ou "Quels sont les points clés de ce manuel ?"'
+
+
+def _fast_path(query_text: str):
     """
-    Checks if a query is well-formed and relevant to technical documentation.
-    Returns a tuple of (status, result) where:
-    - status: QueryStatus enum indicating query validity type
-    - result: Either the original query (if valid) or a suggestion/explanation.
+    Returns a verdict without calling the formulator model when the local
+    classifier is confident, None otherwise.
     """
-    # Skip processing for very short queries
-    if len(query_text.strip()) < 3:
-        return QueryStatus.TOO_SHORT, "Votre requête est trop courte. Veuillez fournir plus de détails."
+    if not QUERY_CLASSIFIER_ENABLED:
+        return None
 
-    # Create a prompt for the formulator model
-    prompt = f"""Évaluez la pertinence et la clarté de la requête utilisateur : "{query_text}"
+    verdict = query_classifier.classify(query_text)
+    if verdict is True:
+        return QueryStatus.VALID, query_text
+    if verdict is False:
+        return QueryStatus.NON_RELEVANT, _non_relevant_message()
+    return None
+
+
+def _build_prompt(query_text: str) -> str:
+    """Builds the formulator prompt for a user query."""
+    return f"""Évaluez la pertinence et la clarté de la requête utilisateur : "{query_text}"
     CONCERNE : Documentation technique et analyse de documents.
     TYPES_SUPPORTÉS : {', '.join(SUPPORTED_DOCUMENT_TYPES)}.
     TERMES_TECHNIQUES_COURANTS : API, configuration, procédures, spécifications, installation, manuel, guide, documentation.
@@ -73,11 +102,114 @@ def formulate_query(query_text: str):
         -   Exemple: "Recette de cuisine" -> `NON_PERTINENT`
     """
 
-    # Initialize the smaller model
-    model = OllamaLLM(base_url=OLLAMA_BASE_URL, model=FORMULATOR_MODEL, temperature=0)
 
-    # Get response from model
-    response = model.invoke(prompt).strip()
+def _get_model() -> OllamaLLM:
+    return ollama_clients.llm(FORMULATOR_MODEL, temperature=0)
+
+
+class FormulatorCache:
+    """
+    Cache of formulator verdicts keyed on the normalized query.
+
+    Entries are tied to a fingerprint of the formulator model and prompt: when
+    either changes, the whole cache is dropped.
+    """
+
+    def __init__(self, max_size: int = FORMULATOR_CACHE_SIZE, ttl: float = FORMULATOR_CACHE_TTL):
+        self._cache = TTLCache(max_size=max_size, ttl=ttl)
+        self._fingerprint = None
+
+    @staticmethod
+    def fingerprint() -> str:
+        prompt = _build_prompt("{query}")
+        return hashlib.sha256(f"{FORMULATOR_MODEL}\n{prompt}".encode("utf-8")).hexdigest()
+
+    def _check_fingerprint(self) -> None:
+        current = self.fingerprint()
+        if current != self._fingerprint:
+            self._cache.clear()
+            self._fingerprint = current
+
+    def get(self, query_text: str):
+        self._check_fingerprint()
+        verdict = self._cache.get(normalize_query(query_text))
+        if verdict is None:
+            return None
+
+        status, result = verdict
+        if status == QueryStatus.VALID:
+            # A valid query proceeds with the user's own wording
+            return status, query_text
+        return status, result
+
+    def set(self, query_text: str, verdict) -> None:
+        self._check_fingerprint()
+        self._cache.set(normalize_query(query_text), verdict)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self):
+        return self._cache.stats()
+
+
+# Create a global verdict cache instance
+formulator_cache = FormulatorCache()
+
+
+def formulate_query(query_text: str):
+    """
+    Checks if a query is well-formed and relevant to technical documentation.
+    Returns a tuple of (status, result) where:
+    - status: QueryStatus enum indicating query validity type
+    - result: Either the original query (if valid) or a suggestion/explanation.
+    """
+    # Skip processing for very short queries
+    if _is_too_short(query_text):
+        return QueryStatus.TOO_SHORT, TOO_SHORT_MESSAGE
+
+    fast_verdict = _fast_path(query_text)
+    if fast_verdict is not None:
+        return fast_verdict
+
+    cached_verdict = formulator_cache.get(query_text)
+    if cached_verdict is not None:
+        return cached_verdict
+
+    response = _get_model().invoke(_build_prompt(query_text))
+    verdict = _parse_response(response, query_text)
+    formulator_cache.set(query_text, verdict)
+    return verdict
+
+
+async def aformulate_query(query_text: str, lane: str = CHAT_LANE):
+    """
+    Async version of `formulate_query` using the native async Ollama client,
+    so the event loop is never blocked while the formulator model runs.
+    The formulator model is scheduled in the lane of the calling request.
+    """
+    if _is_too_short(query_text):
+        return QueryStatus.TOO_SHORT, TOO_SHORT_MESSAGE
+
+    fast_verdict = _fast_path(query_text)
+    if fast_verdict is not None:
+        return fast_verdict
+
+    cached_verdict = formulator_cache.get(query_text)
+    record_cache_lookup("formulator", cached_verdict is not None)
+    if cached_verdict is not None:
+        return cached_verdict
+
+    # Short and idempotent, a slow backend is hedged when hedging is enabled
+    response = await invoke_generation(_get_model(), _build_prompt(query_text), lane, hedge=True)
+    verdict = _parse_response(response, query_text)
+    formulator_cache.set(query_text, verdict)
+    return verdict
+
+
+def _parse_response(response: str, query_text: str):
+    """Maps the raw formulator answer to a (QueryStatus, text) tuple."""
+    response = response.strip()
     # remove all thinking tokens if presents between '<think> </think>'
     response = re.sub(r"<think>.*?</think>", "", response, flags=re.DOTALL).strip()
 
@@ -97,8 +229,7 @@ def formulate_query(query_text: str):
             print(f"AVERTISSEMENT : Format SUGGESTION_CORRECTION du formulateur inattendu : '{response}'")
             return QueryStatus.NEEDS_CORRECTION, f'Votre requête semble contenir une erreur. Veuillez vérifier et reformuler votre question.'
     elif "NON_PERTINENT".upper() in response.upper():  # Case-insensitive match
-        document_types_list = "\n- ".join(SUPPORTED_DOCUMENT_TYPES)
-        return QueryStatus.NON_RELEVANT, f'Votre question ne semble pas concerner l\'analyse de documents techniques. Je peux vous aider avec les types de documents suivants:\n- {document_types_list}\n\nEssayez par exemple: "Expliquez la procédure décrite dans le document" ou "Quels sont les points clés de ce manuel ?"'
+        return QueryStatus.NON_RELEVANT, _non_relevant_message()
     else:
         # Fallback with warning - if nothing matches, assume the query is valid (original behavior)
         print(f"AVERTISSEMENT : Le formulateur a retourné un format inattendu : '{response}'")
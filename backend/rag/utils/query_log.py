@@ -0,0 +1,140 @@
+"""
+Structured query log written off the request path.
+
+Query records are written to a JSON lines file in batches by a background
+`BatchWriter`, so requests never wait on disk. The file is rotated by size.
+Writes and rotations take an exclusive file lock so several worker processes
+can share the log without interleaving records.
+"""
+
+import os
+import json
+import queue
+import fcntl
+import atexit
+import logging
+from pathlib import Path
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Dict, Iterator, List
+from dotenv import load_dotenv
+
+from rag.utils.batch_writer import BatchWriter
+
+load_dotenv()
+QUERY_LOG_ENABLED = os.getenv("QUERY_LOG_ENABLED", "true").lower() == "true"
+QUERY_LOG_PATH = os.getenv("QUERY_LOG_PATH") or str(
+    Path(__file__).parent.parent / "output" / "queries.jsonl"
+)
+# Size at which the log is rotated, and number of rotated files kept
+QUERY_LOG_MAX_BYTES = int(os.getenv("QUERY_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+QUERY_LOG_BACKUP_COUNT = int(os.getenv("QUERY_LOG_BACKUP_COUNT", "5"))
+# Records waiting to be written; beyond this, new records are dropped
+QUERY_LOG_QUEUE_SIZE = int(os.getenv("QUERY_LOG_QUEUE_SIZE", "10000"))
+QUERY_LOG_BATCH_SIZE = int(os.getenv("QUERY_LOG_BATCH_SIZE", "256"))
+# Maximum delay in seconds before a queued record is written
+QUERY_LOG_FLUSH_INTERVAL = float(os.getenv("QUERY_LOG_FLUSH_INTERVAL", "1.0"))
+
+
+class QueryLog(BatchWriter):
+    """
+    Batched, size-rotated JSON lines log fed through a queue.
+
+    Attributes:
+        path (str): Path of the current log file. Rotated files get a numeric suffix.
+        max_bytes (int): Size at which the file is rotated (0 disables rotation).
+        backup_count (int): Number of rotated files kept.
+    """
+
+    name = "query-log-writer"
+
+    def __init__(
+        self,
+        path: str = QUERY_LOG_PATH,
+        max_bytes: int = QUERY_LOG_MAX_BYTES,
+        backup_count: int = QUERY_LOG_BACKUP_COUNT,
+        queue_size: int = QUERY_LOG_QUEUE_SIZE,
+        batch_size: int = QUERY_LOG_BATCH_SIZE,
+        flush_interval: float = QUERY_LOG_FLUSH_INTERVAL,
+    ):
+        super().__init__(queue_size, batch_size, flush_interval)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+
+    def write_batch(self, records: List[Dict[str, Any]]) -> None:
+        data = "".join(
+            json.dumps(record, ensure_ascii=False, default=str) + "\n" for record in records
+        ).encode("utf-8")
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(f"{self.path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if self._should_rotate(len(data)):
+                    self._rotate()
+                # A single append per batch keeps the records of each batch contiguous
+                with open(self.path, "ab") as f:
+                    f.write(data)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _should_rotate(self, incoming: int) -> bool:
+        if self.max_bytes <= 0 or not os.path.exists(self.path):
+            return False
+        size = os.path.getsize(self.path)
+        return size > 0 and size + incoming > self.max_bytes
+
+    def _rotate(self) -> None:
+        if self.backup_count <= 0:
+            os.remove(self.path)
+            return
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def files(self) -> List[str]:
+        """Existing log files, oldest first."""
+        rotated = [f"{self.path}.{index}" for index in range(self.backup_count, 0, -1)]
+        return [path for path in rotated + [self.path] if os.path.exists(path)]
+
+    def read(self) -> Iterator[Dict[str, Any]]:
+        """Yields the records of every log file, oldest first, skipping malformed lines."""
+        for path in self.files():
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+
+
+def start_background_file_logging(
+    path: str,
+    log_format: str,
+    level: int = logging.INFO,
+    max_bytes: int = QUERY_LOG_MAX_BYTES,
+    backup_count: int = QUERY_LOG_BACKUP_COUNT,
+) -> QueueListener:
+    """
+    Configures the root logger to write to a size-rotated file from a background thread.
+
+    Log calls only put the record on a queue; a `QueueListener` does the file writes.
+
+    Returns:
+        QueueListener: The running listener, stopped at exit
+    """
+    file_handler = RotatingFileHandler(
+        path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+    )
+    file_handler.setFormatter(logging.Formatter(log_format))
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    logging.basicConfig(level=level, handlers=[QueueHandler(log_queue)])
+    return listener
+
+
+# Create a global query log instance
+query_log = QueryLog()
@@ -0,0 +1,41 @@
+import os
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from langchain_core.documents import Document
+
+from rag.utils.cache import TTLCache
+
+load_dotenv()
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "1024"))
+RETRIEVAL_CACHE_TTL = float(os.getenv("RETRIEVAL_CACHE_TTL", "86400"))
+
+RetrievalResult = Tuple[List[float], List[Tuple[Document, float]]]
+
+
+class RetrievalCache:
+    """
+    Cache of vector searches keyed by (collection, collection version, query, k).
+
+    Values are the query embedding and the scored chunks. Since the collection
+    version is part of the key, a search made before an ingestion can never be
+    served after it; stale entries simply age out of the LRU.
+    """
+
+    def __init__(self, max_size: int = RETRIEVAL_CACHE_SIZE, ttl: float = RETRIEVAL_CACHE_TTL):
+        self._cache = TTLCache(max_size=max_size, ttl=ttl)
+
+    def get(self, collection_name: str, version: int, query_text: str, k: int) -> Optional[RetrievalResult]:
+        return self._cache.get((collection_name, version, query_text, k))
+
+    def set(self, collection_name: str, version: int, query_text: str, k: int, result: RetrievalResult) -> None:
+        self._cache.set((collection_name, version, query_text, k), result)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, float]:
+        return self._cache.stats()
+
+
+# Create a global retrieval cache instance
+retrieval_cache = RetrievalCache()
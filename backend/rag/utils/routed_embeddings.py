@@ -0,0 +1,47 @@
+from typing import Dict, List
+
+from langchain_core.embeddings import Embeddings
+from langchain_ollama import OllamaEmbeddings
+
+from rag.utils.ollama_client import client_kwargs
+from rag.utils.ollama_router import OllamaRouter
+
+
+class RoutedEmbeddings(Embeddings):
+    """
+    Ollama embeddings spread over the router's backends.
+
+    Async requests of up to `max_hedged_batch` texts (query embeddings, small
+    batches) are hedged; larger batches are routed with failover only, so a slow
+    ingestion batch is never sent twice.
+    """
+
+    def __init__(self, model: str, router: OllamaRouter, max_hedged_batch: int = 32):
+        self.model = model
+        self.router = router
+        self.max_hedged_batch = max_hedged_batch
+        self._clients: Dict[str, OllamaEmbeddings] = {}
+
+    def _client(self, base_url: str) -> OllamaEmbeddings:
+        if base_url not in self._clients:
+            self._clients[base_url] = OllamaEmbeddings(
+                base_url=base_url, model=self.model, client_kwargs=client_kwargs()
+            )
+        return self._clients[base_url]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._client(self.router.choose(self.model).url).embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        def call(base_url: str):
+            return self._client(base_url).aembed_documents(texts)
+
+        if len(texts) <= self.max_hedged_batch:
+            return await self.router.hedged(self.model, call)
+        return await self.router.run(self.model, call)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
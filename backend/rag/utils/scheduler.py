@@ -0,0 +1,329 @@
+"""
+Admission control in front of the Ollama models.
+
+Every generation takes a slot of its model before calling Ollama. Each model
+has a concurrency cap; requests beyond it wait in a bounded queue with a
+deadline. When the queue is full, or the deadline passes, an `OverloadedError`
+is raised so the API can answer 429/503 with a Retry-After header instead of
+letting every request time out together inside Ollama.
+
+Requests are scheduled in priority lanes: a freed slot goes to the waiting
+interactive requests (chat, title summaries) before file chats and document
+comparisons, and the heavy lanes may only hold a share of a model's slots so
+that short questions never wait behind a batch of long comparisons. Cache
+warm-up requests come last of all.
+"""
+
+import os
+import math
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+# Concurrent generations per model, unless overridden in OLLAMA_MODEL_CONCURRENCY
+OLLAMA_MAX_CONCURRENCY = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "2"))
+# Per-model caps, e.g. "qwen3:32b=1,mistral-small3.1:latest=4"
+OLLAMA_MODEL_CONCURRENCY = os.getenv("OLLAMA_MODEL_CONCURRENCY", "")
+# Requests allowed to wait for a slot, per model
+OLLAMA_QUEUE_SIZE = int(os.getenv("OLLAMA_QUEUE_SIZE", "32"))
+# Maximum time in seconds a request waits for a slot
+OLLAMA_QUEUE_TIMEOUT = float(os.getenv("OLLAMA_QUEUE_TIMEOUT", "60"))
+# Share of a model's slots each lane may hold at once, e.g. "comparison=0.5,file_chat=0.75"
+OLLAMA_LANE_SHARES = os.getenv("OLLAMA_LANE_SHARES", "comparison=0.5,file_chat=0.75,warmup=0.5")
+
+MAX_RETRY_AFTER = 300
+
+# Scheduling lanes, lower priority values are served first
+CHAT_LANE = "chat"
+SUMMARY_LANE = "summary"
+FILE_CHAT_LANE = "file_chat"
+COMPARISON_LANE = "comparison"
+WARMUP_LANE = "warmup"
+LANE_PRIORITIES = {
+    CHAT_LANE: 0,
+    SUMMARY_LANE: 0,
+    FILE_CHAT_LANE: 1,
+    COMPARISON_LANE: 2,
+    WARMUP_LANE: 3,
+}
+# Lanes in the order they are served
+LANES = sorted(LANE_PRIORITIES, key=LANE_PRIORITIES.get)
+
+
+def parse_model_limits(value: str) -> Dict[str, int]:
+    """Parses "model=n,other=m" into a dict, ignoring malformed entries."""
+    limits = {}
+    for item in value.split(","):
+        model, _, limit = item.strip().rpartition("=")
+        if not model:
+            continue
+        try:
+            limits[model] = int(limit)
+        except ValueError:
+            logging.warning(f"Ignoring invalid concurrency limit: {item}")
+    return limits
+
+
+def parse_lane_shares(value: str) -> Dict[str, float]:
+    """Parses "lane=share,..." into a dict, ignoring unknown lanes and malformed entries."""
+    shares = {}
+    for item in value.split(","):
+        lane, _, share = item.strip().rpartition("=")
+        if not lane:
+            continue
+        if lane not in LANE_PRIORITIES:
+            logging.warning(f"Ignoring the share of unknown lane: {lane}")
+            continue
+        try:
+            shares[lane] = min(1.0, max(0.0, float(share)))
+        except ValueError:
+            logging.warning(f"Ignoring invalid lane share: {item}")
+    return shares
+
+
+class OverloadedError(Exception):
+    """
+    Raised when a request cannot be admitted.
+
+    Attributes:
+        status_code (int): 429 when the wait queue is full, 503 when the wait deadline passed.
+        retry_after (int): Suggested delay in seconds before retrying.
+    """
+
+    def __init__(self, message: str, status_code: int = 429, retry_after: int = 1):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class _LaneStats:
+    def __init__(self):
+        self.active = 0
+        self.waiters: Deque[asyncio.Future] = deque()
+        self.admitted = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+
+class _ModelSlots:
+    def __init__(self, limit: int, lane_shares: Dict[str, float]):
+        self.limit = max(1, limit)
+        self.active = 0
+        # Every lane may hold at least one slot
+        self.lane_limits = {
+            lane: max(1, math.floor(self.limit * lane_shares.get(lane, 1.0))) for lane in LANES
+        }
+        self.lanes = {lane: _LaneStats() for lane in LANES}
+        self.rejected = 0
+        self.timed_out = 0
+        # Moving average of how long a slot is held, used for Retry-After
+        self.average_hold = 1.0
+
+    def queued(self) -> int:
+        return sum(len(lane.waiters) for lane in self.lanes.values())
+
+    def can_run(self, lane: str) -> bool:
+        return self.active < self.limit and self.lanes[lane].active < self.lane_limits[lane]
+
+    def has_priority_waiters(self, lane: str) -> bool:
+        """Whether requests of this lane or a more urgent one are already waiting."""
+        priority = LANE_PRIORITIES[lane]
+        return any(
+            self.lanes[other].waiters for other in LANES if LANE_PRIORITIES[other] <= priority
+        )
+
+    def take(self, lane: str) -> None:
+        self.active += 1
+        self.lanes[lane].active += 1
+
+    def give_back(self, lane: str) -> None:
+        self.active = max(0, self.active - 1)
+        self.lanes[lane].active = max(0, self.lanes[lane].active - 1)
+
+
+class ModelScheduler:
+    """
+    Per-model concurrency caps with bounded, deadline-aware priority queues.
+
+    Attributes:
+        default_limit (int): Concurrent generations allowed for models without an explicit cap.
+        queue_size (int): Maximum number of waiting requests per model, all lanes included.
+        queue_timeout (float): Maximum wait for a slot, in seconds.
+    """
+
+    def __init__(
+        self,
+        default_limit: int = OLLAMA_MAX_CONCURRENCY,
+        limits: Optional[Dict[str, int]] = None,
+        queue_size: int = OLLAMA_QUEUE_SIZE,
+        queue_timeout: float = OLLAMA_QUEUE_TIMEOUT,
+        lane_shares: Optional[Dict[str, float]] = None,
+    ):
+        self.default_limit = default_limit
+        self.limits = limits if limits is not None else parse_model_limits(OLLAMA_MODEL_CONCURRENCY)
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.lane_shares = lane_shares if lane_shares is not None else parse_lane_shares(OLLAMA_LANE_SHARES)
+        self._models: Dict[str, _ModelSlots] = {}
+
+    def _slots(self, model: str) -> _ModelSlots:
+        slots = self._models.get(model)
+        if slots is None:
+            slots = _ModelSlots(self.limits.get(model, self.default_limit), self.lane_shares)
+            self._models[model] = slots
+        return slots
+
+    @staticmethod
+    def _check_lane(lane: str) -> None:
+        if lane not in LANE_PRIORITIES:
+            raise ValueError(f"Unknown scheduling lane: {lane}. Must be one of: {LANES}")
+
+    def retry_after(self, model: str) -> int:
+        """Estimated seconds until a new request for the model could get a slot."""
+        slots = self._slots(model)
+        estimate = slots.average_hold * (slots.queued() + 1) / slots.limit
+        return max(1, min(MAX_RETRY_AFTER, math.ceil(estimate)))
+
+    def check_admission(self, model: str, lane: str = CHAT_LANE) -> None:
+        """Raises `OverloadedError` (429) if a request for the model would be rejected right now."""
+        self._check_lane(lane)
+        slots = self._slots(model)
+        if not slots.can_run(lane) and slots.queued() >= self.queue_size:
+            slots.rejected += 1
+            raise OverloadedError(
+                f"Too many pending requests for model {model}",
+                status_code=429,
+                retry_after=self.retry_after(model),
+            )
+
+    async def acquire(self, model: str, lane: str = CHAT_LANE, timeout: Optional[float] = None) -> float:
+        """
+        Waits for a slot of the model.
+
+        Args:
+            model: Ollama model name
+            lane: Scheduling lane of the request (chat, summary, file_chat, comparison, warmup)
+            timeout: Maximum wait in seconds (defaults to the scheduler's queue timeout)
+
+        Returns:
+            float: Seconds spent waiting
+
+        Raises:
+            OverloadedError: If the queue is full (429) or the wait timed out (503)
+        """
+        self._check_lane(lane)
+        slots = self._slots(model)
+        started = time.monotonic()
+
+        if slots.can_run(lane) and not slots.has_priority_waiters(lane):
+            slots.take(lane)
+        else:
+            self.check_admission(model, lane)
+            waiter = asyncio.get_running_loop().create_future()
+            slots.lanes[lane].waiters.append(waiter)
+            try:
+                await asyncio.wait_for(
+                    asyncio.shield(waiter), timeout if timeout is not None else self.queue_timeout
+                )
+            except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                self._abandon(model, lane, waiter)
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                slots.timed_out += 1
+                raise OverloadedError(
+                    f"Timed out waiting for model {model}",
+                    status_code=503,
+                    retry_after=self.retry_after(model),
+                ) from None
+
+        waited = time.monotonic() - started
+        lane_stats = slots.lanes[lane]
+        lane_stats.admitted += 1
+        lane_stats.wait_seconds_total += waited
+        lane_stats.wait_seconds_max = max(lane_stats.wait_seconds_max, waited)
+        return waited
+
+    def _abandon(self, model: str, lane: str, waiter: asyncio.Future) -> None:
+        slots = self._slots(model)
+        if waiter.done() and not waiter.cancelled():
+            # The slot was handed over just before the deadline, give it back
+            self.release(model, lane)
+        else:
+            waiter.cancel()
+            try:
+                slots.lanes[lane].waiters.remove(waiter)
+            except ValueError:
+                pass
+            # A blocked request may have been holding back lower priority lanes
+            self._dispatch(slots)
+
+    def _dispatch(self, slots: _ModelSlots) -> None:
+        """Hands free slots to the waiting requests, most urgent lane first."""
+        for lane in LANES:
+            waiters = slots.lanes[lane].waiters
+            while waiters and slots.can_run(lane):
+                waiter = waiters.popleft()
+                if not waiter.done():
+                    slots.take(lane)
+                    waiter.set_result(None)
+
+    def release(self, model: str, lane: str = CHAT_LANE, held: Optional[float] = None) -> None:
+        """
+        Frees a slot of the model and hands it over to the most urgent waiting request.
+
+        Args:
+            model: Ollama model name
+            lane: Scheduling lane the slot was acquired in
+            held: Seconds the slot was held, feeds the Retry-After estimate
+        """
+        slots = self._slots(model)
+        if held is not None:
+            slots.average_hold = 0.8 * slots.average_hold + 0.2 * held
+        slots.give_back(lane)
+        self._dispatch(slots)
+
+    @asynccontextmanager
+    async def slot(self, model: str, lane: str = CHAT_LANE, timeout: Optional[float] = None):
+        """Holds a slot of the model for the duration of the block."""
+        await self.acquire(model, lane, timeout)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(model, lane, time.monotonic() - started)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Queue depth, active generations and wait times per model and lane."""
+        return {
+            model: {
+                "limit": slots.limit,
+                "active": slots.active,
+                "queued": slots.queued(),
+                "admitted": sum(lane.admitted for lane in slots.lanes.values()),
+                "rejected": slots.rejected,
+                "timed_out": slots.timed_out,
+                "wait_seconds_total": sum(lane.wait_seconds_total for lane in slots.lanes.values()),
+                "wait_seconds_max": max(lane.wait_seconds_max for lane in slots.lanes.values()),
+                "lanes": {
+                    name: {
+                        "limit": slots.lane_limits[name],
+                        "active": lane.active,
+                        "queued": len(lane.waiters),
+                        "admitted": lane.admitted,
+                        "wait_seconds_total": lane.wait_seconds_total,
+                        "wait_seconds_max": lane.wait_seconds_max,
+                    }
+                    for name, lane in slots.lanes.items()
+                },
+            }
+            for model, slots in self._models.items()
+        }
+
+
+# Create a global model scheduler instance
+model_scheduler = ModelScheduler()
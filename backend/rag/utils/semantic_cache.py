@@ -0,0 +1,151 @@
+import os
+import time
+import threading
+from typing import Dict, FrozenSet, Hashable, Iterable, List, Optional, Tuple
+from dotenv import load_dotenv
+
+import numpy as np
+
+load_dotenv()
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "1024"))
+# Minimum cosine similarity between two query embeddings to reuse an answer
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+
+
+class SemanticAnswerCache:
+    """
+    Answer cache for paraphrased questions.
+
+    Each entry holds a normalized query embedding, the set of retrieved chunk ids
+    and the generated answer. A new query reuses an answer when its embedding is
+    within `threshold` cosine similarity of a cached one *and* its retrieval
+    returned the same chunks, so the generation would have seen the same context.
+
+    Embeddings live in a preallocated (capacity x dimension) matrix, so a lookup
+    is a single matrix-vector product. When full, the least recently used entry
+    is replaced.
+    """
+
+    def __init__(self, capacity: int = SEMANTIC_CACHE_SIZE, threshold: float = SEMANTIC_CACHE_THRESHOLD):
+        self.capacity = capacity
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None
+        self._active = np.zeros(capacity, dtype=bool)
+        self._last_used = np.zeros(capacity, dtype=np.float64)
+        self._partitions: List[Optional[Hashable]] = [None] * capacity
+        self._chunk_ids: List[Optional[FrozenSet[str]]] = [None] * capacity
+        self._answers: List[Optional[Tuple[str, str]]] = [None] * capacity
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(embedding: Iterable[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _ensure_matrix(self, dimension: int) -> None:
+        if self._vectors is None or self._vectors.shape[1] != dimension:
+            # A different embedding model makes existing entries incomparable
+            self._vectors = np.zeros((self.capacity, dimension), dtype=np.float32)
+            self._active[:] = False
+
+    def get(
+        self, partition: Hashable, embedding: Iterable[float], chunk_ids: Iterable[str]
+    ) -> Optional[Tuple[str, str]]:
+        """
+        Returns the cached (answer text, sources markdown) for a similar query
+        with the same retrieved chunks, or None.
+
+        Args:
+            partition: Entries are only compared within a partition, e.g. (model, collection, template)
+            embedding: Embedding of the new query
+            chunk_ids: Ids of the chunks retrieved for the new query
+        """
+        if self.capacity <= 0:
+            return None
+
+        query = self._normalize(embedding)
+        wanted_chunks = frozenset(chunk_ids)
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != query.shape[0] or not self._active.any():
+                self.misses += 1
+                return None
+
+            similarities = self._vectors @ query
+            similarities[~self._active] = -1.0
+            candidates = np.flatnonzero(similarities >= self.threshold)
+            for row in candidates[np.argsort(-similarities[candidates])]:
+                if self._partitions[row] == partition and self._chunk_ids[row] == wanted_chunks:
+                    self._last_used[row] = time.monotonic()
+                    self.hits += 1
+                    return self._answers[row]
+
+            self.misses += 1
+            return None
+
+    def set(
+        self,
+        partition: Hashable,
+        embedding: Iterable[float],
+        chunk_ids: Iterable[str],
+        response_text: str,
+        sources_md: str,
+    ) -> None:
+        if self.capacity <= 0 or not response_text:
+            return
+
+        vector = self._normalize(embedding)
+        with self._lock:
+            self._ensure_matrix(vector.shape[0])
+            free_rows = np.flatnonzero(~self._active)
+            row = free_rows[0] if free_rows.size else int(np.argmin(self._last_used))
+
+            self._vectors[row] = vector
+            self._active[row] = True
+            self._last_used[row] = time.monotonic()
+            self._partitions[row] = partition
+            self._chunk_ids[row] = frozenset(chunk_ids)
+            self._answers[row] = (response_text, sources_md)
+
+    def invalidate_collection(self, collection_name: str) -> int:
+        """Drops the entries whose partition belongs to a collection (partition[1])."""
+        with self._lock:
+            rows = [
+                row for row in np.flatnonzero(self._active)
+                if self._partitions[row] is not None and self._partitions[row][1] == collection_name
+            ]
+            for row in rows:
+                self._release(row)
+        return len(rows)
+
+    def _release(self, row: int) -> None:
+        self._active[row] = False
+        self._last_used[row] = 0.0
+        self._partitions[row] = None
+        self._chunk_ids[row] = None
+        self._answers[row] = None
+
+    def clear(self) -> None:
+        with self._lock:
+            for row in np.flatnonzero(self._active):
+                self._release(row)
+
+    def __len__(self) -> int:
+        return int(self._active.sum())
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": int(self._active.sum()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Create a global semantic cache instance
+semantic_cache = SemanticAnswerCache()
@@ -0,0 +1,218 @@
+"""
+Single-flight coalescing of identical in-flight requests.
+
+Concurrent calls made with the same key share one execution of the underlying
+coroutine. For streamed answers, the chunks of the single upstream stream are
+fanned out to every subscriber.
+"""
+
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional
+
+
+class StreamBroadcast:
+    """
+    Fans the chunks of one async iterator out to several subscribers.
+
+    The source is consumed by a single task started with the first subscription.
+    Subscribers joining later first receive the chunks already produced. When
+    every subscriber has gone away, the source is closed, which cancels the
+    upstream generation.
+    """
+
+    def __init__(self, source: AsyncIterator[Any], on_finish: Optional[Callable[[], None]] = None):
+        self._source = source
+        self._on_finish = on_finish
+        self._chunks: List[Any] = []
+        self._error: Optional[BaseException] = None
+        self._done = False
+        self._changed = asyncio.Event()
+        self._pump_task: Optional[asyncio.Task] = None
+        self.subscribers = 0
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def _pump(self) -> None:
+        try:
+            async for chunk in self._source:
+                self._chunks.append(chunk)
+                self._notify()
+        except asyncio.CancelledError:
+            self._error = asyncio.CancelledError()
+            await self._source.aclose()
+        except Exception as e:
+            logging.error(f"Shared stream failed: {str(e)}")
+            self._error = e
+        finally:
+            self._done = True
+            self._notify()
+            if self._on_finish is not None:
+                self._on_finish()
+
+    def subscribe(self) -> "Subscription":
+        """Returns a new iterator over the whole stream."""
+        self.subscribers += 1
+        if self._pump_task is None:
+            self._pump_task = asyncio.ensure_future(self._pump())
+        return Subscription(self)
+
+    def _unsubscribe(self) -> None:
+        self.subscribers -= 1
+        if self.subscribers == 0 and not self._done:
+            # Nobody is listening anymore, stop the upstream generation
+            self._pump_task.cancel()
+
+    async def _iterate(self) -> AsyncIterator[Any]:
+        index = 0
+        while True:
+            if index < len(self._chunks):
+                chunk = self._chunks[index]
+                index += 1
+                yield chunk
+                continue
+            if self._done:
+                if self._error is not None:
+                    raise self._error
+                return
+            await self._changed.wait()
+
+
+class Subscription:
+    """
+    Iterator of one subscriber of a `StreamBroadcast`.
+
+    The subscriber is released when the stream ends, when the iterator is
+    closed, or when it is garbage collected, even if it was never iterated.
+    """
+
+    def __init__(self, broadcast: StreamBroadcast):
+        self._broadcast = broadcast
+        self._iterator = broadcast._iterate()
+        self._released = False
+
+    def __aiter__(self) -> "Subscription":
+        return self
+
+    async def __anext__(self) -> Any:
+        try:
+            return await self._iterator.__anext__()
+        except BaseException:
+            # End of the stream, upstream error or cancellation: the iterator is finished
+            self.release()
+            raise
+
+    async def aclose(self) -> None:
+        # Closing an iterator that never started does not run its finally block
+        await self._iterator.aclose()
+        self.release()
+
+    def release(self) -> None:
+        if self._released:
+            return
+        self._released = True
+        self._broadcast._unsubscribe()
+
+    def __del__(self):
+        try:
+            self.release()
+        except RuntimeError:
+            # The event loop is already closed
+            pass
+
+
+class _Call:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls sharing the same key into a single execution.
+
+    A shared execution is cancelled only when all of its callers are cancelled.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._streams: Dict[Hashable, StreamBroadcast] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Runs `func()` unless a call with the same key is in flight, in which case
+        its result is awaited instead.
+
+        Args:
+            key: Identity of the request
+            func: Coroutine function producing the result
+
+        Returns:
+            The result shared by every concurrent caller
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(func()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _task: self._forget(self._calls, key, call))
+            self.executions += 1
+        else:
+            self.coalesced += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    async def stream(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Like `do`, for coroutines returning an async iterator of chunks.
+
+        Each caller receives its own iterator over the shared stream. Results that
+        are not streams (e.g. a message for a rejected query) are returned as is.
+        """
+        broadcast = self._streams.get(key)
+        if broadcast is not None:
+            self.coalesced += 1
+            return broadcast.subscribe()
+
+        async def start():
+            result = await func()
+            if not hasattr(result, "__aiter__"):
+                return result
+            shared = StreamBroadcast(result, on_finish=lambda: self._forget(self._streams, key, shared))
+            self._streams[key] = shared
+            return shared
+
+        result = await self.do(("stream", key), start)
+        if isinstance(result, StreamBroadcast):
+            return result.subscribe()
+        return result
+
+    @staticmethod
+    def _forget(entries: Dict[Hashable, Any], key: Hashable, entry: Any) -> None:
+        if entries.get(key) is entry:
+            del entries[key]
+
+    def in_flight(self) -> int:
+        return len(self._calls) + len(self._streams)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": self.in_flight(),
+        }
+
+
+# Create a global single-flight instance
+single_flight = SingleFlight()
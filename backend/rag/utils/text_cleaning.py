@@ -0,0 +1,80 @@
+"""
+Text cleaning of standards documents: markup, table of contents leaders,
+licence and vendor blocks, and whitespace.
+
+Kept free of heavy imports so ingestion worker processes can load it quickly.
+"""
+
+import re
+import html
+
+
+_generic_cleaning_patterns = [
+    re.compile(r"Customer:\s*.*", re.IGNORECASE),
+    re.compile(r"No\.\s+of\s+User\(s\):\s*\d+", re.IGNORECASE),
+    re.compile(r"Company:\s*.*", re.IGNORECASE),
+    re.compile(r"Order\s+No\.:\s*.*", re.IGNORECASE),
+    re.compile(r"copyright\s+of\s+.*", re.IGNORECASE),
+    re.compile(r"All\s+rights\s+reserved", re.IGNORECASE),
+    re.compile(r"licence\s+agreement", re.IGNORECASE),
+]
+
+
+def _remove_vendor_block_programmatically(text_input: str, doc_path_info: str) -> str:
+    """
+    Programmatically removes vendor-specific blocks from text.
+    This is a generic alternative to vendor-specific regex patterns.
+    """
+    output_parts = []
+    current_search_start_index = 0
+    text_len = len(text_input)
+
+    while current_search_start_index < text_len:
+        # Find the start of a potential block ("Customer:" or similar)
+        match_found = False
+        for pattern in _generic_cleaning_patterns:
+            match_p1 = pattern.search(text_input, pos=current_search_start_index)
+            if match_p1:
+                block_potential_start_index = match_p1.start()
+                output_parts.append(text_input[current_search_start_index:block_potential_start_index])
+                current_search_start_index = match_p1.end()
+                match_found = True
+                break
+        
+        if not match_found:
+            output_parts.append(text_input[current_search_start_index:])
+            break
+
+    return ''.join(output_parts)
+
+
+def clean_text(text, doc_path_info=""):
+    """
+    Clean text by removing vendor-specific blocks and formatting.
+    """
+    cleaned = re.sub(r"<[^>]+>", "", text)  # Remove HTML tags
+    cleaned = re.sub(
+        r"\.{2,}", " ", cleaned
+    )  # Replace multiple dots with a single space
+    cleaned = re.sub(
+        r"\.\s+\.\s+\.\s+\.+", " ", cleaned
+    )  # Replace spaced multiple dots
+
+    # Apply generic cleaning
+    cleaned = _remove_vendor_block_programmatically(cleaned, doc_path_info)
+
+    # Remove general copyright blocks (keep generic)
+    cleaned = re.sub(
+        r"THIS PUBLICATION IS COPYRIGHT PROTECTED.*?Copyright.*?All rights reserved.*?",
+        "",
+        cleaned,
+        flags=re.DOTALL | re.IGNORECASE,
+    )
+    
+    # Remove common formatting patterns
+    cleaned = re.sub(r"Tel\.: \+[\d\s]+", "", cleaned)  # Remove phone numbers
+    cleaned = html.unescape(cleaned)  # Unescape HTML entities
+    cleaned = re.sub(r"\s+", " ", cleaned)  # Normalize whitespace to single spaces
+
+    cleaned = cleaned.strip()  # Remove leading/trailing whitespace
+    return cleaned
@@ -1,61 +1,224 @@
 import os
+import logging
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 from dotenv import load_dotenv
-from apps.rag.embedding import embedding
 
-__import__('pysqlite3')
+__import__("pysqlite3")
 import sys
-sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
+
+sys.modules["sqlite3"] = sys.modules.pop("pysqlite3")
 
 from langchain_chroma import Chroma
+from langchain_core.documents import Document
 
-# Load environment variables from the .env file in the rag directory
-# Ensure the backend environment also loads these or they are set globally.
-# The path to .env might need adjustment depending on how the backend runs.
-dotenv_path = os.path.join(os.path.dirname(__file__), '.env')
-load_dotenv(dotenv_path=dotenv_path)
+from rag.embedding import embedding
+from rag.utils.executor import run_blocking
+from rag.utils.instrumentation import stage
 
+load_dotenv()
+CHROMA_PERSIST_PATH = os.getenv("CHROMA_PERSIST_PATH")
 COLLECTION_NAME = os.getenv("COLLECTION_NAME")
-PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+# Comma separated list of collections opened at startup (defaults to COLLECTION_NAME)
+PRELOAD_COLLECTIONS = [
+    name.strip()
+    for name in os.getenv("PRELOAD_COLLECTIONS", COLLECTION_NAME or "").split(",")
+    if name.strip()
+]
+
+# Chroma collections live under backend/rag/<CHROMA_PERSIST_PATH>
+PERSIST_DIRECTORY = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), CHROMA_PERSIST_PATH or ""
+)
+
+
+class VectorStoreRegistry:
+    """
+    Process-wide registry of Chroma vector stores keyed by collection name.
+
+    Each collection is opened once (at startup through `warm` or lazily on first
+    use) and the same instance is shared by every request and endpoint, so the
+    SQLite/HNSW files are not re-opened per query.
+    """
+
+    def __init__(self, persist_directory: str = PERSIST_DIRECTORY):
+        self.persist_directory = persist_directory
+        self._stores: Dict[str, Chroma] = {}
+        self._embedding_function = None
+        self._lock = threading.Lock()
+        self._versions: Dict[str, int] = {}
+        self._invalidation_listeners: List[Callable[[str], None]] = []
+
+    def version(self, collection_name: Optional[str] = None) -> int:
+        """
+        Monotonically increasing version of a collection's content.
+        Caches derived from a collection include it in their keys.
+        """
+        return self._versions.get(collection_name or COLLECTION_NAME, 0)
+
+    def bump_version(self, collection_name: str) -> int:
+        """Marks a collection as modified (e.g. after ingestion) and returns its new version."""
+        with self._lock:
+            self._versions[collection_name] = self._versions.get(collection_name, 0) + 1
+            return self._versions[collection_name]
+
+    def add_invalidation_listener(self, listener: Callable[[str], None]) -> None:
+        """Registers a callback run with the collection name whenever a collection changes."""
+        self._invalidation_listeners.append(listener)
+
+    def invalidate(self, collection_name: str) -> None:
+        """
+        Bumps the collection version and notifies the listeners (e.g. caches
+        derived from the collection) that it changed.
+        """
+        self.bump_version(collection_name)
+        for listener in self._invalidation_listeners:
+            try:
+                listener(collection_name)
+            except Exception as e:
+                logging.error(f"Invalidation listener failed for '{collection_name}': {str(e)}")
+
+    def _open(self, collection_name: str) -> Chroma:
+        if self._embedding_function is None:
+            self._embedding_function = embedding()
+
+        logging.info(f"Opening Chroma collection: {collection_name}")
+        return Chroma(
+            persist_directory=self.persist_directory,
+            collection_name=collection_name,
+            embedding_function=self._embedding_function,
+        )
+
+    def get(self, collection_name: Optional[str] = None) -> Chroma:
+        """
+        Returns the shared vector store for a collection, opening it on first use.
+
+        Args:
+            collection_name: Collection to open (defaults to env var COLLECTION_NAME)
+
+        Returns:
+            Chroma: The shared vector store instance.
+        """
+        name = collection_name or COLLECTION_NAME
+        if not name:
+            raise ValueError("COLLECTION_NAME environment variable not set.")
+
+        store = self._stores.get(name)
+        if store is not None:
+            return store
+
+        with self._lock:
+            # Another thread may have opened it while we were waiting
+            store = self._stores.get(name)
+            if store is None:
+                store = self._open(name)
+                self._stores[name] = store
+            return store
+
+    def warm(self, collection_names: Optional[Iterable[str]] = None) -> List[str]:
+        """
+        Opens the given collections ahead of the first request.
 
-# Ensure the persist directory exists if needed for initialization (though Chroma handles it)
-# os.makedirs(PERSIST_DIRECTORY, exist_ok=True)
+        Args:
+            collection_names: Collections to open (defaults to PRELOAD_COLLECTIONS)
 
-_vector_store = None
+        Returns:
+            List[str]: Names of the collections that were opened successfully.
+        """
+        warmed = []
+        for name in collection_names or PRELOAD_COLLECTIONS:
+            try:
+                self.get(name)
+                warmed.append(name)
+            except Exception as e:
+                logging.error(f"Failed to warm collection '{name}': {str(e)}")
+        return warmed
 
-def get_vector_store():
+    def reload(self, collection_name: str) -> Chroma:
+        """
+        Drops the cached instance of a collection and opens it again.
+        Used after the collection has been modified out of process.
+        """
+        with self._lock:
+            self._stores.pop(collection_name, None)
+        self.invalidate(collection_name)
+        return self.get(collection_name)
+
+    def close(self) -> None:
+        """Releases every cached vector store and the underlying Chroma clients."""
+        with self._lock:
+            self._stores.clear()
+            self._embedding_function = None
+
+        try:
+            from chromadb.api.client import SharedSystemClient
+
+            SharedSystemClient.clear_system_cache()
+        except Exception as e:
+            logging.warning(f"Could not clear Chroma system cache: {str(e)}")
+
+    def loaded_collections(self) -> List[str]:
+        return sorted(self._stores.keys())
+
+
+# Create a global registry instance
+vector_store_registry = VectorStoreRegistry()
+
+
+def get_vector_store(collection_name: Optional[str] = None) -> Chroma:
     """
-    Initializes and returns a Chroma vector store instance.
-    Caches the instance to avoid reloading on every call.
+    Returns the shared Chroma vector store for a collection.
+
+    Args:
+        collection_name: Optional collection name (defaults to env var COLLECTION_NAME)
 
     Returns:
         Chroma: An instance of the Chroma vector store.
     """
-    global _vector_store
-    if _vector_store is None:
-        if not COLLECTION_NAME:
-            raise ValueError("COLLECTION_NAME environment variable not set.")
-        if not './'+ COLLECTION_NAME:
-             raise ValueError("Could not determine PERSIST_DIRECTORY for Chroma.")
+    return vector_store_registry.get(collection_name)
+
 
-        print(f"Initializing Chroma DB for collection: {COLLECTION_NAME}")
-        print(f"Persistence directory: ./{COLLECTION_NAME}")
+async def asimilarity_search_with_relevance_scores(
+    vector_store: Chroma, query_text: str, k: int
+) -> List[Tuple[Document, float]]:
+    """
+    Non-blocking equivalent of `similarity_search_with_relevance_scores`.
 
-        embedding_function = embedding()
+    The query is embedded with the native async embedding client and the HNSW
+    search runs in the bounded RAG executor.
 
-        _vector_store = Chroma(
-            collection_name=COLLECTION_NAME,
-            persist_directory='./'+COLLECTION_NAME,
-            embedding_function=embedding_function,
-        )
-        print("Chroma DB initialized successfully.")
-    return _vector_store
-
-# Example of how to potentially preload or check connection on startup
-# if __name__ == "__main__":
-#     try:
-#         db = get_vector_store()
-#         print(f"Successfully connected to Chroma collection: {db._collection.name}")
-#         # Optionally perform a dummy query or count
-#         # print(f"Number of items in collection: {db._collection.count()}")
-#     except Exception as e:
-#         print(f"Error initializing Chroma DB: {e}")
+    Args:
+        vector_store: The vector store to search
+        query_text: The query text
+        k: Number of results to return
+
+    Returns:
+        List of (document, relevance score) tuples, best match first.
+    """
+    _query_embedding, results = await asearch_with_embedding(vector_store, query_text, k)
+    return results
+
+
+async def asearch_with_embedding(
+    vector_store: Chroma, query_text: str, k: int
+) -> Tuple[List[float], List[Tuple[Document, float]]]:
+    """
+    Same as `asimilarity_search_with_relevance_scores` but also returns the query
+    embedding, for callers that reuse it (e.g. the semantic answer cache).
+    """
+    with stage("embed"):
+        query_embedding = await vector_store.embeddings.aembed_query(query_text)
+    with stage("vector_search"):
+        results = await run_blocking(search_by_vector, vector_store, query_embedding, k)
+    return query_embedding, results
+
+
+def search_by_vector(
+    vector_store: Chroma, query_embedding: List[float], k: int
+) -> List[Tuple[Document, float]]:
+    """Searches a collection with a precomputed embedding and returns relevance scores."""
+    docs_and_distances = vector_store.similarity_search_by_vector_with_relevance_scores(
+        query_embedding, k=k
+    )
+    relevance_score_fn = vector_store._select_relevance_score_fn()
+    return [(doc, relevance_score_fn(distance)) for doc, distance in docs_and_distances]
@@ -0,0 +1,55 @@
+from app.core.analytics import QueryAnalyticsWriter, to_query_record
+
+
+class FakeQueryRepository:
+    def __init__(self):
+        self.batches = []
+
+    def insert_many(self, collection, records):
+        self.batches.append((collection, records))
+        return len(records)
+
+
+def _record(i):
+    return {
+        "timestamp": "2026-01-01T10:00:00+00:00",
+        "endpoint": "/chat",
+        "model": "model",
+        "collection": "collection",
+        "query": f"  Question   N°{i % 3} ",
+        "outcome": "generated",
+        "status": "valid",
+        "scores": [0.9],
+        "chunk_ids": ["doc.pdf:1:0"],
+        "latencies": {"formulate": 0.1},
+        "ttft": None,
+        "total": 1.5,
+        "prompt_tokens": 10,
+        "completion_tokens": 20,
+    }
+
+
+def test_query_record_is_normalized_for_grouping():
+    record = to_query_record(_record(1))
+    assert record.normalized_query == "question n°1"
+    assert record.timestamp.year == 2026
+    assert record.model_dump(by_alias=True)["_id"] is not None
+
+
+def test_records_are_flushed_with_insert_many():
+    repository = FakeQueryRepository()
+    writer = QueryAnalyticsWriter(collection="queries", batch_size=25, flush_interval=0.2)
+
+    # Nothing is buffered before a repository is attached
+    assert not writer.log(_record(0))
+
+    writer.start(repository)
+    for i in range(60):
+        assert writer.log(_record(i))
+    writer.close()
+
+    assert sum(len(records) for _collection, records in repository.batches) == 60
+    assert len(repository.batches) < 60
+    assert all(collection == "queries" for collection, _records in repository.batches)
+    # Records are ignored once the writer is closed
+    assert not writer.log(_record(0))
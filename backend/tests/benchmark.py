@@ -0,0 +1,188 @@
+"""
+Minimal micro-benchmark harness with stored baselines.
+
+`Benchmark` times a function over several rounds, like pytest-benchmark's
+fixture, and compares the median time per call with the baseline stored in
+`benchmark_baselines.json`. A run slower than the baseline by more than the
+tolerance fails.
+
+Baselines are scaled by a calibration workload timed on the current machine,
+so a baseline recorded on a laptop stays usable on a slower CI runner.
+
+    BENCHMARK=true pytest tests/benchmark_test.py                     # compare
+    BENCHMARK=true BENCHMARK_SAVE=true pytest tests/benchmark_test.py # record
+"""
+
+import os
+import re
+import gc
+import json
+import math
+import time
+import statistics
+from pathlib import Path
+from dataclasses import dataclass, asdict
+from typing import Any, Callable, Dict, List, Optional
+
+BENCHMARK_ENABLED = os.getenv("BENCHMARK", "false").lower() == "true"
+# Overwrite the stored baselines with the results of this run
+BENCHMARK_SAVE = os.getenv("BENCHMARK_SAVE", "false").lower() == "true"
+# Allowed slowdown over the baseline before a benchmark fails, 0.25 = 25%
+BENCHMARK_TOLERANCE = float(os.getenv("BENCHMARK_TOLERANCE", "0.25"))
+BENCHMARK_BASELINES = os.getenv("BENCHMARK_BASELINES") or str(
+    Path(__file__).parent / "benchmark_baselines.json"
+)
+
+_calibration_pattern = re.compile(r"(\w+)=(\d+)")
+
+
+def _calibration_workload() -> None:
+    # Mix of the operations the benchmarked helpers spend their time in
+    text = " ".join(f"key{i}={i * 7}" for i in range(2000))
+    pairs = _calibration_pattern.findall(text)
+    json.loads(json.dumps(dict(pairs)))
+    sorted(text.split(), reverse=True)
+
+
+def calibrate(rounds: int = 7) -> float:
+    """Median time of a fixed workload, used to compare machines."""
+    return measure("calibration", _calibration_workload, rounds=rounds).median
+
+
+@dataclass
+class BenchmarkResult:
+    """Times per call of a benchmark, in seconds."""
+
+    name: str
+    rounds: int
+    iterations: int
+    min: float
+    median: float
+    mean: float
+    stddev: float
+
+
+def measure(
+    name: str,
+    func: Callable[[], Any],
+    rounds: int = 7,
+    warmup: int = 1,
+    min_round_time: float = 0.02,
+) -> BenchmarkResult:
+    """
+    Times `func` over several rounds.
+
+    Fast functions are called several times per round so that each round
+    lasts at least `min_round_time` seconds. The garbage collector is disabled
+    while timing.
+
+    Args:
+        name: Name of the benchmark
+        func: Function called without arguments
+        rounds: Number of timed rounds
+        warmup: Calls before timing
+        min_round_time: Minimum duration of a round, in seconds
+
+    Returns:
+        BenchmarkResult: Statistics of the time per call
+    """
+    for _ in range(warmup):
+        func()
+
+    started = time.perf_counter()
+    func()
+    single = time.perf_counter() - started
+    iterations = max(1, math.ceil(min_round_time / single)) if single > 0 else 1000
+
+    times: List[float] = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(rounds):
+            started = time.perf_counter()
+            for _ in range(iterations):
+                func()
+            times.append((time.perf_counter() - started) / iterations)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    return BenchmarkResult(
+        name=name,
+        rounds=rounds,
+        iterations=iterations,
+        min=min(times),
+        median=statistics.median(times),
+        mean=statistics.fmean(times),
+        stddev=statistics.stdev(times) if len(times) > 1 else 0.0,
+    )
+
+
+class BaselineStore:
+    """
+    Baselines of the benchmarks, stored as JSON with the calibration time of
+    the machine that recorded them.
+    """
+
+    def __init__(self, path: str = BENCHMARK_BASELINES, tolerance: float = BENCHMARK_TOLERANCE):
+        self.path = path
+        self.tolerance = tolerance
+        self.calibration: Optional[float] = None
+        self.baselines: Dict[str, Dict[str, Any]] = {}
+        self.results: Dict[str, BenchmarkResult] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                stored = json.load(f)
+            self.calibration = stored.get("calibration")
+            self.baselines = stored.get("benchmarks", {})
+
+    def check(self, result: BenchmarkResult, calibration: float) -> Optional[str]:
+        """
+        Records a result and compares it with its baseline.
+
+        Returns:
+            Optional[str]: A description of the regression, None if the result is within tolerance
+        """
+        self.results[result.name] = result
+        baseline = self.baselines.get(result.name)
+        if baseline is None or not self.calibration:
+            return None
+
+        allowed = baseline["median"] * (calibration / self.calibration) * (1 + self.tolerance)
+        if result.median <= allowed:
+            return None
+        return (
+            f"{result.name}: median {result.median * 1e3:.3f} ms per call, "
+            f"baseline allows {allowed * 1e3:.3f} ms ({self.tolerance:.0%} tolerance)"
+        )
+
+    def save(self, calibration: float) -> None:
+        """Replaces the stored baselines with the recorded results."""
+        benchmarks = dict(self.baselines)
+        benchmarks.update({name: asdict(result) for name, result in self.results.items()})
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({"calibration": calibration, "benchmarks": benchmarks}, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+
+class Benchmark:
+    """
+    Callable used by the benchmark tests: `benchmark(name, func, *args)` times
+    the call, fails the test on a regression and returns the function's result.
+    """
+
+    def __init__(self, store: BaselineStore, calibration: float, save: bool = BENCHMARK_SAVE):
+        self.store = store
+        self.calibration = calibration
+        self.save = save
+
+    def __call__(self, name: str, func: Callable[..., Any], *args, rounds: int = 7, **kwargs) -> Any:
+        result = measure(name, lambda: func(*args, **kwargs), rounds=rounds)
+        regression = self.store.check(result, self.calibration)
+        print(
+            f"\n{name}: median {result.median * 1e3:.3f} ms, min {result.min * 1e3:.3f} ms "
+            f"({result.rounds} rounds x {result.iterations})"
+        )
+        if regression and not self.save:
+            raise AssertionError(f"Performance regression, {regression}")
+        return func(*args, **kwargs)
@@ -0,0 +1,159 @@
+import random
+import pytest
+import fitz
+from app.core.streaming import content_line, final_line
+from rag.query_data import (
+    clean_text,
+    extract_suggestion,
+    format_sources_as_markdown,
+    _load_pdf_chunks,
+    _remove_vendor_block_programmatically,
+)
+from tests.benchmark import (
+    BENCHMARK_ENABLED,
+    BENCHMARK_SAVE,
+    Benchmark,
+    BaselineStore,
+    BenchmarkResult,
+    calibrate,
+)
+
+requires_benchmark = pytest.mark.skipif(
+    not BENCHMARK_ENABLED, reason="Set BENCHMARK=true to run the benchmarks"
+)
+
+WORDS = (
+    "le nœud logique XCBR représente le disjoncteur et expose les objets de données Pos "
+    "BlkOpn BlkCls la classe DPC décrit une commande double les messages GOOSE transportent "
+    "les événements du poste entre IED avec une priorité élevée selon la norme IEC 61850"
+).split()
+
+
+def standards_document(pages: int = 200, seed: int = 0) -> str:
+    """Text of a standard as extracted from a PDF, with licence blocks and table of contents."""
+    rng = random.Random(seed)
+    parts = []
+    for page in range(pages):
+        parts.append(f"<b>IEC 61850-7-4:2010</b> &amp; Amd.1 – page {page}\n")
+        parts.append(f"Customer: Utility {rng.randint(1, 50)} - Order No.: WS-2024-{page:05d}\n")
+        parts.append(f"No. of User(s): 1\nCompany: Grid Operator\nTel.: +41 22 919 02 11\n")
+        if page % 20 == 0:
+            parts.append(f"{page // 20}.{page % 7} Logical nodes " + "." * 40 + f" {page}\n")
+        if page % 50 == 0:
+            parts.append(
+                "THIS PUBLICATION IS COPYRIGHT PROTECTED Copyright © 2010 IEC, Geneva, Switzerland "
+                "All rights reserved.\n"
+            )
+        for _ in range(12):
+            parts.append(" ".join(rng.choice(WORDS) for _ in range(18)) + ".\n")
+    return "".join(parts)
+
+
+def source_ids(count: int = 600, files: int = 60, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    ids = [
+        f"data/standards/IEC_61850-{rng.randint(1, files)}.pdf:{rng.randint(0, 900)}:{rng.randint(0, 4)}"
+        for _ in range(count)
+    ]
+    return ids + [None, "", "data/standards/annex.pdf", "data/standards/annex.pdf:abc:0"]
+
+
+FORMULATOR_MESSAGES = [
+    'SUGGESTION_REFORMULATION : Essayez plutôt : "Quels sont les nœuds logiques de la norme IEC 61850-7-4 ?"',
+    'SUGGESTION_REFORMULATION : Vous pourriez demander "Que définit la [Norme] pour les disjoncteurs ?" '
+    "à propos de la norme IEC 61850",
+    "SUGGESTION_CORRECTION : Vouliez-vous parler de la norme 'IEC 61850' ?",
+    "SUGGESTION_REFORMULATION : Essayez plutôt: le rôle des messages GOOSE dans un poste",
+    "SUGGESTION_CORRECTION : la question porte probablement sur IEC 62351-6",
+    "SUGGESTION_REFORMULATION : question trop vague, précisez le sujet",
+] * 50
+
+
+@pytest.fixture(scope="module")
+def benchmark():
+    store = BaselineStore()
+    calibration = calibrate()
+    yield Benchmark(store, calibration)
+    if BENCHMARK_SAVE:
+        store.save(calibration)
+
+
+@pytest.fixture(scope="module")
+def standards_pdf(tmp_path_factory):
+    """A 300 page PDF generated locally."""
+    path = tmp_path_factory.mktemp("pdf") / "standard.pdf"
+    rng = random.Random(1)
+    document = fitz.open()
+    for page_number in range(300):
+        page = document.new_page()
+        text = f"IEC 61850-7-4 page {page_number}\n" + "\n".join(
+            " ".join(rng.choice(WORDS) for _ in range(12)) for _ in range(45)
+        )
+        page.insert_textbox(fitz.Rect(40, 40, 560, 800), text, fontsize=8)
+    document.save(str(path))
+    document.close()
+    return str(path)
+
+
+def test_regression_beyond_tolerance_is_reported(tmp_path):
+    store = BaselineStore(str(tmp_path / "baselines.json"), tolerance=0.25)
+    store.results["helper"] = BenchmarkResult("helper", 5, 10, 0.9e-3, 1e-3, 1e-3, 0.0)
+    store.save(calibration=0.01)
+
+    store = BaselineStore(str(tmp_path / "baselines.json"), tolerance=0.25)
+    # The current machine is twice as slow: 2 ms per call is within tolerance, 3 ms is not
+    assert store.check(BenchmarkResult("helper", 5, 10, 2e-3, 2e-3, 2e-3, 0.0), calibration=0.02) is None
+    regression = store.check(BenchmarkResult("helper", 5, 10, 3e-3, 3e-3, 3e-3, 0.0), calibration=0.02)
+    assert regression.startswith("helper: median 3.000 ms")
+    # Benchmarks without a baseline never fail
+    assert store.check(BenchmarkResult("new", 5, 10, 1.0, 1.0, 1.0, 0.0), calibration=0.02) is None
+
+
+@requires_benchmark
+def test_clean_text_large_standard(benchmark):
+    document = standards_document()
+    cleaned = benchmark("clean_text", clean_text, document, "data/standards/IEC_61850-7-4.pdf", rounds=5)
+    assert "Customer:" not in cleaned and "<b>" not in cleaned
+
+
+@requires_benchmark
+def test_remove_vendor_block_large_standard(benchmark):
+    document = standards_document()
+    cleaned = benchmark(
+        "remove_vendor_block", _remove_vendor_block_programmatically, document, "IEC_61850-7-4.pdf", rounds=5
+    )
+    assert "Order No.:" not in cleaned
+
+
+@requires_benchmark
+def test_format_sources_hundreds_of_ids(benchmark):
+    markdown = benchmark("format_sources_as_markdown", format_sources_as_markdown, source_ids())
+    assert markdown.count("* **IEC_61850-") <= 60
+
+
+@requires_benchmark
+def test_extract_suggestion_formulator_answers(benchmark):
+    def extract_all():
+        return [extract_suggestion(message) for message in FORMULATOR_MESSAGES]
+
+    suggestions = benchmark("extract_suggestion", extract_all)
+    assert suggestions[0] == "Quels sont les nœuds logiques de la norme IEC 61850-7-4 ?"
+
+
+@requires_benchmark
+def test_pdf_parsing_300_pages(benchmark, standards_pdf):
+    chunks = benchmark("load_pdf_chunks", _load_pdf_chunks, standards_pdf, rounds=3)
+    assert len(chunks) >= 300
+
+
+@requires_benchmark
+def test_ndjson_envelopes_long_answer(benchmark):
+    tokens = [f" mot{i}" for i in range(2000)]
+
+    def build_stream():
+        lines = [content_line("mistral-small:latest", token) for token in tokens]
+        lines.append(final_line("mistral-small:latest", "* **IEC_61850-7-4.pdf**, page *12*"))
+        return lines
+
+    lines = benchmark("ndjson_envelopes", build_stream)
+    assert len(lines) == 2001 and lines[-1].endswith("\n")
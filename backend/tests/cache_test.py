@@ -0,0 +1,149 @@
+import asyncio
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.fake import FakeListLLM
+from rag.utils import query_formulator
+from rag.utils.answer_cache import AnswerCache, replay_answer
+from rag.utils.cache import TTLCache
+from rag.utils.embedding_cache import CachedEmbeddings, DiskEmbeddingStore
+from rag.utils.query_formulator import FormulatorCache, QueryStatus
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert "a" in cache
+    assert "b" not in cache
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_cache_expires_entries(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("rag.utils.cache.time.monotonic", lambda: now[0])
+    cache = TTLCache(max_size=10, ttl=5)
+    cache.set("a", 1)
+
+    assert cache.get("a") == 1
+    now[0] += 6
+    assert cache.get("a") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+@pytest.fixture
+def formulator(monkeypatch):
+    calls = []
+
+    def fake_model():
+        calls.append(1)
+        return FakeListLLM(responses=["SUGGESTION_REFORMULATION : Quel processus ?"])
+
+    monkeypatch.setattr(query_formulator, "_get_model", fake_model)
+    monkeypatch.setattr(query_formulator, "QUERY_CLASSIFIER_ENABLED", False)
+    monkeypatch.setattr(query_formulator, "formulator_cache", FormulatorCache())
+    return calls
+
+
+def test_formulator_cache_hits_on_normalized_query(formulator):
+    first = query_formulator.formulate_query("Comment ça marche ?")
+    second = query_formulator.formulate_query("  comment ca   MARCHE ? ")
+
+    assert first == second
+    assert first[0] == QueryStatus.NEEDS_REFORMULATION
+    assert len(formulator) == 1
+    assert query_formulator.formulator_cache.stats()["hits"] == 1
+
+
+def test_formulator_cache_invalidated_on_model_change(formulator, monkeypatch):
+    query_formulator.formulate_query("Comment ça marche ?")
+    monkeypatch.setattr(query_formulator, "FORMULATOR_MODEL", "another-model")
+    query_formulator.formulate_query("Comment ça marche ?")
+
+    assert len(formulator) == 2
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    calls: int = 0
+
+    def embed_documents(self, texts):
+        self.calls += len(texts)
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        self.calls += 1
+        return super().embed_query(text)
+
+
+def test_cached_embeddings_memory_tier():
+    base = CountingEmbeddings(size=4)
+    embeddings = CachedEmbeddings(base, "ollama", "model", TTLCache(max_size=10))
+
+    first = embeddings.embed_query("IEC 61850")
+    again = asyncio.run(embeddings.aembed_query("IEC 61850"))
+
+    assert again == first
+    assert base.calls == 1
+
+
+def test_cached_embeddings_do_not_cache_documents(tmp_path):
+    base = CountingEmbeddings(size=4)
+    store = DiskEmbeddingStore(str(tmp_path))
+    embeddings = CachedEmbeddings(base, "ollama", "model", TTLCache(max_size=10), store)
+
+    embeddings.embed_query("IEC 61850")
+    asyncio.run(embeddings.aembed_documents([f"chunk {i}" for i in range(20)]))
+    embeddings.embed_documents(["chunk 0"])
+
+    # Ingested chunks neither evict the query vectors nor grow the disk tier
+    assert len(embeddings.memory_cache) == 1 and len(store) == 1
+    assert base.calls == 22
+
+
+def test_cached_embeddings_disk_tier_survives_restart(tmp_path):
+    base = CountingEmbeddings(size=4)
+    store = DiskEmbeddingStore(str(tmp_path))
+    embeddings = CachedEmbeddings(base, "ollama", "model", TTLCache(max_size=10), store)
+
+    async def embed_all():
+        return [await embeddings.aembed_query(f"text {i}") for i in range(1500)]
+
+    expected = asyncio.run(embed_all())
+
+    restarted = CachedEmbeddings(
+        base, "ollama", "model", TTLCache(max_size=10), DiskEmbeddingStore(str(tmp_path))
+    )
+    vectors = [restarted.embed_query("text 0"), asyncio.run(restarted.aembed_query("text 1499"))]
+
+    assert base.calls == 1500
+    assert vectors[0] == pytest.approx(expected[0])
+    assert vectors[1] == pytest.approx(expected[1499])
+    assert restarted.stats()["disk_hits"] == 2
+
+
+def test_answer_cache_replay_matches_cached_answer():
+    cache = AnswerCache()
+    key = cache.key("Expliquez la 61850", "mistral", "61557", "template")
+    cache.set(key, "Une réponse  assez longue\navec plusieurs mots " * 5, "\n\n**Sources:**")
+
+    response_text, sources_md = cache.get(cache.key(" expliquez LA 61850", "mistral", "61557", "template"))
+
+    async def collect():
+        return [chunk async for chunk in replay_answer(response_text, sources_md)]
+
+    chunks = asyncio.run(collect())
+    assert "".join(c["data"] for c in chunks if c["type"] == "content") == response_text
+    assert chunks[-1] == {"type": "sources", "data": "\n\n**Sources:**"}
+
+
+def test_answer_cache_invalidates_one_collection():
+    cache = AnswerCache()
+    cache.set(cache.key("q", "m", "a", "t"), "answer a", "")
+    cache.set(cache.key("q", "m", "b", "t"), "answer b", "")
+
+    assert cache.invalidate_collection("a") == 1
+    assert cache.get(cache.key("q", "m", "a", "t")) is None
+    assert cache.get(cache.key("q", "m", "b", "t")) == ("answer b", "")
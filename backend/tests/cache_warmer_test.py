@@ -0,0 +1,93 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from rag.utils.cache_warmer import CacheWarmer, frequent_queries
+from rag.utils.scheduler import ModelScheduler
+
+
+NOW = datetime.now(timezone.utc)
+
+
+def _record(query, hours_ago=1, outcome="generated", endpoint="/chat", model="m"):
+    return {
+        "timestamp": (NOW - timedelta(hours=hours_ago)).isoformat(),
+        "endpoint": endpoint,
+        "model": model,
+        "collection": "c",
+        "query": query,
+        "outcome": outcome,
+    }
+
+
+class FakeQueryLog:
+    def __init__(self, records):
+        self.records = records
+
+    def read(self):
+        return iter(self.records)
+
+
+def test_frequent_queries_are_ranked_by_normalized_text():
+    records = [
+        _record("Procédure de test", hours_ago=3),
+        _record("procedure  de TEST"),
+        _record("Procedure de test", outcome="answer_cache"),
+        _record("Tension nominale"),
+        _record("Tension nominale"),
+        # Too old, rejected, or not a chat request: not counted
+        _record("Tension nominale", hours_ago=100),
+        _record("Hors sujet", outcome="rejected"),
+        _record("Hors sujet", outcome="rejected"),
+        _record("Norme A vs Norme B", endpoint="/compare"),
+        _record("Norme A vs Norme B", endpoint="/warmup"),
+        _record("Une seule fois"),
+    ]
+
+    queries = frequent_queries(records, since=NOW - timedelta(hours=24), limit=10, min_count=2)
+
+    assert [(query["query"], query["count"]) for query in queries] == [
+        ("Procedure de test", 3),
+        ("Tension nominale", 2),
+    ]
+
+
+def test_warmer_waits_for_live_load_and_respects_budget():
+    scheduler = ModelScheduler(default_limit=1, limits={}, queue_size=10, queue_timeout=1, lane_shares={})
+    records = [_record(f"question {i}") for i in range(5) for _ in range(2)]
+    replayed = []
+
+    async def replay(query):
+        replayed.append(query["query"])
+
+    warmer = CacheWarmer(
+        log=FakeQueryLog(records),
+        scheduler=scheduler,
+        max_queries=3,
+        time_budget=5,
+        pause=0.01,
+        replay=replay,
+    )
+
+    async def run():
+        # A live request holds the only slot of the model for a moment
+        await scheduler.acquire("m", "chat")
+        asyncio.get_running_loop().call_later(0.05, scheduler.release, "m", "chat")
+        return await warmer.run_once()
+
+    summary = asyncio.run(run())
+
+    assert summary["warmed"] == 3
+    assert summary["stopped"] == "done"
+    assert len(replayed) == 3
+    assert warmer.stats()["paused_seconds"] > 0
+
+    # Under sustained load the run gives up once its time budget is spent
+    warmer.time_budget = 0.05
+
+    async def busy_run():
+        await scheduler.acquire("m", "chat")
+        return await warmer.run_once()
+
+    summary = asyncio.run(busy_run())
+
+    assert summary["warmed"] == 0
+    assert summary["stopped"] == "budget"
@@ -0,0 +1,10 @@
+import os
+import tempfile
+
+# Set before the rag modules are imported: their settings are read at import time.
+# Tests never write query records or ingestion state into the source tree.
+_output = tempfile.mkdtemp(prefix="rag-tests-")
+os.environ.setdefault("QUERY_LOG_ENABLED", "false")
+os.environ.setdefault("QUERY_LOG_PATH", os.path.join(_output, "queries.jsonl"))
+os.environ.setdefault("INGESTION_JOBS_PATH", os.path.join(_output, "ingestion"))
+os.environ.setdefault("INGESTION_DATA_PATH", os.path.join(_output, "data"))
@@ -0,0 +1,75 @@
+import asyncio
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from rag.utils.embedding_batcher import BatchedEmbeddings, EmbeddingBatcher
+
+
+class RecordingEmbeddings(DeterministicFakeEmbedding):
+    batches: list = []
+
+    async def aembed_documents(self, texts):
+        self.batches.append(list(texts))
+        await asyncio.sleep(0)
+        return self.embed_documents(texts)
+
+
+class FailingEmbeddings(DeterministicFakeEmbedding):
+    async def aembed_documents(self, texts):
+        raise ConnectionError("ollama unreachable")
+
+
+def test_concurrent_queries_share_one_call():
+    base = RecordingEmbeddings(size=4, batches=[])
+    embeddings = BatchedEmbeddings(base, EmbeddingBatcher(base, max_batch_size=32, max_wait_ms=20))
+
+    async def run():
+        return await asyncio.gather(*(embeddings.aembed_query(f"q{i % 5}") for i in range(10)))
+
+    vectors = asyncio.run(run())
+
+    assert len(base.batches) == 1
+    assert sorted(base.batches[0]) == [f"q{i}" for i in range(5)]
+    assert vectors[0] == base.embed_query("q0")
+    assert vectors[9] == base.embed_query("q4")
+
+
+def test_full_batch_is_dispatched_without_waiting():
+    base = RecordingEmbeddings(size=4, batches=[])
+    batcher = EmbeddingBatcher(base, max_batch_size=4, max_wait_ms=10_000)
+
+    async def run():
+        return await asyncio.wait_for(
+            asyncio.gather(*(batcher.embed(f"q{i}") for i in range(8))), timeout=1
+        )
+
+    asyncio.run(run())
+
+    assert [len(batch) for batch in base.batches] == [4, 4]
+    assert batcher.stats()["batches"] == 2
+
+
+def test_errors_reach_every_waiter():
+    base = FailingEmbeddings(size=4)
+    batcher = EmbeddingBatcher(base, max_batch_size=8, max_wait_ms=1)
+
+    async def run():
+        return await asyncio.gather(
+            batcher.embed("a"), batcher.embed("b"), return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+
+    assert all(isinstance(result, ConnectionError) for result in results)
+
+
+def test_each_ollama_server_gets_its_own_batcher(monkeypatch):
+    from rag import embedding as embedding_module
+
+    monkeypatch.setattr(embedding_module, "EMBEDDING_CACHE_ENABLED", False)
+    monkeypatch.setattr(embedding_module, "_batchers", {})
+    first = embedding_module.embedding(model="embed", base_url="http://gpu-1:11434")
+    second = embedding_module.embedding(model="embed", base_url="http://gpu-2:11434")
+
+    assert first.batcher is not second.batcher
+    assert second.batcher.embeddings.base_url == "http://gpu-2:11434"
+    assert embedding_module.embedding(model="embed", base_url="http://gpu-1:11434").batcher is first.batcher
@@ -0,0 +1,262 @@
+"""
+Local fake Ollama server for load tests.
+
+Emulates the endpoints the backend calls (`/api/generate`, `/api/chat`,
+`/api/embed`) with tunable prompt processing and token rates, so the whole
+RAG pipeline can be loaded without GPUs:
+
+    python -m tests.fake_ollama --port 11435 --tokens-per-second 40 --parallel 4
+    VITE_OLLAMA_BASE_URL=http://localhost:11435 uvicorn app.main:app --port 8000
+
+Answers of the formulator model always accept the query. Embeddings are
+deterministic unit vectors derived from the text, so identical texts get
+identical vectors.
+"""
+
+import os
+import json
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+import datetime
+from dataclasses import dataclass
+from typing import List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+WORDS = [
+    "la", "norme", "IEC", "61850", "définit", "les", "nœuds", "logiques", "du", "poste",
+    "et", "la", "communication", "entre", "équipements", "de", "protection", "GOOSE",
+    "MMS", "valeurs", "échantillonnées", "avec", "un", "modèle", "de", "données", "commun",
+]
+
+
+@dataclass
+class FakeOllamaSettings:
+    """
+    Behaviour of the fake server.
+
+    Attributes:
+        tokens_per_second (float): Generation speed of a single request.
+        prompt_tokens_per_second (float): Prompt processing speed, delays the first token.
+        response_tokens (int): Tokens generated per answer, capped by the request's num_predict.
+        parallel (int): Requests generated at once, like OLLAMA_NUM_PARALLEL; others wait.
+        load_seconds (float): Delay of the first request of each model.
+        embed_seconds (float): Latency of an embedding call.
+        embed_dim (int): Size of the embedding vectors.
+        formulator_model (str): Model whose answers validate the query.
+    """
+
+    tokens_per_second: float = 50.0
+    prompt_tokens_per_second: float = 2000.0
+    response_tokens: int = 128
+    parallel: int = 4
+    load_seconds: float = 0.0
+    embed_seconds: float = 0.01
+    embed_dim: int = 1024
+    formulator_model: Optional[str] = os.getenv("FORMULATOR_MODEL")
+
+
+def _now() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def _count_tokens(text: str) -> int:
+    # Roughly 4 characters per token, as for most tokenizers on French text
+    return max(1, len(text) // 4)
+
+
+def fake_embedding(text: str, dim: int) -> List[float]:
+    """Deterministic unit vector for a text."""
+    rng = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+    vector = [rng.gauss(0.0, 1.0) for _ in range(dim)]
+    norm = sum(value * value for value in vector) ** 0.5
+    return [value / norm for value in vector]
+
+
+def create_fake_ollama(settings: Optional[FakeOllamaSettings] = None) -> FastAPI:
+    """
+    Builds the fake Ollama application.
+
+    Args:
+        settings: Behaviour of the server (defaults to `FakeOllamaSettings()`)
+
+    Returns:
+        FastAPI: The ASGI application
+    """
+    settings = settings or FakeOllamaSettings()
+    app = FastAPI(title="Fake Ollama")
+    app.state.settings = settings
+    app.state.stats = {"generate": 0, "chat": 0, "embed": 0, "prompt_tokens": 0, "eval_tokens": 0}
+    loaded = set()
+    slots: List[asyncio.Semaphore] = []
+
+    def slot() -> asyncio.Semaphore:
+        # Created lazily, inside the event loop serving the requests
+        if not slots:
+            slots.append(asyncio.Semaphore(max(1, settings.parallel)))
+        return slots[0]
+
+    def answer_tokens(model: str, prompt: str, options: dict) -> List[str]:
+        if settings.formulator_model and model == settings.formulator_model:
+            return ["VALIDE", " :", " la", " question", " est", " claire"]
+        limit = options.get("num_predict") or settings.response_tokens
+        if limit < 0:
+            limit = settings.response_tokens
+        count = min(settings.response_tokens, limit)
+        return [("" if index == 0 else " ") + WORDS[index % len(WORDS)] for index in range(count)]
+
+    async def generate(model: str, prompt: str, options: dict, make_chunk, stream: bool):
+        tokens = answer_tokens(model, prompt, options)
+        prompt_tokens = _count_tokens(prompt)
+        app.state.stats["prompt_tokens"] += prompt_tokens
+        app.state.stats["eval_tokens"] += len(tokens)
+
+        async def chunks():
+            started = time.monotonic()
+            async with slot():
+                load_duration = 0.0
+                if model not in loaded:
+                    await asyncio.sleep(settings.load_seconds)
+                    loaded.add(model)
+                    load_duration = settings.load_seconds
+                prompt_duration = prompt_tokens / settings.prompt_tokens_per_second
+                await asyncio.sleep(prompt_duration)
+                eval_started = time.monotonic()
+                for token in tokens:
+                    await asyncio.sleep(1 / settings.tokens_per_second)
+                    yield make_chunk(token, False)
+                eval_duration = time.monotonic() - eval_started
+            final = make_chunk("", True)
+            final.update(
+                done_reason="stop",
+                total_duration=int((time.monotonic() - started) * 1e9),
+                load_duration=int(load_duration * 1e9),
+                prompt_eval_count=prompt_tokens,
+                prompt_eval_duration=int(prompt_duration * 1e9),
+                eval_count=len(tokens),
+                eval_duration=int(eval_duration * 1e9),
+            )
+            yield final
+
+        if stream:
+            async def ndjson():
+                async for chunk in chunks():
+                    yield json.dumps(chunk) + "\n"
+
+            return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+        # Non-streamed calls get the concatenated answer with the final statistics
+        parts = [chunk async for chunk in chunks()]
+        final = parts[-1]
+        text = "".join(token for token in tokens)
+        if "message" in final:
+            final["message"]["content"] = text
+        else:
+            final["response"] = text
+        return JSONResponse(final)
+
+    @app.post("/api/generate")
+    async def api_generate(request: Request):
+        body = await request.json()
+        app.state.stats["generate"] += 1
+        model = body.get("model", "")
+
+        def make_chunk(token: str, done: bool) -> dict:
+            return {"model": model, "created_at": _now(), "response": token, "done": done}
+
+        return await generate(
+            model, body.get("prompt", ""), body.get("options") or {}, make_chunk, body.get("stream", True)
+        )
+
+    @app.post("/api/chat")
+    async def api_chat(request: Request):
+        body = await request.json()
+        app.state.stats["chat"] += 1
+        model = body.get("model", "")
+        prompt = "\n".join(str(message.get("content", "")) for message in body.get("messages", []))
+
+        def make_chunk(token: str, done: bool) -> dict:
+            return {
+                "model": model,
+                "created_at": _now(),
+                "message": {"role": "assistant", "content": token},
+                "done": done,
+            }
+
+        return await generate(
+            model, prompt, body.get("options") or {}, make_chunk, body.get("stream", True)
+        )
+
+    @app.post("/api/embed")
+    async def api_embed(request: Request):
+        body = await request.json()
+        app.state.stats["embed"] += 1
+        texts = body.get("input", [])
+        if isinstance(texts, str):
+            texts = [texts]
+        started = time.monotonic()
+        await asyncio.sleep(settings.embed_seconds)
+        return {
+            "model": body.get("model", ""),
+            "embeddings": [fake_embedding(text, settings.embed_dim) for text in texts],
+            "total_duration": int((time.monotonic() - started) * 1e9),
+            "load_duration": 0,
+            "prompt_eval_count": sum(_count_tokens(text) for text in texts),
+        }
+
+    @app.get("/api/tags")
+    async def api_tags():
+        return {"models": [{"name": model, "model": model} for model in sorted(loaded)]}
+
+    @app.get("/api/version")
+    async def api_version():
+        return {"version": "0.0.0-fake"}
+
+    @app.get("/stats")
+    async def server_stats():
+        return app.state.stats
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake Ollama server for load tests")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=11435, help="Port to listen on")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="Generation speed per request")
+    parser.add_argument(
+        "--prompt-tokens-per-second", type=float, default=2000.0, help="Prompt processing speed"
+    )
+    parser.add_argument("--response-tokens", type=int, default=128, help="Tokens per answer")
+    parser.add_argument("--parallel", type=int, default=4, help="Requests generated at once")
+    parser.add_argument("--load-seconds", type=float, default=0.0, help="Cold load delay per model")
+    parser.add_argument("--embed-seconds", type=float, default=0.01, help="Latency of an embedding call")
+    parser.add_argument("--embed-dim", type=int, default=1024, help="Size of the embedding vectors")
+    parser.add_argument(
+        "--formulator-model",
+        default=os.getenv("FORMULATOR_MODEL"),
+        help="Model whose answers validate the query",
+    )
+    args = parser.parse_args()
+
+    settings = FakeOllamaSettings(
+        tokens_per_second=args.tokens_per_second,
+        prompt_tokens_per_second=args.prompt_tokens_per_second,
+        response_tokens=args.response_tokens,
+        parallel=args.parallel,
+        load_seconds=args.load_seconds,
+        embed_seconds=args.embed_seconds,
+        embed_dim=args.embed_dim,
+        formulator_model=args.formulator_model,
+    )
+    uvicorn.run(create_fake_ollama(settings), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
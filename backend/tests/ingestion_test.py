@@ -0,0 +1,225 @@
+import asyncio
+import fitz
+import pytest
+from datetime import datetime, timezone
+from fastapi.testclient import TestClient
+from app.main import app
+from app.core.dependencies import get_user_dep
+from app.schema.user import User
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from rag import vector_store as vs
+from rag.ingestion import IngestionManager, IngestionConflictError, COMPLETED, FAILED
+from rag.utils.executor import run_blocking
+from rag.utils.pdf_pages import extract_page_chunks
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    monkeypatch.setattr(vs, "embedding", lambda: DeterministicFakeEmbedding(size=8))
+    registry = vs.VectorStoreRegistry(persist_directory=str(tmp_path / "chroma"))
+    yield registry
+    registry.close()
+
+
+def _write_pdf(path, texts):
+    document = fitz.open()
+    for text in texts:
+        page = document.new_page()
+        if text:
+            page.insert_textbox(fitz.Rect(40, 40, 560, 800), text, fontsize=9)
+    document.save(str(path))
+    document.close()
+    return str(path)
+
+
+def _page_text(page_number):
+    return f"Page {page_number}. Customer: ACME\n" + "Le nœud logique XCBR. " * 60
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    # Blank pages produce no chunks
+    return _write_pdf(tmp_path / "standard.pdf", [_page_text(page) for page in range(7)] + [""])
+
+
+def _manager(tmp_path, registry, extracted, **kwargs):
+    async def extract(*args):
+        extracted.append(args[2])
+        return await run_blocking(extract_page_chunks, *args)
+
+    return IngestionManager(
+        jobs_path=str(tmp_path / "jobs"),
+        data_path=str(tmp_path / "data"),
+        registry=registry,
+        page_batch=2,
+        embed_batch=5,
+        chunk_size=300,
+        chunk_overlap=50,
+        extract=extract,
+        **kwargs,
+    )
+
+
+def test_document_is_chunked_embedded_and_upserted(tmp_path, registry, pdf_path):
+    extracted = []
+    manager = _manager(tmp_path, registry, extracted)
+
+    async def run():
+        job = manager.submit(pdf_path, "data/61557/standard.pdf", "61557")
+        return await manager.wait(job.job_id)
+
+    job = asyncio.run(run())
+
+    assert job.status == COMPLETED and job.progress == 1.0
+    assert job.total_pages == 8
+    assert extracted == [0, 2, 4, 6]
+    stored = registry.get("61557").get()
+    assert len(stored["ids"]) == job.chunks > 7
+    assert "data/61557/standard.pdf:0:0" in stored["ids"]
+    assert all(metadata["id"] == chunk_id for chunk_id, metadata in zip(stored["ids"], stored["metadatas"]))
+    assert not any("Customer:" in text for text in stored["documents"])
+    # Caches derived from the collection are invalidated
+    assert registry.version("61557") == 1
+
+
+def test_failed_job_resumes_from_the_first_unwritten_page(tmp_path, registry, pdf_path):
+    extracted = []
+    manager = _manager(tmp_path, registry, extracted)
+    store = registry.get("61557")
+    upsert = store._collection.upsert
+    failures = []
+
+    def failing_upsert(**kwargs):
+        # The first write of page 5 fails
+        if not failures and any(":5:" in chunk_id for chunk_id in kwargs["ids"]):
+            failures.append(kwargs["ids"])
+            raise RuntimeError("disk full")
+        return upsert(**kwargs)
+
+    store._collection.upsert = failing_upsert
+
+    async def run():
+        job = manager.submit(pdf_path, "data/61557/standard.pdf", "61557")
+        failed = await manager.wait(job.job_id)
+        status, next_page = failed.status, failed.next_page
+        del extracted[:]
+        manager.resume(job.job_id)
+        return status, next_page, await manager.wait(job.job_id)
+
+    status, next_page, job = asyncio.run(run())
+
+    assert status == FAILED
+    assert next_page == 4
+    assert job.status == COMPLETED
+    # Only the pages after the last complete write are extracted again
+    assert extracted == [4, 6]
+    # A new manager reading the saved jobs sees the finished job
+    reloaded = _manager(tmp_path, registry, [])
+    assert reloaded.load() == []
+    assert reloaded.get(job.job_id).chunks == job.chunks
+    assert len(store.get()["ids"]) == len(set(store.get()["ids"]))
+
+    # A new version changing page 5 fails the same way: the unchanged chunks
+    # extracted again on resume are not counted twice
+    source = "data/61557/standard.pdf"
+    texts = [_page_text(page) for page in range(7)] + [""]
+    texts[5] = texts[5].replace("XCBR", "XSWI")
+    revised = _write_pdf(tmp_path / "revised.pdf", texts)
+    pages = [extract_page_chunks(revised, source, page, page + 1, 300, 50) for page in range(8)]
+    del failures[:]
+
+    async def reingest():
+        job = manager.submit(revised, source, "61557")
+        failed = await manager.wait(job.job_id)
+        skipped = failed.skipped
+        manager.resume(job.job_id)
+        return skipped, await manager.wait(job.job_id)
+
+    skipped, job = asyncio.run(reingest())
+
+    assert skipped == sum(len(chunks) for chunks in pages[:4])
+    assert job.status == COMPLETED
+    assert job.chunks == len(pages[5])
+    assert job.skipped == sum(len(chunks) for page, chunks in enumerate(pages) if page != 5)
+
+
+def test_reingestion_writes_only_the_changed_chunks(tmp_path, registry, pdf_path):
+    manager = _manager(tmp_path, registry, [])
+    source = "data/61557/standard.pdf"
+
+    async def ingest(path):
+        job = manager.submit(path, source, "61557")
+        return await manager.wait(job.job_id)
+
+    asyncio.run(ingest(pdf_path))
+    store = registry.get("61557")
+    before = set(store.get()["ids"])
+
+    # Page 2 is rewritten and shorter, pages 5 to 7 are removed
+    texts = [_page_text(page) for page in range(5)]
+    texts[2] = "Page 2. Révision du nœud XCBR. " * 20
+    revised = _write_pdf(tmp_path / "revised.pdf", texts)
+    expected = {chunk_id for chunk_id, _text, _metadata in extract_page_chunks(revised, source, 0, 5, 300, 50)}
+
+    upsert = store._collection.upsert
+    written = []
+
+    def recording_upsert(**kwargs):
+        written.extend(kwargs["ids"])
+        return upsert(**kwargs)
+
+    store._collection.upsert = recording_upsert
+    job = asyncio.run(ingest(revised))
+
+    assert job.status == COMPLETED
+    assert written and all(":2:" in chunk_id for chunk_id in written)
+    assert job.chunks == len(written)
+    assert job.skipped == len(expected) - len(written)
+    assert job.deleted == len(before - expected)
+    assert set(store.get()["ids"]) == expected
+
+    # Nothing changed since the last ingestion
+    del written[:]
+    job = asyncio.run(ingest(revised))
+    assert written == [] and job.skipped == len(expected) and job.deleted == 0
+
+
+def test_upload_never_replaces_the_file_of_a_running_job(tmp_path, registry, pdf_path):
+    manager = _manager(tmp_path, registry, [])
+    with open(pdf_path, "rb") as f:
+        content = f.read()
+
+    async def run():
+        first, second = await asyncio.gather(
+            manager.upload(content, "standard.pdf", "61557"),
+            manager.upload(b"%PDF another version", "standard.pdf", "61557"),
+            return_exceptions=True,
+        )
+        job = await manager.wait(first.job_id)
+        # Once the job is over, a new version is accepted
+        again = await manager.upload(content, "standard.pdf", "61557")
+        return second, job, await manager.wait(again.job_id)
+
+    second, job, again = asyncio.run(run())
+
+    assert isinstance(second, IngestionConflictError)
+    assert job.status == again.status == COMPLETED
+    assert job.source == "data/61557/standard.pdf"
+    with open(job.path, "rb") as f:
+        assert f.read() == content
+
+
+@pytest.mark.parametrize("method, path", [
+    ("post", "/api/v1/rag/upload"),
+    ("get", "/api/v1/rag/upload/job"),
+    ("post", "/api/v1/rag/upload/job/resume"),
+])
+def test_only_admins_may_ingest_documents(monkeypatch, method, path):
+    def user(role):
+        return User(user_id="1", username=role, role=role, active=True, created_at=datetime.now(timezone.utc))
+
+    client = TestClient(app)
+    monkeypatch.setitem(app.dependency_overrides, get_user_dep, lambda: user("agent"))
+    assert client.request(method, path).status_code == 403
+    monkeypatch.setitem(app.dependency_overrides, get_user_dep, lambda: user("admin"))
+    assert client.request(method, path).status_code != 403
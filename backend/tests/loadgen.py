@@ -0,0 +1,364 @@
+"""
+Async load generator for the RAG API.
+
+Drives `/api/v1/rag/chat`, `/chat/stream` and `/compare` either closed-loop
+(a fixed number of concurrent clients sending back to back) or open-loop
+(Poisson arrivals at a fixed rate, whatever the response times), and writes
+a JSON report with throughput, latency and TTFT percentiles and error rates.
+
+Open-loop latencies are measured from the scheduled arrival time, so a
+saturated server cannot hide its queueing delay by slowing the generator.
+
+Example, against a backend pointed at `python -m tests.fake_ollama`:
+
+    python -m tests.loadgen --username admin --password admin --collection 61557 \\
+        --mix chat=1,chat_stream=2,compare=0.2 --rate 5 --duration 60 --output load_report.json
+"""
+
+import json
+import time
+import random
+import asyncio
+import argparse
+import datetime
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import httpx
+
+from tests.rag_query_tool import DEFAULT_QUERIES
+
+
+API_PREFIX = "/api/v1/rag"
+# Path of each scenario and whether its answer is streamed as NDJSON
+SCENARIOS = {
+    "chat": ("/chat", False),
+    "chat_stream": ("/chat/stream", True),
+    "compare": ("/compare", False),
+    "compare_stream": ("/compare/stream", True),
+}
+
+DEFAULT_COMPARE_DOCUMENTS = (
+    (
+        "IEC_61850-7-4.txt",
+        "Les nœuds logiques XCBR et XSWI représentent les disjoncteurs et sectionneurs. "
+        "Chaque nœud expose des objets de données Pos, BlkOpn et BlkCls.",
+    ),
+    (
+        "IEC_61850-7-3.txt",
+        "Les classes de données communes DPC et SPS décrivent les commandes doubles "
+        "et les états simples utilisés par les nœuds logiques.",
+    ),
+)
+
+
+@dataclass
+class RequestResult:
+    """Outcome of a single request, times in seconds."""
+
+    scenario: str
+    status: int
+    latency: float
+    ttft: Optional[float] = None
+    chunks: int = 0
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """Parses "scenario=weight,..." into a dict of positive weights."""
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.strip().partition("=")
+        if not name:
+            continue
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario: {name}. Must be one of: {list(SCENARIOS)}")
+        mix[name] = float(weight) if weight else 1.0
+    mix = {name: weight for name, weight in mix.items() if weight > 0}
+    if not mix:
+        raise ValueError("The scenario mix is empty")
+    return mix
+
+
+def percentile(values: Sequence[float], p: float) -> Optional[float]:
+    """Linear interpolation percentile, `p` between 0 and 100."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * p / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def _distribution(values: Sequence[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"mean": None, "p50": None, "p95": None, "p99": None, "max": None}
+    return {
+        "mean": round(sum(values) / len(values), 4),
+        "p50": round(percentile(values, 50), 4),
+        "p95": round(percentile(values, 95), 4),
+        "p99": round(percentile(values, 99), 4),
+        "max": round(max(values), 4),
+    }
+
+
+def summarize(results: Sequence[RequestResult], elapsed: float) -> Dict:
+    """
+    Aggregates request results.
+
+    Latency percentiles cover the successful requests only; error rates
+    count both HTTP errors and errors reported inside a stream.
+
+    Args:
+        results: Results of the run
+        elapsed: Wall-clock duration of the run, in seconds
+
+    Returns:
+        dict: Request counts, throughput, latency and TTFT distributions, error breakdown
+    """
+    succeeded = [result for result in results if result.ok]
+    errors = Counter(result.error for result in results if not result.ok)
+    return {
+        "requests": len(results),
+        "succeeded": len(succeeded),
+        "failed": len(results) - len(succeeded),
+        "error_rate": round((len(results) - len(succeeded)) / len(results), 4) if results else 0.0,
+        "throughput": round(len(succeeded) / elapsed, 4) if elapsed > 0 else 0.0,
+        "latency": _distribution([result.latency for result in succeeded]),
+        "ttft": _distribution([result.ttft for result in succeeded if result.ttft is not None]),
+        "status_codes": dict(Counter(str(result.status) for result in results)),
+        "errors": dict(errors),
+    }
+
+
+class LoadGenerator:
+    """
+    Sends RAG requests and records their results.
+
+    Attributes:
+        client (httpx.AsyncClient): Client bound to the API base URL.
+        mix (Dict[str, float]): Relative weight of each scenario.
+        queries (List[str]): Questions picked at random for the chat scenarios.
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        collection: str,
+        mix: Dict[str, float],
+        queries: Sequence[str] = DEFAULT_QUERIES,
+        model: Optional[str] = None,
+        compare_mode: str = "technical",
+        compare_documents: Sequence[Tuple[str, str]] = DEFAULT_COMPARE_DOCUMENTS,
+        seed: Optional[int] = None,
+    ):
+        self.client = client
+        self.collection = collection
+        self.mix = mix
+        self.queries = list(queries)
+        self.model = model
+        self.compare_mode = compare_mode
+        self.compare_documents = compare_documents
+        self.random = random.Random(seed)
+        self.results: List[RequestResult] = []
+
+    def _payload(self, scenario: str) -> dict:
+        if scenario.startswith("compare"):
+            (name1, content1), (name2, content2) = self.compare_documents
+            payload = {
+                "file1_name": name1,
+                "file1_content": content1,
+                "file2_name": name2,
+                "file2_content": content2,
+                "mode": self.compare_mode,
+            }
+        else:
+            payload = {"query": self.random.choice(self.queries)}
+        payload["collection_name"] = self.collection
+        if self.model:
+            payload["model"] = self.model
+        return payload
+
+    def pick(self) -> str:
+        names = list(self.mix)
+        return self.random.choices(names, weights=[self.mix[name] for name in names])[0]
+
+    async def send(self, scenario: str, scheduled: Optional[float] = None) -> RequestResult:
+        """
+        Sends one request of the scenario.
+
+        Args:
+            scenario: Name of the scenario (chat, chat_stream, compare, compare_stream)
+            scheduled: Monotonic time the request was due, latencies are measured from it
+        """
+        path, streamed = SCENARIOS[scenario]
+        started = scheduled if scheduled is not None else time.monotonic()
+        result = RequestResult(scenario=scenario, status=0, latency=0.0)
+        try:
+            if streamed:
+                await self._send_stream(API_PREFIX + path, self._payload(scenario), started, result)
+            else:
+                response = await self.client.post(API_PREFIX + path, json=self._payload(scenario))
+                result.status = response.status_code
+                if response.status_code >= 400:
+                    result.error = f"http_{response.status_code}"
+        except httpx.TimeoutException:
+            result.error = "timeout"
+        except httpx.TransportError:
+            result.error = "connection"
+        result.latency = time.monotonic() - started
+        self.results.append(result)
+        return result
+
+    async def _send_stream(self, path: str, payload: dict, started: float, result: RequestResult) -> None:
+        async with self.client.stream("POST", path, json=payload) as response:
+            result.status = response.status_code
+            if response.status_code >= 400:
+                await response.aread()
+                result.error = f"http_{response.status_code}"
+                return
+            async for line in response.aiter_lines():
+                if not line.strip():
+                    continue
+                try:
+                    message = json.loads(line)
+                except json.JSONDecodeError:
+                    result.error = "invalid_ndjson"
+                    return
+                if message.get("error"):
+                    result.error = "stream_error"
+                    return
+                if message.get("message", {}).get("content"):
+                    result.chunks += 1
+                    if result.ttft is None:
+                        result.ttft = time.monotonic() - started
+
+    async def closed_loop(self, concurrency: int, duration: float, max_requests: Optional[int] = None) -> None:
+        """Runs `concurrency` clients sending back to back for `duration` seconds."""
+        deadline = time.monotonic() + duration
+        sent = 0
+
+        async def client():
+            nonlocal sent
+            while time.monotonic() < deadline and (max_requests is None or sent < max_requests):
+                sent += 1
+                await self.send(self.pick())
+
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+
+    async def open_loop(self, rate: float, duration: float, max_requests: Optional[int] = None) -> None:
+        """Starts requests at Poisson arrivals of `rate` per second for `duration` seconds."""
+        started = time.monotonic()
+        due = started
+        tasks = []
+        while max_requests is None or len(tasks) < max_requests:
+            due += self.random.expovariate(rate)
+            if due - started >= duration:
+                break
+            delay = due - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(self.send(self.pick(), scheduled=due)))
+        await asyncio.gather(*tasks)
+
+    def report(self, elapsed: float, config: Optional[dict] = None) -> Dict:
+        """Overall and per-scenario summaries of the recorded results."""
+        return {
+            "generated_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "config": config or {},
+            "elapsed": round(elapsed, 3),
+            "overall": summarize(self.results, elapsed),
+            "scenarios": {
+                scenario: summarize([result for result in self.results if result.scenario == scenario], elapsed)
+                for scenario in self.mix
+            },
+        }
+
+
+async def sign_in(client: httpx.AsyncClient, username: str, password: str) -> str:
+    """Returns a bearer token from the sign-in endpoint."""
+    response = await client.post(
+        "/api/v1/authentication/sign-in", data={"username": username, "password": password}
+    )
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+async def run(args: argparse.Namespace) -> Dict:
+    timeout = httpx.Timeout(args.timeout, connect=10.0)
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=args.max_connections)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=timeout, limits=limits) as client:
+        token = args.token or await sign_in(client, args.username, args.password)
+        client.headers["Authorization"] = f"Bearer {token}"
+
+        queries = DEFAULT_QUERIES
+        if args.queries_file:
+            with open(args.queries_file, encoding="utf-8") as f:
+                queries = [line.strip() for line in f if line.strip()]
+
+        generator = LoadGenerator(
+            client,
+            args.collection,
+            parse_mix(args.mix),
+            queries=queries,
+            model=args.model,
+            compare_mode=args.compare_mode,
+            seed=args.seed,
+        )
+        started = time.monotonic()
+        if args.rate:
+            await generator.open_loop(args.rate, args.duration, args.requests)
+        else:
+            await generator.closed_loop(args.concurrency, args.duration, args.requests)
+        elapsed = time.monotonic() - started
+
+    config = {
+        name: value for name, value in vars(args).items() if name not in ("token", "password")
+    }
+    config["mode"] = "open" if args.rate else "closed"
+    return generator.report(elapsed, config)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the RAG API")
+    parser.add_argument("--base-url", default="http://localhost:8000", help="Base URL of the backend")
+    parser.add_argument("--token", help="Bearer token (otherwise --username and --password sign in)")
+    parser.add_argument("--username", default="admin", help="User to sign in with")
+    parser.add_argument("--password", default="admin", help="Password of the user")
+    parser.add_argument("--collection", required=True, help="Vector store collection to query")
+    parser.add_argument("--model", help="Chat model (defaults to the backend's CHAT_MODEL)")
+    parser.add_argument(
+        "--mix", default="chat=1,chat_stream=1", help=f"Weighted scenarios among {list(SCENARIOS)}"
+    )
+    parser.add_argument("--queries-file", help="File with one question per line")
+    parser.add_argument("--compare-mode", default="technical", help="Mode of the comparison requests")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent clients (closed loop)")
+    parser.add_argument("--rate", type=float, help="Arrivals per second (open loop, overrides --concurrency)")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds to send requests for")
+    parser.add_argument("--requests", type=int, help="Stop after this many requests")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Timeout of a request, in seconds")
+    parser.add_argument("--max-connections", type=int, default=100, help="Keep-alive connections")
+    parser.add_argument("--seed", type=int, help="Seed of the query and arrival randomness")
+    parser.add_argument("--output", default="load_report.json", help="Output JSON report path")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    overall = report["overall"]
+    print(
+        f"{overall['requests']} requests, {overall['throughput']} req/s, "
+        f"error rate {overall['error_rate']}, p95 latency {overall['latency']['p95']}s"
+    )
+    print(f"Report saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import json
+import asyncio
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from tests.fake_ollama import FakeOllamaSettings, create_fake_ollama
+from tests.loadgen import LoadGenerator, RequestResult, parse_mix, percentile, summarize
+
+
+def test_percentiles_and_error_rates():
+    assert percentile([1, 2, 3, 4, 5], 50) == 3
+    assert percentile([1, 2, 3, 4, 5], 95) == 4.8
+    assert percentile([], 95) is None
+    assert parse_mix("chat=1,compare=0,chat_stream") == {"chat": 1.0, "chat_stream": 1.0}
+
+    results = [RequestResult("chat", 200, latency=float(i)) for i in range(1, 11)]
+    results.append(RequestResult("chat", 429, latency=0.1, error="http_429"))
+    summary = summarize(results, elapsed=5.0)
+
+    assert summary["requests"] == 11
+    assert summary["throughput"] == 2.0
+    assert summary["error_rate"] == round(1 / 11, 4)
+    assert summary["latency"]["p50"] == 5.5
+    assert summary["errors"] == {"http_429": 1}
+
+
+def test_fake_ollama_streams_tokens_at_the_configured_rate():
+    settings = FakeOllamaSettings(tokens_per_second=200, response_tokens=10, embed_dim=8, formulator_model="f")
+    transport = httpx.ASGITransport(app=create_fake_ollama(settings))
+
+    async def run():
+        async with httpx.AsyncClient(transport=transport, base_url="http://ollama") as client:
+            response = await client.post("/api/generate", json={"model": "m", "prompt": "x" * 400})
+            lines = [json.loads(line) for line in response.text.splitlines()]
+            verdict = await client.post("/api/chat", json={"model": "f", "messages": [], "stream": False})
+            embed = await client.post("/api/embed", json={"model": "e", "input": ["a", "b", "a"]})
+            return lines, verdict.json(), embed.json()
+
+    lines, verdict, embed = asyncio.run(run())
+
+    assert len(lines) == 11
+    assert lines[-1]["done"] and lines[-1]["eval_count"] == 10
+    assert lines[-1]["prompt_eval_count"] == 100
+    # 10 tokens at 200 tokens/s
+    assert lines[-1]["eval_duration"] >= 0.05e9
+    assert verdict["message"]["content"].startswith("VALIDE :")
+    vectors = embed["embeddings"]
+    assert len(vectors) == 3 and len(vectors[0]) == 8
+    assert vectors[0] == vectors[2] != vectors[1]
+
+
+def _fake_rag_api() -> FastAPI:
+    app = FastAPI()
+    calls = {"chat": 0}
+
+    @app.post("/api/v1/rag/chat")
+    async def chat(payload: dict):
+        calls["chat"] += 1
+        if calls["chat"] % 4 == 0:
+            return StreamingResponse(iter(()), status_code=429)
+        return {"response": payload["query"], "sources": []}
+
+    @app.post("/api/v1/rag/chat/stream")
+    async def chat_stream(payload: dict):
+        async def lines():
+            await asyncio.sleep(0.01)
+            yield json.dumps({"message": {"content": "a"}, "done": False}) + "\n"
+            yield json.dumps({"message": {"content": ""}, "sources": "", "done": True}) + "\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    return app
+
+
+def test_open_loop_run_reports_per_scenario():
+    transport = httpx.ASGITransport(app=_fake_rag_api())
+
+    async def run():
+        async with httpx.AsyncClient(transport=transport, base_url="http://api") as client:
+            generator = LoadGenerator(
+                client, "collection", {"chat": 1, "chat_stream": 1}, queries=["q"], seed=1
+            )
+            await generator.open_loop(rate=200, duration=10, max_requests=40)
+            return generator.report(elapsed=1.0)
+
+    report = asyncio.run(run())
+
+    assert report["overall"]["requests"] == 40
+    stream = report["scenarios"]["chat_stream"]
+    assert stream["failed"] == 0
+    assert stream["ttft"]["p50"] is not None
+    chat = report["scenarios"]["chat"]
+    assert chat["errors"] == {"http_429": chat["failed"]}
+    assert chat["failed"] > 0
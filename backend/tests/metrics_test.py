@@ -0,0 +1,89 @@
+import asyncio
+from rag import embedding
+from rag.utils.cache import TTLCache
+from rag.utils.query_classifier import query_classifier
+from rag.utils.metrics import MetricsRegistry, metrics_registry
+from rag.utils.instrumentation import (
+    RequestTrace,
+    request_duration,
+    requests_total,
+    stage,
+    stage_duration,
+    time_to_first_token,
+)
+
+
+def test_registry_renders_prometheus_text_format():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Requests", ("endpoint",))
+    latency = registry.histogram("latency_seconds", "Latency", ("endpoint",), buckets=(0.1, 1.0))
+    registry.register_collector(lambda: [("queue_depth", "gauge", "Queue depth", [({}, 3)])])
+
+    requests.inc(endpoint='/chat "stream"')
+    latency.observe(0.05, endpoint="/chat")
+    latency.observe(0.5, endpoint="/chat")
+    latency.observe(5, endpoint="/chat")
+
+    lines = registry.render().splitlines()
+    assert "# TYPE requests_total counter" in lines
+    assert 'requests_total{endpoint="/chat \\"stream\\""} 1.0' in lines
+    assert 'latency_seconds_bucket{endpoint="/chat",le="0.1"} 1.0' in lines
+    assert 'latency_seconds_bucket{endpoint="/chat",le="1.0"} 2.0' in lines
+    assert 'latency_seconds_bucket{endpoint="/chat",le="+Inf"} 3.0' in lines
+    assert 'latency_seconds_count{endpoint="/chat"} 3.0' in lines
+    assert "queue_depth 3.0" in lines
+
+
+def test_stages_are_recorded_on_the_current_trace():
+    trace = RequestTrace("/test/stages", "model", "collection")
+
+    async def request():
+        with stage("formulate"):
+            await asyncio.sleep(0)
+        return "answer"
+
+    assert asyncio.run(trace.run(request)) == "answer"
+    # Outside of a request, stages are not recorded
+    with stage("formulate"):
+        pass
+
+    labels = {"endpoint": "/test/stages", "model": "model", "collection": "collection"}
+    assert stage_duration.count(stage="formulate", **labels) == 1
+    assert request_duration.count(**labels) == 1
+    assert requests_total.value(outcome="generated", **labels) == 1
+
+
+def test_stream_trace_finishes_when_the_stream_is_closed():
+    trace = RequestTrace("/test/stream", "model", "collection")
+
+    async def chunks():
+        for i in range(10):
+            yield {"type": "content", "data": str(i)}
+
+    async def start():
+        return chunks()
+
+    async def run():
+        stream = await trace.run(start)
+        assert request_duration.count(**trace.labels) == 0
+        async for _chunk in stream:
+            break
+        await stream.aclose()
+
+    asyncio.run(run())
+    assert time_to_first_token.count(**trace.labels) == 1
+    assert requests_total.value(outcome="cancelled", **trace.labels) == 1
+
+
+def test_component_statistics_are_exported(monkeypatch):
+    cache = TTLCache(max_size=10)
+    cache.set("query", [0.1])
+    cache.get("query")
+    monkeypatch.setattr(embedding, "_memory_caches", {("ollama", "embed", "http://gpu-1:11434"): cache})
+    monkeypatch.setattr(query_classifier, "stats", lambda: {"fast_valid": 3, "fast_non_relevant": 1, "llm": 2})
+
+    lines = metrics_registry.render().splitlines()
+
+    assert 'rag_cache_hits_total{cache="embedding:ollama:embed@http://gpu-1:11434"} 1.0' in lines
+    assert 'rag_query_classifier_queries_total{path="fast_valid"} 3.0' in lines
+    assert 'rag_query_classifier_queries_total{path="llm"} 2.0' in lines
@@ -0,0 +1,47 @@
+import asyncio
+from rag.utils import ollama_client
+from rag.utils.ollama_client import OllamaClientFactory
+
+
+def test_llm_cached_by_model_and_options():
+    factory = OllamaClientFactory(base_url="http://ollama:11434")
+
+    first = factory.llm("mistral", temperature=0.2, num_ctx=10500)
+    second = factory.llm("mistral", num_ctx=10500, temperature=0.2)
+    other = factory.llm("mistral", temperature=0)
+
+    assert first is second
+    assert other is not first
+    assert factory.cached_clients() == 2
+    assert first.client_kwargs["limits"].max_connections == ollama_client.OLLAMA_MAX_CONNECTIONS
+
+
+def test_aclose_releases_clients(monkeypatch):
+    closed = []
+
+    class Transport(ollama_client.httpx.HTTPTransport):
+        def close(self):
+            closed.append("sync")
+            super().close()
+
+    class AsyncTransport(ollama_client.httpx.AsyncHTTPTransport):
+        async def aclose(self):
+            closed.append("async")
+            await super().aclose()
+
+    monkeypatch.setattr(ollama_client.httpx, "HTTPTransport", Transport)
+    monkeypatch.setattr(ollama_client.httpx, "AsyncHTTPTransport", AsyncTransport)
+    factory = OllamaClientFactory(base_url="http://ollama:11434")
+
+    async def run():
+        factory.llm("mistral")
+        http_client = factory.http_client()
+        assert factory.http_client() is http_client
+        await factory.aclose()
+        return http_client
+
+    http_client = asyncio.run(run())
+
+    assert http_client.is_closed
+    assert closed == ["sync", "async"]
+    assert factory.cached_clients() == 0
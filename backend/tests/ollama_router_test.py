@@ -0,0 +1,153 @@
+import json
+import socket
+import asyncio
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from rag.utils import generation
+from rag.utils.ollama_client import OllamaClientFactory
+from rag.utils.ollama_router import NoBackendAvailableError, OllamaRouter
+
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    """Answers /api/generate with a two-token NDJSON stream."""
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append(request["model"])
+        lines = [
+            {"model": request["model"], "created_at": "2024-01-01T00:00:00Z", "response": token, "done": False}
+            for token in ["Bonjour", " monde"]
+        ]
+        lines.append({"model": request["model"], "created_at": "2024-01-01T00:00:00Z", "response": "", "done": True})
+        body = "".join(json.dumps(line) + "\n" for line in lines).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOllamaHandler)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def dead_url():
+    # A port nothing listens on: connections are refused
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}"
+
+
+def test_choose_least_loaded_backend_with_model_loaded():
+    router = OllamaRouter(["http://a", "http://b", "http://c"])
+    a, b, c = router.backends
+    a.start("mistral")
+    a.start("mistral")
+    b.start("mistral")
+    b.finish("mistral")
+
+    # a is busy and c would have to load the model first
+    assert router.choose("mistral") is b
+    # No host has the model loaded, the idle ones tie
+    assert router.choose("llama3") in (b, c)
+
+    b.mark_failed(cooldown=60)
+    assert router.choose("mistral") is c
+
+
+def test_invoke_fails_over_to_reachable_backend(stub_server, dead_url, monkeypatch):
+    server, url = stub_server
+    router = OllamaRouter([dead_url, url])
+    factory = OllamaClientFactory(base_url=dead_url)
+    monkeypatch.setattr(generation, "ollama_router", router)
+    monkeypatch.setattr(generation, "ollama_clients", factory)
+
+    async def run():
+        model = factory.llm("mistral", temperature=0)
+        answer = await generation.invoke_generation(model, "Bonjour ?")
+        tokens = [token async for token in generation.stream_generation(model, "Bonjour ?")]
+        await factory.aclose()
+        return answer, tokens
+
+    answer, tokens = asyncio.run(run())
+
+    assert answer == "Bonjour monde"
+    assert "".join(tokens) == "Bonjour monde"
+    assert server.requests == ["mistral", "mistral"]
+    stats = router.stats()
+    assert stats["failovers"] == 1
+    assert not stats["backends"][dead_url]["healthy"]
+    assert stats["backends"][url]["requests"] == 2
+    assert stats["backends"][url]["in_flight"] == 0
+
+
+def test_all_backends_down(dead_url):
+    router = OllamaRouter([dead_url])
+    factory = OllamaClientFactory(base_url=dead_url)
+
+    async def run():
+        model = factory.llm("mistral")
+        return await router.run("mistral", lambda url: factory.on_host(model, url).ainvoke("q"))
+
+    with pytest.raises(NoBackendAvailableError):
+        asyncio.run(run())
+
+
+def test_slow_call_is_hedged_on_another_backend(monkeypatch):
+    monkeypatch.setattr("rag.utils.ollama_router.OLLAMA_HEDGE_DEFAULT_DELAY", 0.02)
+    router = OllamaRouter(["http://slow", "http://fast"], hedging=True)
+    delays = {"http://slow": 1.0, "http://fast": 0.001}
+    cancelled = []
+
+    async def embed(url):
+        try:
+            await asyncio.sleep(delays[url])
+        except asyncio.CancelledError:
+            cancelled.append(url)
+            raise
+        return url
+
+    async def run():
+        winner = await router.hedged("nomic-embed-text", embed)
+        await asyncio.sleep(0)
+        return winner
+
+    assert asyncio.run(run()) == "http://fast"
+    assert cancelled == ["http://slow"]
+    stats = router.stats()
+    assert (stats["hedges"], stats["hedge_wins"], stats["hedge_rate"]) == (1, 1, 1.0)
+    assert stats["backends"]["http://slow"]["in_flight"] == 0
+
+
+def test_fast_call_is_not_hedged():
+    router = OllamaRouter(["http://a", "http://b"], hedging=True)
+
+    async def formulate(url):
+        return "VALIDE"
+
+    assert asyncio.run(router.hedged("mistral", formulate)) == "VALIDE"
+    assert router.stats()["hedges"] == 0
+    assert router.stats()["hedgeable_calls"] == 1
+
+
+def test_hedge_delay_follows_latency_percentile():
+    router = OllamaRouter(["http://a", "http://b"], hedging=True, hedge_percentile=90)
+    router._latencies["mistral"] = deque(
+        [i / 100 for i in range(1, 101)], maxlen=200
+    )
+
+    assert router.hedge_delay("mistral") == pytest.approx(0.90)
@@ -0,0 +1,59 @@
+import pytest
+from rag.utils.query_classifier import QueryClassifier
+from rag.utils.normalization import normalize_query
+
+
+@pytest.fixture
+def classifier():
+    return QueryClassifier()
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "Tu peux m'expliquer comme fonctionne la 61850 ? fais un maximum de schémas en ascii art",
+        "Quelles sont les exigences de la norme IEC 61850-7-4 ?",
+        "Expliquez la procédure d'installation du transformateur",
+        "Tu peux détailler les Logical Nodes et leur architecture dans la norme IEC 61850 ?",
+    ],
+)
+def test_confident_valid_queries(classifier, query):
+    assert classifier.classify(query) is True
+
+
+@pytest.mark.parametrize(
+    "query",
+    ["Quel temps fait-il demain ?", "Donne moi une recette de cuisine", "Raconte moi une blague"],
+)
+def test_confident_off_topic_queries(classifier, query):
+    assert classifier.classify(query) is False
+
+
+@pytest.mark.parametrize(
+    "query",
+    ["Comment ça marche ?", "API", "Expliquez le truc", "configurashun du relais"],
+)
+def test_ambiguous_queries_go_to_llm(classifier, query):
+    assert classifier.classify(query) is None
+
+
+def test_corpus_vocabulary_extends_fast_path(classifier):
+    query = "Comment fonctionne le bloc fonctionnel XCBR ?"
+    assert classifier.classify(query) is None
+
+    classifier.add_vocabulary(["XCBR", "bloc fonctionnel"])
+
+    assert classifier.classify(query) is True
+
+
+def test_stats_count_each_path(classifier):
+    classifier.classify("Quelles sont les exigences de la norme IEC 61850 ?")
+    classifier.classify("Quel temps fait-il ?")
+    classifier.classify("Comment ça marche ?")
+    classifier.classify("Comment ça va ?")
+
+    assert classifier.stats() == {"fast_valid": 1, "fast_non_relevant": 1, "llm": 2}
+
+
+def test_normalize_query_ignores_case_accents_and_whitespace():
+    assert normalize_query("  Expliquez   la PROCÉDURE ") == "expliquez la procedure"
@@ -0,0 +1,110 @@
+import asyncio
+import gc
+import pytest
+from rag import query_data
+from rag.utils.query_formulator import QueryStatus
+
+
+class FakeRetrieval:
+    """Stands in for `_retrieve`, recording whether it was cancelled."""
+
+    def __init__(self, delay=0.0, error=None):
+        self.delay = delay
+        # Raised when the retrieval is cancelled, like a search failing while it is torn down
+        self.error = error
+        self.calls = 0
+        self.cancelled = 0
+
+    async def __call__(self, *args):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            if self.error is not None:
+                raise self.error
+            raise
+        return None, []
+
+
+def _speculative(monkeypatch, retrieval, formulate):
+    monkeypatch.setattr(query_data, "SPECULATIVE_RETRIEVAL", True)
+    monkeypatch.setattr(query_data, "_retrieve", retrieval)
+    monkeypatch.setattr(query_data, "aformulate_query", formulate)
+
+
+def _run(coroutine):
+    """
+    Runs a coroutine and returns its result (or exception), the errors logged by the
+    event loop and the number of tasks still pending once it returned.
+    """
+    errors = []
+
+    async def run():
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: errors.append(context))
+        try:
+            result = await coroutine
+        except Exception as e:
+            result = e
+        # Let cancelled tasks finish, and collect them so unretrieved exceptions get reported
+        await asyncio.sleep(0.01)
+        gc.collect()
+        return result, len(asyncio.all_tasks()) - 1
+
+    result, pending = asyncio.run(run())
+    return result, errors, pending
+
+
+@pytest.mark.parametrize("error", [None, RuntimeError("Chroma unreachable")])
+def test_rejected_query_discards_the_speculative_retrieval(monkeypatch, error):
+    retrieval = FakeRetrieval(delay=10, error=error)
+
+    async def formulate(query, lane):
+        await asyncio.sleep(0.001)
+        return QueryStatus.NON_RELEVANT, "Hors sujet"
+
+    _speculative(monkeypatch, retrieval, formulate)
+
+    answer, errors, pending = _run(query_data._query_rag_async("la météo ?", vector_store=object()))
+
+    assert answer == "Hors sujet"
+    assert retrieval.calls == retrieval.cancelled == 1
+    assert pending == 0
+    assert errors == []
+
+
+def test_valid_query_reuses_the_speculative_retrieval(monkeypatch):
+    retrieval = FakeRetrieval(delay=0.001)
+    started_before_verdict = []
+
+    async def formulate(query, lane):
+        await asyncio.sleep(0.01)
+        started_before_verdict.append(retrieval.calls == 1)
+        return QueryStatus.VALID, query
+
+    _speculative(monkeypatch, retrieval, formulate)
+
+    answer, errors, _pending = _run(query_data._query_rag_async("Quelle tension d'essai ?", vector_store=object()))
+
+    # Nothing was retrieved, the request stops at the empty context answer
+    assert answer.startswith("Je n'ai pas d'information")
+    assert started_before_verdict == [True]
+    assert retrieval.calls == 1
+    assert errors == []
+
+
+def test_formulator_failure_cancels_the_speculative_retrieval(monkeypatch):
+    retrieval = FakeRetrieval(delay=10)
+
+    async def formulate(query, lane):
+        await asyncio.sleep(0.001)
+        raise ConnectionError("formulator unreachable")
+
+    _speculative(monkeypatch, retrieval, formulate)
+
+    error, errors, pending = _run(query_data._query_rag_async("Quelle tension d'essai ?", vector_store=object()))
+
+    assert isinstance(error, ConnectionError)
+    assert retrieval.cancelled == 1
+    assert pending == 0
+    assert errors == []
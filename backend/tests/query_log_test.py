@@ -0,0 +1,78 @@
+import asyncio
+import pytest
+from rag.utils.batch_writer import BatchWriter
+from rag.utils.query_log import QueryLog
+from rag.utils.instrumentation import (
+    RequestTrace,
+    add_trace_listener,
+    remove_trace_listener,
+    annotate,
+    stage,
+)
+
+
+def test_records_are_written_in_batches(tmp_path):
+    log = QueryLog(str(tmp_path / "queries.jsonl"), batch_size=50, flush_interval=0.2)
+    for i in range(120):
+        assert log.log({"query": f"question {i}"})
+    log.close()
+
+    assert [record["query"] for record in log.read()] == [f"question {i}" for i in range(120)]
+    stats = log.stats()
+    assert stats["written"] == 120
+    assert stats["batches"] < 120
+
+
+def test_log_is_rotated_by_size(tmp_path):
+    path = tmp_path / "queries.jsonl"
+    log = QueryLog(str(path), max_bytes=200, backup_count=2, batch_size=1, flush_interval=0)
+    for i in range(20):
+        log.log({"query": f"question {i}", "padding": "x" * 40})
+    log.close()
+
+    assert len(log.files()) == 3
+    assert path.stat().st_size <= 200
+    # Older files beyond the backup count are dropped, the newest records are kept
+    assert list(log.read())[-1]["query"] == "question 19"
+
+
+def test_full_queue_drops_records_instead_of_blocking(tmp_path):
+    log = QueryLog(str(tmp_path / "queries.jsonl"), queue_size=1)
+    # Without a running writer, the second record does not fit
+    log._ensure_started = lambda: None
+    assert log.log({"query": "first"})
+    assert not log.log({"query": "second"})
+    assert log.stats()["dropped"] == 1
+
+
+def test_writer_without_write_batch_cannot_be_created():
+    class Incomplete(BatchWriter):
+        pass
+
+    # Fails here rather than on the writer thread at the first flush
+    with pytest.raises(TypeError):
+        Incomplete(queue_size=10, batch_size=10, flush_interval=1)
+
+
+def test_finished_trace_produces_a_query_record():
+    records = []
+    add_trace_listener(records.append)
+    trace = RequestTrace("/test/record", "model", "collection", query="question")
+
+    async def request():
+        with stage("formulate"):
+            annotate(status="valid", scores=[0.9])
+        return "answer"
+
+    try:
+        asyncio.run(trace.run(request))
+    finally:
+        remove_trace_listener(records.append)
+
+    record = next(record for record in records if record["endpoint"] == "/test/record")
+    assert record["query"] == "question"
+    assert record["status"] == "valid"
+    assert record["scores"] == [0.9]
+    assert record["outcome"] == "generated"
+    assert set(record["latencies"]) == {"formulate"}
+    assert record["total"] >= record["latencies"]["formulate"]
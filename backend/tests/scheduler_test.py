@@ -0,0 +1,182 @@
+import asyncio
+import fitz
+import pytest
+from datetime import datetime, timezone
+from fastapi.testclient import TestClient
+from app.main import app
+from app.core.dependencies import get_user_dep
+from app.schema.user import User
+from rag import query_data
+from rag.utils import generation
+from rag.utils.instrumentation import add_trace_listener, remove_trace_listener
+from rag.utils.scheduler import ModelScheduler, OverloadedError, parse_model_limits, FILE_CHAT_LANE
+
+
+def test_parse_model_limits():
+    assert parse_model_limits("qwen3:32b=1, mistral-small3.1:latest=4,bad") == {
+        "qwen3:32b": 1,
+        "mistral-small3.1:latest": 4,
+    }
+
+
+def test_concurrency_is_capped_per_model():
+    scheduler = ModelScheduler(default_limit=2, limits={"small": 3}, queue_size=10, queue_timeout=1)
+    running = {"big": 0, "small": 0}
+    peak = {"big": 0, "small": 0}
+
+    async def generate(model):
+        async with scheduler.slot(model):
+            running[model] += 1
+            peak[model] = max(peak[model], running[model])
+            await asyncio.sleep(0.01)
+            running[model] -= 1
+
+    async def run():
+        await asyncio.gather(*(generate(model) for model in ["big", "small"] * 6))
+
+    asyncio.run(run())
+
+    assert peak == {"big": 2, "small": 3}
+    assert scheduler.stats()["big"]["admitted"] == 6
+    assert scheduler.stats()["big"]["active"] == 0
+
+
+def test_full_queue_is_rejected_with_429():
+    scheduler = ModelScheduler(default_limit=1, limits={}, queue_size=1, queue_timeout=1)
+
+    async def run():
+        await scheduler.acquire("m")
+        waiting = asyncio.ensure_future(scheduler.acquire("m"))
+        await asyncio.sleep(0)
+        with pytest.raises(OverloadedError) as rejected:
+            await scheduler.acquire("m")
+        assert scheduler.stats()["m"]["queued"] == 1
+        scheduler.release("m")
+        await waiting
+        return rejected.value
+
+    error = asyncio.run(run())
+
+    assert error.status_code == 429
+    assert error.retry_after >= 1
+    assert scheduler.stats()["m"]["rejected"] == 1
+
+
+def test_wait_deadline_returns_503_and_frees_queue():
+    scheduler = ModelScheduler(default_limit=1, limits={}, queue_size=5, queue_timeout=0.01)
+
+    async def run():
+        await scheduler.acquire("m")
+        with pytest.raises(OverloadedError) as timed_out:
+            await scheduler.acquire("m")
+        scheduler.release("m")
+        return timed_out.value
+
+    error = asyncio.run(run())
+
+    assert error.status_code == 503
+    assert scheduler.stats()["m"]["queued"] == 0
+    assert scheduler.stats()["m"]["active"] == 0
+    assert scheduler.stats()["m"]["timed_out"] == 1
+
+
+def test_freed_slot_goes_to_chat_before_comparison():
+    scheduler = ModelScheduler(default_limit=1, limits={}, queue_size=10, queue_timeout=1, lane_shares={})
+    order = []
+
+    async def generate(lane):
+        async with scheduler.slot("m", lane):
+            order.append(lane)
+            await asyncio.sleep(0.001)
+
+    async def run():
+        await scheduler.acquire("m", "comparison")
+        waiting = [
+            asyncio.ensure_future(generate(lane))
+            for lane in ["comparison", "file_chat", "chat", "summary"]
+        ]
+        await asyncio.sleep(0)
+        scheduler.release("m", "comparison")
+        await asyncio.gather(*waiting)
+
+    asyncio.run(run())
+
+    assert order == ["chat", "summary", "file_chat", "comparison"]
+
+
+def test_comparisons_leave_capacity_for_chat():
+    scheduler = ModelScheduler(
+        default_limit=4, limits={}, queue_size=10, queue_timeout=1, lane_shares={"comparison": 0.5}
+    )
+
+    async def run():
+        comparisons = [asyncio.ensure_future(scheduler.acquire("m", "comparison")) for _ in range(3)]
+        await asyncio.sleep(0)
+        # Only half of the slots are taken by comparisons, chat gets in right away
+        waited = await scheduler.acquire("m", "chat", timeout=0.01)
+        lanes = scheduler.stats()["m"]["lanes"]
+        for task in comparisons:
+            task.cancel()
+        await asyncio.gather(*comparisons, return_exceptions=True)
+        return waited, lanes
+
+    waited, lanes = asyncio.run(run())
+
+    assert waited < 0.01
+    assert lanes["comparison"]["active"] == 2
+    assert lanes["comparison"]["queued"] == 1
+    assert lanes["chat"]["active"] == 1
+
+
+def test_file_chats_are_refused_beyond_their_share_while_chat_gets_in():
+    scheduler = ModelScheduler(
+        default_limit=2, limits={}, queue_size=0, queue_timeout=1, lane_shares={"file_chat": 0.5}
+    )
+
+    async def run():
+        await scheduler.acquire("m", FILE_CHAT_LANE)
+        # The file chat lane holds its share: another file chat is refused, chat is admitted
+        with pytest.raises(OverloadedError) as rejected:
+            await scheduler.acquire("m", FILE_CHAT_LANE)
+        waited = await scheduler.acquire("m", "chat", timeout=0.01)
+        return rejected.value, waited, scheduler.stats()["m"]["lanes"]
+
+    error, waited, lanes = asyncio.run(run())
+
+    assert error.status_code == 429 and error.retry_after >= 1
+    assert waited < 0.01
+    assert lanes["file_chat"]["active"] == 1
+    assert lanes["chat"]["active"] == 1
+    assert scheduler.stats()["m"]["rejected"] == 1
+def test_file_chat_beyond_capacity_is_answered_with_retry_after(monkeypatch, tmp_path):
+    scheduler = ModelScheduler(default_limit=1, limits={}, queue_size=0, queue_timeout=1)
+    monkeypatch.setattr(generation, "model_scheduler", scheduler)
+
+    async def no_results(*args):
+        return None, []
+
+    monkeypatch.setattr(query_data, "_retrieve", no_results)
+    user = User(user_id="1", username="agent", active=True, created_at=datetime.now(timezone.utc))
+    monkeypatch.setitem(app.dependency_overrides, get_user_dep, lambda: user)
+    document = fitz.open()
+    document.new_page().insert_text((40, 40), "Essais de rigidité diélectrique")
+    pdf = document.tobytes()
+    document.close()
+
+    # The only slot of the model is taken and nothing may wait for it
+    asyncio.run(scheduler.acquire("mistral", FILE_CHAT_LANE))
+    records = []
+    add_trace_listener(records.append)
+    try:
+        response = TestClient(app).post(
+            "/api/v1/rag/chat-with-file",
+            data={"query": "Quelle tension d'essai ?", "model": "mistral"},
+            files={"file": ("standard.pdf", pdf, "application/pdf")},
+        )
+    finally:
+        remove_trace_listener(records.append)
+
+    assert response.status_code in (429, 503)
+    assert int(response.headers["Retry-After"]) >= 1
+    assert scheduler.stats()["mistral"]["rejected"] == 1
+    assert [record["outcome"] for record in records] == ["overloaded"]
@@ -0,0 +1,47 @@
+import numpy as np
+from rag.utils.semantic_cache import SemanticAnswerCache
+
+PARTITION = ("mistral", "61557", "template")
+
+
+def vector(*values):
+    return np.array(values, dtype=np.float32)
+
+
+def test_similar_query_with_same_chunks_hits():
+    cache = SemanticAnswerCache(capacity=4, threshold=0.95)
+    cache.set(PARTITION, vector(1.0, 0.0, 0.0), ["a:1:0", "a:2:0"], "answer", "sources")
+
+    assert cache.get(PARTITION, vector(0.99, 0.05, 0.0), ["a:2:0", "a:1:0"]) == ("answer", "sources")
+    assert cache.stats()["hits"] == 1
+
+
+def test_requires_same_chunks_threshold_and_partition():
+    cache = SemanticAnswerCache(capacity=4, threshold=0.95)
+    cache.set(PARTITION, vector(1.0, 0.0, 0.0), ["a:1:0"], "answer", "sources")
+
+    assert cache.get(PARTITION, vector(1.0, 0.0, 0.0), ["a:1:0", "a:3:0"]) is None
+    assert cache.get(PARTITION, vector(0.7, 0.7, 0.0), ["a:1:0"]) is None
+    assert cache.get(("llama", "61557", "template"), vector(1.0, 0.0, 0.0), ["a:1:0"]) is None
+
+
+def test_evicts_least_recently_used_when_full():
+    cache = SemanticAnswerCache(capacity=2, threshold=0.99)
+    cache.set(PARTITION, vector(1.0, 0.0), ["x"], "first", "")
+    cache.set(PARTITION, vector(0.0, 1.0), ["y"], "second", "")
+    cache.get(PARTITION, vector(1.0, 0.0), ["x"])
+    cache.set(PARTITION, vector(-1.0, 0.0), ["z"], "third", "")
+
+    assert len(cache) == 2
+    assert cache.get(PARTITION, vector(1.0, 0.0), ["x"]) == ("first", "")
+    assert cache.get(PARTITION, vector(0.0, 1.0), ["y"]) is None
+
+
+def test_invalidate_collection():
+    cache = SemanticAnswerCache(capacity=4, threshold=0.9)
+    cache.set(PARTITION, vector(1.0, 0.0), ["x"], "answer", "")
+    cache.set(("mistral", "other", "template"), vector(1.0, 0.0), ["x"], "other", "")
+
+    assert cache.invalidate_collection("61557") == 1
+    assert cache.get(PARTITION, vector(1.0, 0.0), ["x"]) is None
+    assert cache.get(("mistral", "other", "template"), vector(1.0, 0.0), ["x"]) == ("other", "")
@@ -0,0 +1,154 @@
+import gc
+import asyncio
+from rag.query_data import _coalesced
+from rag.utils.instrumentation import RequestTrace, add_trace_listener, remove_trace_listener, stage
+from rag.utils.single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = []
+
+    async def answer():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def run():
+        return await asyncio.gather(*(flight.do("key", answer) for _ in range(5)))
+
+    assert asyncio.run(run()) == ["answer"] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {"executions": 1, "coalesced": 4, "in_flight": 0}
+
+
+def test_stream_is_fanned_out_to_every_subscriber():
+    flight = SingleFlight()
+    produced = []
+
+    async def tokens():
+        for i in range(5):
+            await asyncio.sleep(0.001)
+            produced.append(i)
+            yield {"type": "content", "data": str(i)}
+
+    async def start():
+        return tokens()
+
+    async def consume():
+        stream = await flight.stream("key", start)
+        return [chunk["data"] async for chunk in stream]
+
+    async def run():
+        first = asyncio.ensure_future(consume())
+        await asyncio.sleep(0.003)
+        # Joins the stream already in flight
+        second = asyncio.ensure_future(consume())
+        return await asyncio.gather(first, second)
+
+    first, second = asyncio.run(run())
+
+    assert first == second == ["0", "1", "2", "3", "4"]
+    assert produced == [0, 1, 2, 3, 4]
+    assert flight.in_flight() == 0
+
+
+def test_stream_closed_when_every_subscriber_leaves():
+    flight = SingleFlight()
+    state = {"closed": False}
+
+    async def tokens():
+        try:
+            while True:
+                await asyncio.sleep(0.001)
+                yield "token"
+        finally:
+            state["closed"] = True
+
+    async def start():
+        return tokens()
+
+    async def run():
+        streams = [await flight.stream("key", start) for _ in range(2)]
+        for stream in streams:
+            await stream.__anext__()
+            await stream.aclose()
+        await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+
+    assert state["closed"]
+    assert flight.in_flight() == 0
+
+
+def test_subscriber_that_never_iterates_is_released():
+    flight = SingleFlight()
+    state = {"closed": False}
+
+    async def tokens():
+        try:
+            while True:
+                await asyncio.sleep(0.001)
+                yield "token"
+        finally:
+            state["closed"] = True
+
+    async def start():
+        return tokens()
+
+    async def run():
+        closed = await flight.stream("key", start)
+        dropped = await flight.stream("key", start)
+        await closed.__anext__()
+        await closed.aclose()
+        # The other subscriber keeps the stream alive until it is dropped
+        assert not state["closed"]
+        del dropped
+        gc.collect()
+        await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+
+    assert state["closed"]
+    assert flight.in_flight() == 0
+
+
+def test_coalesced_request_is_recorded_as_such():
+    records = []
+    add_trace_listener(records.append)
+
+    async def answer():
+        with stage("generate"):
+            await asyncio.sleep(0.01)
+        return "answer"
+
+    async def request():
+        trace = RequestTrace("/test/coalesced", "model", "collection", query="question")
+        return await trace.run(lambda: _coalesced(("test", "coalesced"), answer, False))
+
+    async def run():
+        return await asyncio.gather(request(), request())
+
+    try:
+        assert asyncio.run(run()) == ["answer", "answer"]
+    finally:
+        remove_trace_listener(records.append)
+
+    records = sorted(
+        (record for record in records if record["endpoint"] == "/test/coalesced"),
+        key=lambda record: record["outcome"],
+    )
+    follower, leader = records
+    assert (follower["outcome"], leader["outcome"]) == ("coalesced", "generated")
+    # Only the caller that ran the request reports its stages
+    assert set(leader["latencies"]) == {"generate"}
+    assert follower["latencies"] == {}
+
+
+def test_stream_returns_plain_results_as_is():
+    flight = SingleFlight()
+
+    async def start():
+        return "Votre question ne semble pas concerner l'analyse de documents"
+
+    assert asyncio.run(flight.stream("key", start)).startswith("Votre question")
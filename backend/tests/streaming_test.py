@@ -0,0 +1,80 @@
+import asyncio
+from app.core import streaming
+from app.core.streaming import cancel_on_disconnect
+from rag.utils import generation
+from rag.utils.generation import CancellationStats, stream_generation
+
+
+class FakeStreamingModel:
+    num_predict = 100
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.closed = False
+
+    async def astream(self, prompt):
+        try:
+            for i in range(self.num_predict):
+                await asyncio.sleep(self.delay)
+                yield f"token{i} "
+        finally:
+            self.closed = True
+
+
+class FakeRequest:
+    class url:
+        path = "/rag/chat/stream"
+
+    def __init__(self):
+        self.disconnected = False
+
+    async def is_disconnected(self):
+        return self.disconnected
+
+
+def test_closing_stream_aborts_generation(monkeypatch):
+    monkeypatch.setattr(generation, "cancellation_stats", CancellationStats())
+    model = FakeStreamingModel()
+
+    async def consume():
+        tokens = stream_generation(model, "prompt")
+        received = [await tokens.__anext__() for _ in range(3)]
+        await tokens.aclose()
+        return received
+
+    assert len(asyncio.run(consume())) == 3
+    assert model.closed
+    assert generation.cancellation_stats.stats() == {
+        "cancellations": 1, "tokens_generated": 3, "tokens_saved": 97,
+    }
+
+
+def test_complete_stream_is_not_a_cancellation(monkeypatch):
+    monkeypatch.setattr(generation, "cancellation_stats", CancellationStats())
+
+    async def consume():
+        return [token async for token in stream_generation(FakeStreamingModel(), "prompt")]
+
+    assert len(asyncio.run(consume())) == 100
+    assert generation.cancellation_stats.stats()["cancellations"] == 0
+
+
+def test_disconnect_cancels_pending_generation(monkeypatch):
+    monkeypatch.setattr(generation, "cancellation_stats", CancellationStats())
+    monkeypatch.setattr(streaming, "DISCONNECT_POLL_INTERVAL", 0.005)
+    model = FakeStreamingModel(delay=0.01)
+    request = FakeRequest()
+
+    async def consume():
+        received = []
+        async for chunk in cancel_on_disconnect(request, stream_generation(model, "prompt")):
+            received.append(chunk)
+            if len(received) == 5:
+                request.disconnected = True
+        return received
+
+    received = asyncio.run(consume())
+
+    assert 5 <= len(received) < 100
+    assert model.closed
+    assert generation.cancellation_stats.stats()["cancellations"] == 1
@@ -0,0 +1,84 @@
+import asyncio
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from rag import vector_store as vs
+from rag.vector_store import VectorStoreRegistry
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    monkeypatch.setattr(vs, "embedding", lambda: DeterministicFakeEmbedding(size=8))
+    registry = VectorStoreRegistry(persist_directory=str(tmp_path))
+    yield registry
+    registry.close()
+
+
+def test_get_returns_shared_instance(registry):
+    first = registry.get("collection_a")
+    second = registry.get("collection_a")
+
+    assert first is second
+    assert registry.loaded_collections() == ["collection_a"]
+
+
+def test_warm_and_reload(registry):
+    warmed = registry.warm(["collection_a", "collection_b"])
+    store = registry.get("collection_a")
+
+    reloaded = registry.reload("collection_a")
+
+    assert warmed == ["collection_a", "collection_b"]
+    assert reloaded is not store
+    assert registry.get("collection_a") is reloaded
+
+
+def test_close_drops_instances(registry):
+    registry.warm(["collection_a"])
+    registry.close()
+
+    assert registry.loaded_collections() == []
+
+
+def test_async_search_matches_sync_search(registry):
+    store = registry.get("collection_a")
+    store.add_texts(
+        ["IEC 61850 logical nodes", "Transformer protection", "Substation bus"],
+        metadatas=[{"id": f"doc.pdf:{page}:0"} for page in range(3)],
+    )
+
+    expected = store.similarity_search_with_relevance_scores("logical nodes", k=2)
+    results = asyncio.run(
+        vs.asimilarity_search_with_relevance_scores(store, "logical nodes", 2)
+    )
+
+    assert [doc.metadata["id"] for doc, _score in results] == [
+        doc.metadata["id"] for doc, _score in expected
+    ]
+    assert [score for _doc, score in results] == pytest.approx(
+        [score for _doc, score in expected]
+    )
+
+
+def test_retrieval_cache_follows_collection_version(registry, monkeypatch):
+    from rag import query_data
+    from rag.utils.retrieval_cache import RetrievalCache
+
+    monkeypatch.setattr(query_data, "vector_store_registry", registry)
+    monkeypatch.setattr(query_data, "get_vector_store", registry.get)
+    monkeypatch.setattr(query_data, "retrieval_cache", RetrievalCache(max_size=16, ttl=None))
+    store = registry.get("collection_a")
+    store.add_texts(["IEC 61850 logical nodes"], metadatas=[{"id": "doc.pdf:0:0"}])
+
+    def retrieve():
+        _embedding, results = asyncio.run(
+            query_data._retrieve("logical nodes", None, "collection_a", 2)
+        )
+        return [doc.metadata["id"] for doc, _score in results]
+
+    assert retrieve() == ["doc.pdf:0:0"]
+    store.add_texts(["Substation bus"], metadatas=[{"id": "doc.pdf:1:0"}])
+    # Same version: the cached search is served
+    assert retrieve() == ["doc.pdf:0:0"]
+
+    registry.bump_version("collection_a")
+    assert sorted(retrieve()) == ["doc.pdf:0:0", "doc.pdf:1:0"]